@@ -0,0 +1,111 @@
+import os
+import subprocess
+from typing import Dict, Optional, Set
+
+# Preferred source codecs, best first
+CODEC_PREFERENCE = ('opus', 'vorbis', 'mp3', 'flac')
+
+# Codec family of the audio containers we write or scan, by file extension
+EXTENSION_CODECS = {
+    '.mp3': 'mp3',
+    '.ogg': 'vorbis',
+    '.oga': 'vorbis',
+    '.opus': 'opus',
+    '.flac': 'flac',
+    '.wav': 'pcm',
+    '.m4a': 'aac',
+    '.aac': 'aac',
+}
+
+# Codec used when the source has to be re-encoded
+FALLBACK_CODEC = 'mp3'
+FALLBACK_QUALITY = '192'
+
+
+def codec_family(acodec: Optional[str]) -> Optional[str]:
+    """Normalize a yt-dlp acodec string such as 'mp4a.40.2' to 'aac'"""
+    if not acodec or acodec == 'none':
+        return None
+    acodec = acodec.lower()
+    if acodec.startswith('mp4a') or acodec == 'aac':
+        return 'aac'
+    for family in CODEC_PREFERENCE:
+        if acodec.startswith(family):
+            return family
+    return acodec
+
+
+def ffmpeg_available() -> bool:
+    """Whether an ffmpeg executable runs; spawns it, so callers cache the answer"""
+    # Try multiple possible ffmpeg commands
+    for command in ('ffmpeg', 'ffmpeg.exe'):
+        try:
+            result = subprocess.run([command, '-version'], capture_output=True, text=True)
+        except OSError:
+            continue
+        if result.returncode == 0:
+            return True
+    return False
+
+
+def native_codecs() -> Set[str]:
+    """Codecs the pygame mixer can decode without a transcode"""
+    import pygame
+
+    codecs = {'mp3', 'vorbis', 'flac'}
+    # Opus support arrived in SDL_mixer 2.6; the version is known without opening the mixer
+    if pygame.mixer.get_sdl_mixer_version() >= (2, 6, 0):
+        codecs.add('opus')
+    return codecs
+
+
+def ydl_audio_options(native: bool = True) -> Dict:
+    """yt-dlp format selection and postprocessing for audio downloads
+
+    In native mode a stream whose codec the mixer can decode is preferred
+    and only remuxed into an audio container; otherwise every download is
+    re-encoded to the fallback codec.
+    """
+    if not native:
+        return {
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': FALLBACK_CODEC,
+                'preferredquality': FALLBACK_QUALITY,
+            }],
+        }
+
+    supported = native_codecs()
+    selectors = [f"bestaudio[acodec^={codec}]" for codec in CODEC_PREFERENCE if codec in supported]
+    return {
+        'format': "/".join(selectors + ['bestaudio/best']),
+        'postprocessors': [{
+            # 'best' keeps the source codec and only changes the container
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'best',
+        }],
+    }
+
+
+def file_is_decodable(path: str) -> bool:
+    """Whether the mixer can open a file on disk, judged by its extension"""
+    codec = EXTENSION_CODECS.get(os.path.splitext(path)[1].lower())
+    return codec == 'pcm' or codec in native_codecs()
+
+
+def needs_transcode(download: Dict) -> bool:
+    """Whether a finished yt-dlp download can't be played as is"""
+    return codec_family(download.get('acodec')) not in native_codecs()
+
+
+def transcode_to_fallback(ydl, info: Dict) -> Dict:
+    """Re-encode a finished download with yt-dlp's FFmpeg postprocessor"""
+    from yt_dlp.postprocessor import FFmpegExtractAudioPP
+
+    postprocessor = FFmpegExtractAudioPP(
+        ydl,
+        preferredcodec=FALLBACK_CODEC,
+        preferredquality=FALLBACK_QUALITY
+    )
+    return ydl.run_pp(postprocessor, info)
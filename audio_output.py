@@ -0,0 +1,36 @@
+import threading
+
+# pygame.mixer once it has been imported and opened the audio device
+_mixer = None
+_lock = threading.Lock()
+# Music volume, kept until the mixer is open and applied then
+_volume = 1.0
+
+
+def mixer():
+    """pygame.mixer, imported and initialized on first use
+
+    Importing pygame pulls in numpy and takes a few hundred milliseconds,
+    and opening the audio device can take as long again, so neither
+    happens at startup. PlayerCore.warm_up() calls this on a background
+    thread once the window is up; a caller that gets here first does the
+    work itself and any other waits for it to finish.
+    """
+    global _mixer
+    if _mixer is None:
+        with _lock:
+            if _mixer is None:
+                import pygame
+
+                pygame.mixer.init()
+                pygame.mixer.music.set_volume(_volume)
+                _mixer = pygame.mixer
+    return _mixer
+
+
+def set_volume(volume: float):
+    """Set the music volume now if the mixer is open, else once it opens"""
+    global _volume
+    _volume = volume
+    if _mixer is not None:
+        _mixer.music.set_volume(volume)
@@ -0,0 +1,136 @@
+import abc
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class ProcessPool:
+    """Spawned worker processes, started on first use and shared by BatchWorkers
+
+    Loudness analysis and fingerprinting both decode whole files; giving
+    them one pool keeps the process count at ``workers`` instead of one
+    full set per analyzer, and their batches take turns on it.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def map(self, fn: Callable, items: List) -> List:
+        with self._lock:
+            if self._executor is None:
+                # Spawned, not forked: the UI process has Tk and threads running
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            executor = self._executor
+        return list(executor.map(fn, items))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class BatchWorker(abc.ABC):
+    """Runs a per-file analysis over queued paths on a process pool
+
+    A background thread takes BATCH_SIZE paths at a time off the queue,
+    maps ``analyze(path)`` over the pool and hands the results to
+    ``store()``; ``on_analyzed(results)`` then receives the batch as a
+    path -> result dict, through ``dispatch``. ``analyze`` runs in another
+    process, so it must be a module-level function; files it returns None
+    for are not tried again this session. Subclasses pick what to queue in
+    ``needed()`` and may do work of their own in ``idle()``.
+
+    Without a ``pool`` the worker starts a ProcessPool of ``workers``
+    processes of its own and shuts it down with itself; a pool passed in
+    belongs to the caller.
+    """
+
+    BATCH_SIZE = 16
+    # Worker thread name, also used in error messages
+    name = "batch-worker"
+
+    def __init__(self, analyze: Callable[[str], Optional[Dict]], workers: Optional[int] = None,
+                 on_analyzed: Optional[Callable[[Dict[str, Dict]], None]] = None,
+                 dispatch: Optional[Callable] = None, pool: Optional[ProcessPool] = None):
+        self.analyze = analyze
+        self.pool = pool or ProcessPool(workers)
+        self.on_analyzed = on_analyzed
+        self.dispatch = dispatch or (lambda fn, *args: fn(*args))
+        self.analyzed = 0
+        self._owns_pool = pool is None
+        self._queue: List[str] = []
+        self._queued = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def workers(self) -> int:
+        return self.pool.workers
+
+    def request(self, paths: Iterable[str], first: bool = False):
+        """Analyze paths in the background; first puts them ahead of the queue"""
+        paths = self.needed([path for path in paths if path])
+        with self._lock:
+            new = [path for path in paths if path not in self._queued and path not in self._failed]
+            self._queued.update(new)
+            self._queue = new + self._queue if first else self._queue + new
+        self.wake()
+
+    def needed(self, paths: List[str]) -> List[str]:
+        """The paths worth analyzing; all of them unless a subclass knows better"""
+        return paths
+
+    @abc.abstractmethod
+    def store(self, results: List[Dict]):
+        """Save a finished batch; runs on the worker thread"""
+
+    def idle(self):
+        """Called on the worker thread whenever the queue has drained"""
+
+    def wake(self):
+        """Start the worker thread, or have it look at the queue again"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def shutdown(self):
+        self._stopped = True
+        self._wake.set()
+        if self._owns_pool:
+            self.pool.shutdown()
+
+    def _run(self):
+        while not self._stopped:
+            with self._lock:
+                batch, self._queue = self._queue[:self.BATCH_SIZE], self._queue[self.BATCH_SIZE:]
+            if not batch:
+                self.idle()
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            try:
+                results = self.pool.map(self.analyze, batch)
+            except Exception as e:
+                print(f"Error in {self.name} analysis: {e}")
+                results = [None] * len(batch)
+            with self._lock:
+                self._failed.update(path for path, result in zip(batch, results) if result is None)
+            results = [result for result in results if result]
+            if results:
+                self.store(results)
+                self.analyzed += len(results)
+                if self.on_analyzed:
+                    self.dispatch(self.on_analyzed, {result['path']: result for result in results})
+            with self._lock:
+                self._queued.difference_update(batch)
@@ -0,0 +1,124 @@
+"""Download scheduling: bandwidth sharing and priorities
+
+Drives DownloadManager with a synthetic download function that "receives"
+64 KiB blocks as fast as its source allows and reports them through the
+progress hook like yt-dlp does, so no network is involved.
+
+- share: four equal downloads under an 8 MiB/s budget, then the same with
+  one source capped at 0.5 MiB/s (its unused share should go to the
+  others), then one PLAY_NOW download against three BULK ones. Reports
+  each download's MiB/s, the total and Jain's fairness index.
+- priority: 30 one-second BULK downloads fill the queue, then a PLAY_NOW
+  download is submitted; reports how long it waited to start and to
+  finish, with and without the urgent worker.
+
+    python benchmarks/bench_downloads.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_manager import BandwidthBudget, DownloadManager, DownloadPriority
+
+MIB = 1024 ** 2
+BLOCK = 64 * 1024
+BUDGET = 8 * MIB
+
+
+class SyntheticSource:
+    """url -> (bytes, source bytes per second or None for unlimited)"""
+
+    def __init__(self):
+        self.sources = {}
+        self.started = {}
+        self.finished = {}
+
+    def download(self, url, progress_hook):
+        size, rate = self.sources[url]
+        started = self.started[url] = time.perf_counter()
+        received = 0
+        while received < size:
+            received = min(received + BLOCK, size)
+            if rate:
+                delay = started + received / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            progress_hook({'status': 'downloading', 'downloaded_bytes': received, 'total_bytes': size})
+        progress_hook({'status': 'finished'})
+        self.finished[url] = time.perf_counter()
+        return {'url': url}
+
+
+def wait_all(jobs, timeout=120):
+    deadline = time.monotonic() + timeout
+    while not all(job.finished for job in jobs):
+        if time.monotonic() > deadline:
+            raise TimeoutError("downloads did not finish")
+        time.sleep(0.01)
+
+
+def share(name, downloads, seconds=4.0):
+    """downloads: (priority, source rate) pairs, all started at once and measured for seconds"""
+    source = SyntheticSource()
+    manager = DownloadManager(source.download, workers=len(downloads), urgent_workers=0,
+                              bandwidth=BandwidthBudget(BUDGET))
+    jobs = []
+    for index, (priority, rate) in enumerate(downloads):
+        url = f"share-{index}"
+        source.sources[url] = (10 ** 12, rate)  # never finishes on its own
+        jobs.append(manager.submit(url, priority=priority))
+    time.sleep(1.0)  # let the shares settle
+    before = [job.downloaded_bytes for job in jobs]
+    time.sleep(seconds)
+    rates = [(job.downloaded_bytes - start) / seconds / MIB for job, start in zip(jobs, before)]
+    manager.shutdown()
+    wait_all(jobs)
+    return {
+        'benchmark': 'downloads', 'operation': 'share', 'case': name, 'budget_mib_s': BUDGET / MIB,
+        'priorities': [priority for priority, _ in downloads],
+        'mib_s': [round(rate, 2) for rate in rates],
+        'total_mib_s': round(sum(rates), 2),
+        'jain_index': round(sum(rates) ** 2 / (len(rates) * sum(r * r for r in rates)), 3),
+    }
+
+
+def priority(urgent_workers):
+    source = SyntheticSource()
+    manager = DownloadManager(source.download, workers=3, urgent_workers=urgent_workers)
+    jobs = []
+    for index in range(30):
+        url = f"bulk-{index}"
+        source.sources[url] = (MIB, MIB)  # one second each
+        jobs.append(manager.submit(url, priority=DownloadPriority.BULK))
+    time.sleep(0.2)
+    source.sources["play"] = (MIB, 4 * MIB)
+    submitted = time.perf_counter()
+    play = manager.submit("play", priority=DownloadPriority.PLAY_NOW)
+    wait_all([play], timeout=60)
+    result = {
+        'benchmark': 'downloads', 'operation': 'priority', 'urgent_workers': urgent_workers,
+        'queued_ahead': 27,
+        'start_wait_ms': (source.started["play"] - submitted) * 1000,
+        'finish_ms': (source.finished["play"] - submitted) * 1000,
+    }
+    manager.cancel_all()
+    manager.shutdown()
+    wait_all(jobs)
+    return result
+
+
+def main():
+    print(json.dumps(share('equal', [(DownloadPriority.USER, None)] * 4)), flush=True)
+    print(json.dumps(share('one slow source', [(DownloadPriority.USER, None)] * 3
+                                             + [(DownloadPriority.USER, MIB // 2)])), flush=True)
+    print(json.dumps(share('play_now vs bulk', [(DownloadPriority.PLAY_NOW, None)]
+                                               + [(DownloadPriority.BULK, None)] * 3)), flush=True)
+    for urgent_workers in (1, 0):
+        print(json.dumps(priority(urgent_workers)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
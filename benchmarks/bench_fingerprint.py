@@ -0,0 +1,187 @@
+"""Duplicate detection: fingerprint throughput, match accuracy, lookup and report cost
+
+Songs are synthesized straight at the fingerprint sample rate (decaying
+tones on a random melody), so no decoder is involved. A "copy" of a song
+is shifted by 1.234 s, 4.4 dB quieter, low-pass filtered and has noise
+added, as a re-encode from another source would be.
+
+- fingerprint: Fingerprinter alone over 200 s songs, in tracks per
+  minute per core.
+- compare: bit error rate of each song against its copy and against
+  every other song, and the time of one compare().
+- lookup: a library of LIBRARY_FILES fingerprints, most of them random
+  filler, queried with the first 30 s of each copy, as a new download is
+  checked. Reports lookup time and whether the right file came back, and
+  the time of a lookup that finds nothing (a new song). Every file lasts
+  as long as the query, the worst case for the duration filter.
+- report: FingerprintIndex.report() over the same library, which should
+  find every song/copy pair and nothing else.
+
+    python benchmarks/bench_fingerprint.py [songs] [library_files]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fingerprint import (FINGERPRINT_RATE, FRAME_SIZE, FRAMES_PER_READ, PREFIX_SECONDS, FingerprintIndex,
+                         Fingerprinter, compare, sampled_hashes)
+from library import Library
+
+SONG_SECONDS = 200
+SHIFT_SECONDS = 1.234
+# Random sub-fingerprints standing in for unrelated tracks
+LIBRARY_FILES = 2000
+
+
+def synthetic_song(seed, seconds=SONG_SECONDS, rate=FINGERPRINT_RATE):
+    rng = np.random.default_rng(seed)
+    out = np.zeros(int(seconds * rate), dtype=np.float32)
+    t = 0.0
+    while t < seconds:
+        length = rng.choice([0.125, 0.25, 0.5])
+        n, start = int(length * rate), int(t * rate)
+        if start + n > len(out):
+            break
+        tt = np.arange(n) / rate
+        envelope = np.exp(-tt * rng.uniform(2, 8))
+        for _ in range(rng.integers(1, 4)):
+            pitch = 110 * 2 ** (rng.integers(0, 36) / 12)
+            for harmonic in range(1, 5):
+                if pitch * harmonic < rate / 2:
+                    out[start:start + n] += (0.3 / harmonic) * np.sin(2 * np.pi * pitch * harmonic * tt) * envelope
+        out[start:start + n] += 0.02 * rng.standard_normal(n) * envelope
+        t += length
+    return out / (np.abs(out).max() * 1.1)
+
+
+def copy_of(song, seed):
+    rng = np.random.default_rng(seed + 1000)
+    shifted = np.concatenate((np.zeros(int(SHIFT_SECONDS * FINGERPRINT_RATE), dtype=np.float32), song))
+    filtered = np.convolve(shifted * 0.6, [0.25, 0.5, 0.25], mode='same')
+    return (filtered + 0.003 * rng.standard_normal(len(filtered))).astype(np.float32)
+
+
+def fingerprint(samples):
+    fingerprinter = Fingerprinter()
+    piece = FRAME_SIZE * FRAMES_PER_READ // 2  # what fingerprint_source reads at a time
+    for start in range(0, len(samples), piece):
+        fingerprinter.add(samples[start:start + piece])
+    return fingerprinter
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def bench_fingerprint(songs):
+    started = time.process_time()
+    fingerprints = [fingerprint(song).fingerprint() for song in songs]
+    cpu = time.process_time() - started
+    return fingerprints, {
+        'benchmark': 'fingerprint', 'phase': 'fingerprint', 'tracks': len(songs), 'track_seconds': SONG_SECONDS,
+        'cpu_seconds': cpu, 'tracks_per_minute_per_core': len(songs) / cpu * 60,
+        'bytes_per_track': fingerprints[0].nbytes,
+    }
+
+
+def bench_compare(originals, copies):
+    same, different, times = [], [], []
+    for i, query in enumerate(copies):
+        for j, reference in enumerate(originals):
+            started = time.perf_counter()
+            ber, shift = compare(query, reference)
+            times.append(time.perf_counter() - started)
+            (same if i == j else different).append(ber)
+    return {
+        'benchmark': 'fingerprint', 'phase': 'compare',
+        'same_ber_max': round(max(same), 3), 'different_ber_min': round(min(different), 3),
+        'compare_ms': median(times) * 1000,
+    }
+
+
+def fill_library(library, tmp, originals, copies, files):
+    """Original and copy fingerprints plus random filler, each with a file of its own on disk"""
+    rng = np.random.default_rng(0)
+    frames = len(originals[0])
+    fingerprints = [('original', i, fp) for i, fp in enumerate(originals)]
+    fingerprints += [('copy', i, fp) for i, fp in enumerate(copies)]
+    fingerprints += [('filler', i, rng.integers(0, 2 ** 32, frames, dtype=np.uint64).astype('<u4'))
+                     for i in range(files - len(fingerprints))]
+    results = []
+    for kind, i, fp in fingerprints:
+        path = os.path.join(tmp, f"{kind}-{i}.mp3")
+        with open(path, "wb") as f:
+            f.write(bytes(4096 if kind == 'copy' else 8192))
+        stat = os.stat(path)
+        results.append({'path': path, 'mtime': stat.st_mtime, 'size': stat.st_size,
+                        'duration': SONG_SECONDS, 'fingerprint': fp.tobytes(), 'hashes': sampled_hashes(fp)})
+    library.store_fingerprints(results)
+
+
+def bench_lookup(index, copy_prefixes, new_prefixes, tmp, files):
+    times, correct = [], 0
+    for i, prefix in enumerate(copy_prefixes):
+        started = time.perf_counter()
+        match = index.match(prefix, SONG_SECONDS, exclude=[os.path.join(tmp, f"copy-{i}.mp3")])
+        times.append(time.perf_counter() - started)
+        correct += bool(match) and match['path'] == os.path.join(tmp, f"original-{i}.mp3")
+    misses, false_matches = [], 0
+    for prefix in new_prefixes:
+        started = time.perf_counter()
+        false_matches += index.match(prefix, SONG_SECONDS) is not None
+        misses.append(time.perf_counter() - started)
+    return {
+        'benchmark': 'fingerprint', 'phase': 'lookup', 'library_files': files,
+        'queries': len(copy_prefixes), 'found': correct,
+        'lookup_ms': median(times) * 1000, 'max_lookup_ms': max(times) * 1000,
+        'new_songs': len(new_prefixes), 'false_matches': false_matches, 'miss_lookup_ms': median(misses) * 1000,
+    }
+
+
+def bench_report(index, songs, files):
+    started = time.perf_counter()
+    report = index.report()
+    elapsed = time.perf_counter() - started
+    expected = {(f"original-{i}.mp3", (f"copy-{i}.mp3",)) for i in range(songs)}
+    found = {(os.path.basename(group['keep']), tuple(os.path.basename(path) for path in group['duplicates']))
+             for group in report['groups']}
+    return {
+        'benchmark': 'fingerprint', 'phase': 'report', 'library_files': files,
+        'groups': len(report['groups']), 'expected_groups': songs, 'all_correct': found == expected,
+        'reclaimable_bytes': report['reclaimable_bytes'], 'report_ms': elapsed * 1000,
+    }
+
+
+def main():
+    songs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else LIBRARY_FILES
+    pcm = [synthetic_song(seed) for seed in range(songs)]
+    copy_pcm = [copy_of(song, seed) for seed, song in enumerate(pcm)]
+    originals, record = bench_fingerprint(pcm)
+    print(json.dumps(record), flush=True)
+    copies = [fingerprint(song).fingerprint() for song in copy_pcm]
+    print(json.dumps(bench_compare(originals, copies)), flush=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library = Library(os.path.join(tmp, "library.db"))
+        files = max(files, 2 * songs)
+        fill_library(library, tmp, originals, copies, files)
+        index = FingerprintIndex(library)
+        prefix = int(PREFIX_SECONDS * FINGERPRINT_RATE)
+        prefixes = [fingerprint(song[:prefix]).fingerprint() for song in copy_pcm]
+        new_prefixes = [fingerprint(synthetic_song(100 + seed, seconds=PREFIX_SECONDS)).fingerprint()
+                        for seed in range(songs)]
+        print(json.dumps(bench_lookup(index, prefixes, new_prefixes, tmp, files)), flush=True)
+        print(json.dumps(bench_report(index, songs, files)), flush=True)
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Cost of the instrumentation hooks, disabled and enabled
+
+Times span(), begin()/end() and count() in a tight loop with tracing off
+(the default) and with tracing on, writing each format to a temporary
+file, and reports nanoseconds per call.
+
+    python benchmarks/bench_instrumentation.py [calls]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import instrumentation
+
+CALLS = 200000
+
+
+def per_call_ns(action, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        action()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def with_span():
+    with instrumentation.span('bench.span', url="https://example.com"):
+        pass
+
+
+def begin_end():
+    instrumentation.end(instrumentation.begin('bench.begin'), result='ok')
+
+
+def measure(mode, calls):
+    return {
+        'benchmark': 'instrumentation', 'mode': mode, 'calls': calls,
+        'span_ns': per_call_ns(with_span, calls),
+        'begin_end_ns': per_call_ns(begin_end, calls),
+        'count_ns': per_call_ns(lambda: instrumentation.count('bench.counter'), calls),
+    }
+
+
+def main(calls=CALLS):
+    print(json.dumps(measure('disabled', calls)))
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("jsonl", "chrome"):
+            path = os.path.join(tmp, f"trace.{fmt}")
+            instrumentation.enable(path, fmt)
+            result = measure(fmt, calls)
+            instrumentation.disable()
+            result['trace_bytes'] = sum(os.path.getsize(os.path.join(tmp, name))
+                                        for name in os.listdir(tmp) if name.startswith(f"trace.{fmt}"))
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
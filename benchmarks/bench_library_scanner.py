@@ -0,0 +1,79 @@
+"""Local library scan throughput: cold scan, unchanged rescan, 1% changed, watcher poll
+
+Builds a synthetic collection of small files (artist/album/track layout)
+in a temporary directory and scans it into a throwaway library. Tag
+reading uses mutagen when it is installed; the generated files carry no
+tags, so the numbers mostly measure walking, stat'ing and writing.
+
+    python benchmarks/bench_library_scanner.py [files] [workers]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library import Library
+from library_scanner import LibraryScanner, LibraryWatcher
+
+FILES = 20000
+TRACKS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 5
+
+
+def build_collection(root, files):
+    for i in range(files):
+        album = i // TRACKS_PER_ALBUM
+        artist = album // ALBUMS_PER_ARTIST
+        directory = os.path.join(root, f"Artist {artist}", f"Album {album}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{i % TRACKS_PER_ALBUM:02d} Track {i}.mp3"), "wb") as f:
+            f.write(b"\0" * 64)
+
+
+def throughput(name, files, stats):
+    result = {'benchmark': 'library_scanner', 'phase': name, 'files': files}
+    result.update(stats.as_dict())
+    result['files_per_second'] = files / stats.seconds if stats.seconds else None
+    return result
+
+
+def main(files=FILES, workers=8):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "music")
+        build_collection(root, files)
+        library = Library(os.path.join(tmp, "library.db"))
+        scanner = LibraryScanner(library, workers=workers)
+
+        print(json.dumps(throughput('cold', files, scanner.scan([root]))))
+        print(json.dumps(throughput('unchanged', files, scanner.scan([root]))))
+
+        later = time.time() + 10
+        for i in range(0, files, 100):
+            album = i // TRACKS_PER_ALBUM
+            path = os.path.join(root, f"Artist {album // ALBUMS_PER_ARTIST}", f"Album {album}",
+                                f"{i % TRACKS_PER_ALBUM:02d} Track {i}.mp3")
+            os.utime(path, (later, later))
+        print(json.dumps(throughput('one_percent_changed', files, scanner.scan([root]))))
+
+        # Watcher: one new file and one deleted file, found without a full rescan
+        watcher = LibraryWatcher(scanner)
+        watcher._directories.update(scanner.scan([root]).directories)
+        first_album = os.path.join(root, "Artist 0", "Album 0")
+        with open(os.path.join(first_album, "99 New Track.mp3"), "wb") as f:
+            f.write(b"\0" * 64)
+        os.remove(os.path.join(first_album, "00 Track 0.mp3"))
+        started = time.perf_counter()
+        stats = watcher.poll()
+        poll = {'benchmark': 'library_scanner', 'phase': 'watcher_poll', 'files': files,
+                'directories': len(watcher._directories), 'added': stats.added,
+                'removed': stats.removed, 'seconds': time.perf_counter() - started}
+        print(json.dumps(poll))
+        library.close()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
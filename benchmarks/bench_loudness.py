@@ -0,0 +1,88 @@
+"""Loudness analysis throughput in tracks per minute per core
+
+The 'meter' phase times LoudnessMeter alone on synthetic 4 minute stereo
+PCM, fed in the 10 s pieces measure_file reads. The 'pipeline' phase
+writes WAV files and runs measure_file (FFmpeg decode plus meter) over a
+process pool; it is skipped when ffmpeg is not on PATH.
+
+    python benchmarks/bench_loudness.py [tracks] [workers]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loudness import ANALYSIS_RATE, CHANNELS, SEGMENTS_PER_READ, LoudnessMeter, measure_file
+
+TRACK_SECONDS = 240
+
+
+def synthetic_track(seed, seconds=TRACK_SECONDS):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * ANALYSIS_RATE)) / ANALYSIS_RATE
+    level = 10 ** (rng.uniform(-30, -6) / 20)
+    mono = level * (0.5 * np.sin(2 * np.pi * 220 * t) + 0.5 * rng.standard_normal(len(t)) / 3)
+    return np.stack([mono, mono * 0.8], axis=1).astype(np.float32)
+
+
+def bench_meter(tracks=5):
+    piece = int(ANALYSIS_RATE * 0.1) * SEGMENTS_PER_READ
+    pcm = [synthetic_track(i) for i in range(tracks)]
+    started = time.process_time()
+    for samples in pcm:
+        meter = LoudnessMeter()
+        for start in range(0, len(samples), piece):
+            meter.add(samples[start:start + piece])
+        meter.integrated()
+    cpu = time.process_time() - started
+    return {
+        'benchmark': 'loudness', 'phase': 'meter', 'tracks': tracks, 'track_seconds': TRACK_SECONDS,
+        'cpu_seconds': cpu, 'tracks_per_minute_per_core': tracks / cpu * 60,
+    }
+
+
+def write_wav(path, samples):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(CHANNELS)
+        f.setsampwidth(2)
+        f.setframerate(ANALYSIS_RATE)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes())
+
+
+def bench_pipeline(tracks, workers):
+    if shutil.which("ffmpeg") is None:
+        return {'benchmark': 'loudness', 'phase': 'pipeline', 'skipped': "ffmpeg not found"}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(tracks):
+            path = os.path.join(tmp, f"track{i}.wav")
+            write_wav(path, synthetic_track(i))
+            paths.append(path)
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(measure_file, paths))
+        elapsed = time.perf_counter() - started
+    return {
+        'benchmark': 'loudness', 'phase': 'pipeline', 'tracks': tracks, 'workers': workers,
+        'track_seconds': TRACK_SECONDS, 'failed': sum(1 for result in results if result is None),
+        'seconds': elapsed, 'tracks_per_minute': tracks / elapsed * 60,
+        'tracks_per_minute_per_core': tracks / elapsed * 60 / workers,
+    }
+
+
+def main(tracks=8, workers=None):
+    workers = workers or os.cpu_count() or 1
+    print(json.dumps(bench_meter()))
+    print(json.dumps(bench_pipeline(tracks, workers)))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
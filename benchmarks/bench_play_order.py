@@ -0,0 +1,62 @@
+"""Shuffle toggle and next/previous cost at 1k/10k/100k tracks
+
+Compares PlayOrder with the old approach of copying and shuffling the
+list of track dicts and restoring it with list.index().
+
+    python benchmarks/bench_play_order.py
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from play_order import PlayOrder
+
+SIZES = (1000, 10000, 100000)
+STEPS = 1000
+
+
+def timed_us(action, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        action()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def old_toggle(playlist, position):
+    """Shuffle on and off the way toggle_shuffle used to"""
+    original = playlist.copy()
+    random.shuffle(playlist)
+    current = playlist[position]
+    playlist = original.copy()
+    return playlist.index(current)
+
+
+def bench_size(size):
+    playlist = [{'title': f"Track {i}", 'path': f"downloads/{i}.opus"} for i in range(size)]
+    order = PlayOrder(lambda: size)
+    order.jump(size // 2)
+
+    def toggle():
+        order.set_shuffle(True)
+        order.set_shuffle(False)
+
+    result = {'benchmark': 'play_order', 'tracks': size}
+    result['toggle_us'] = timed_us(toggle, 100)
+    order.set_shuffle(True)
+    result['shuffled_next_us'] = timed_us(lambda: order.next(True), STEPS)
+    result['shuffled_previous_us'] = timed_us(lambda: order.previous(True), STEPS)
+    result['old_toggle_us'] = timed_us(lambda: old_toggle(playlist, size - 1), 3)
+    return result
+
+
+def main():
+    for size in SIZES:
+        print(json.dumps(bench_size(size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Thread count, idle CPU and track-to-track gaps of the playback engine
+
+Drives the engine through many track changes with a silent backend and
+checks that no threads leak, each end of track advances exactly once, and
+that an idle (paused/stopped) engine does not wake up. A second run plays
+short timed tracks through a polled backend, once loading each track
+after the previous one ended and once with the next track queued, and
+reports the gaps the engine measured.
+
+    python benchmarks/bench_playback_engine.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playback_engine import PlaybackEngine, PlaybackState
+from track import Track
+
+
+class SilentBackend:
+    """Backend whose tracks end when the benchmark says so"""
+
+    needs_polling = False
+
+    def __init__(self):
+        self.plays = 0
+        self.on_finished = None
+
+    def play(self, track, on_first_audio, on_finished):
+        self.plays += 1
+        self.on_finished = on_finished
+        on_first_audio(0.0)
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def is_busy(self):
+        return True
+
+
+class TimedBackend:
+    """Polled backend whose tracks last a fixed time, like the mixer with a queue"""
+
+    needs_polling = True
+
+    def __init__(self, length, gapless):
+        self.length = length
+        self.gapless = gapless
+        self.started = 0.0
+        self.queued = False
+
+    def play(self, track, on_first_audio, on_finished):
+        self.started = time.monotonic()
+        self.queued = False
+        on_first_audio(0.0)
+
+    def queue(self, track):
+        self.queued = self.gapless
+        return self.gapless
+
+    def took_over(self, length=None):
+        if self.queued and time.monotonic() - self.started >= self.length:
+            self.started += self.length
+            self.queued = False
+            return True
+        return False
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def stop(self):
+        self.queued = False
+
+    def is_busy(self):
+        return self.queued or time.monotonic() - self.started < self.length
+
+    def position(self):
+        return time.monotonic() - self.started
+
+
+def measure_gaps(gapless, tracks=10, length=0.25):
+    playlist = [Track(f"Track {i}", path=__file__, duration=length) for i in range(tracks)]
+    gaps = []
+    stopped = threading.Event()
+
+    def notify(event, data):
+        if event == 'transition':
+            gaps.append(data['gap_ms'])
+        elif event == 'stopped':
+            stopped.set()
+
+    engine = PlaybackEngine(
+        get_track=lambda i: playlist[i] if 0 <= i < len(playlist) else None,
+        playlist_length=lambda: len(playlist),
+        file_backend=TimedBackend(length, gapless),
+        notify=notify
+    )
+    engine.play(0)
+    stopped.wait(tracks * length + 5)
+    stats = engine.stats()
+    engine.shutdown()
+    return {
+        'transitions': len(gaps),
+        'gapless_transitions': stats['gapless_transitions'],
+        'mean_gap_ms': sum(gaps) / len(gaps) if gaps else None,
+        'max_gap_ms': max(gaps) if gaps else None,
+    }
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def main(tracks=200, idle_seconds=2.0):
+    playlist = [Track(f"Track {i}", path=__file__) for i in range(tracks)]
+    backend = SilentBackend()
+    threads_before = threading.active_count()
+    engine = PlaybackEngine(
+        get_track=lambda i: playlist[i] if 0 <= i < len(playlist) else None,
+        playlist_length=lambda: len(playlist),
+        file_backend=backend
+    )
+
+    # Fire every end-of-track notice twice; only one may advance
+    started = time.perf_counter()
+    engine.play(0)
+    for i in range(1, tracks):
+        wait_for(lambda: backend.plays == i)
+        finished = backend.on_finished
+        finished()
+        finished()
+    wait_for(lambda: backend.plays == tracks)
+    backend.on_finished()
+    wait_for(lambda: engine.state == PlaybackState.STOPPED)
+    transitions = time.perf_counter() - started
+
+    wakeups_before = engine.wakeups
+    cpu_before = time.process_time()
+    time.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu_before
+    idle_wakeups = engine.wakeups - wakeups_before
+    threads_after = threading.active_count()
+    engine.shutdown()
+
+    print(json.dumps({
+        'benchmark': 'playback_engine_gaps',
+        'load_after_end': measure_gaps(gapless=False),
+        'queued_next': measure_gaps(gapless=True),
+    }))
+    print(json.dumps({
+        'benchmark': 'playback_engine',
+        'tracks': tracks,
+        'plays': backend.plays,
+        'duplicate_advances': backend.plays - tracks,
+        'transition_ms': transitions / tracks * 1000,
+        'engine_threads': threads_after - threads_before,
+        'idle_wakeups_per_second': idle_wakeups / idle_seconds,
+        'idle_cpu_percent': idle_cpu / idle_seconds * 100,
+    }))
+
+
+if __name__ == "__main__":
+    main()
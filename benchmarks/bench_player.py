@@ -0,0 +1,155 @@
+"""Round trips of the player's main actions at 1k/10k/100k tracks
+
+Runs main.py's MusicPlayer against the stand-ins in fakes.py (instant
+downloads, a wall-clock mixer, fake ffmpeg/ffprobe and widgets), so it
+needs no network, audio device or display. Each size starts from a
+library holding that many tracks and reports import and startup time,
+then median/p95/max milliseconds for:
+
+- add_to_playlist: button press until the downloaded track is in the view
+- toggle_shuffle: button press until the engine applied the new order
+- next_track / previous_track: button press until the 'playing' event
+  has been handled by the window
+- save_playlist and load_saved_playlist (until the view was redrawn)
+
+Round trips include the window's polling of the core queue, like a user
+would see them. Output is one JSON object per line.
+
+    python benchmarks/bench_player.py [sizes...]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakes
+
+fakes.install()
+
+SIZES = (1000, 10000, 100000)
+RUNS = 20
+PUMP_TIMEOUT = 10.0
+
+
+def pump(player, done, timeout=PUMP_TIMEOUT):
+    """Run the fake window's event loop until done() is true"""
+    deadline = time.monotonic() + timeout
+    while not done():
+        if time.monotonic() > deadline:
+            raise TimeoutError("benchmark step did not finish")
+        if not player.window.update():
+            time.sleep(0.0005)
+
+
+def timings(name, size, samples):
+    samples = sorted(samples)
+    return {
+        'benchmark': 'player', 'tracks': size, 'operation': name, 'runs': len(samples),
+        'median_ms': samples[len(samples) // 2] * 1000,
+        'p95_ms': samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+
+def timed(action, player=None, done=None):
+    started = time.perf_counter()
+    action()
+    if done is not None:
+        pump(player, done)
+    return time.perf_counter() - started
+
+
+def build_library(size):
+    from library import DEFAULT_PLAYLIST, Library
+    from player_core import LIBRARY_PATH
+    from track import Track
+
+    os.makedirs("downloads", exist_ok=True)
+    path = os.path.join("downloads", "shared.mp3")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 4096)
+    library = Library(LIBRARY_PATH)
+    library.append_entries(library.playlist_id(DEFAULT_PLAYLIST), [
+        Track(f"Track {i}", path=path, url=f"https://www.youtube.com/watch?v=lib{i}", duration=200,
+              source_id=f"youtube:lib{i}")
+        for i in range(size)
+    ])
+    library.set_meta("active_playlist", DEFAULT_PLAYLIST)
+    library.close()
+
+
+def bench_size(size, main):
+    results = []
+    build_library(size)
+
+    started = time.perf_counter()
+    player = main.MusicPlayer()
+    pump(player, lambda: not player.scheduler.pending and len(player.core.playlist) == size)
+    results.append({'benchmark': 'player', 'tracks': size, 'operation': 'startup',
+                    'ms': (time.perf_counter() - started) * 1000})
+
+    core = player.core
+    events = {'playing': 0}
+    core.add_listener(lambda event, data: events.__setitem__(event, events.get(event, 0) + 1))
+
+    samples = []
+    for i in range(RUNS):
+        before = len(core.playlist)
+        player.url_entry.insert("end", f"https://www.youtube.com/watch?v=add{size}x{i}")
+        samples.append(timed(player.add_to_playlist, player, lambda: len(core.playlist) > before))
+    results.append(timings('add_to_playlist', size, samples))
+
+    core.play(0)
+    pump(player, lambda: core.is_playing)
+
+    samples = []
+    for _ in range(RUNS):
+        expected = not core.shuffle_enabled
+        samples.append(timed(player.toggle_shuffle, player,
+                             lambda: core.engine.play_order.shuffle == expected))
+    results.append(timings('toggle_shuffle', size, samples))
+
+    for name in ('next_track', 'previous_track'):
+        samples = []
+        for _ in range(RUNS):
+            before = events['playing']
+            samples.append(timed(getattr(player, name), player, lambda: events['playing'] > before))
+        results.append(timings(name, size, samples))
+
+    samples = []
+    for i in range(5):
+        fakes.settings['input'] = f"Saved {i}"
+        samples.append(timed(player.save_playlist))
+    results.append(timings('save_playlist', size, samples))
+
+    samples = []
+    for _ in range(5):
+        samples.append(timed(core.load_saved_playlist, player, lambda: not player.scheduler.pending))
+    results.append(timings('load_saved_playlist', size, samples))
+
+    player.quit_app()
+    return results
+
+
+def main(sizes=SIZES):
+    started = time.perf_counter()
+    import main as player_main
+    print(json.dumps({'benchmark': 'player', 'operation': 'import', 'ms': (time.perf_counter() - started) * 1000}))
+
+    home = os.getcwd()
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                for result in bench_size(size, player_main):
+                    print(json.dumps(result), flush=True)
+            finally:
+                os.chdir(home)
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or SIZES)
@@ -0,0 +1,102 @@
+"""Refresh latency of the playlist Treeview at 1k/10k/100k tracks
+
+Compares the incremental PlaylistView against rebuilding every row, for
+the operations the player performs: initial load, adding a track,
+highlighting the playing row, removing a row and scrolling. Needs a
+display and reports itself skipped without one; on a headless box run it
+under Xvfb:
+
+    xvfb-run python benchmarks/bench_playlist_view.py
+"""
+import json
+import os
+import sys
+import time
+import tkinter
+from tkinter import ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playlist_view import PlaylistView
+from track import Track
+
+SIZES = (1000, 10000, 100000)
+
+
+def make_playlist(size):
+    return [
+        Track(f"Track {i}", path=f"downloads/Youtube-{i}.opus", url=f"https://www.youtube.com/watch?v={i}",
+              duration=180 + i % 120, source_id=f"youtube:{i}")
+        for i in range(size)
+    ]
+
+
+def row_values(track):
+    return (track.title, str(track.duration), track.source_label)
+
+
+def timed(root, action):
+    """Milliseconds for action plus the redraw it causes"""
+    started = time.perf_counter()
+    action()
+    root.update_idletasks()
+    return (time.perf_counter() - started) * 1000
+
+
+def naive_rebuild(tree, playlist):
+    tree.delete(*tree.get_children())
+    for track in playlist:
+        tree.insert("", "end", values=row_values(track))
+
+
+def bench_size(root, size):
+    frame = ttk.Frame(root)
+    frame.pack(fill="both", expand=True)
+    tree = ttk.Treeview(frame, columns=("Title", "Duration", "Source"), show="headings", height=30)
+    scrollbar = ttk.Scrollbar(frame, orient="vertical")
+    scrollbar.pack(side="right", fill="y")
+    tree.pack(side="left", fill="both", expand=True)
+    root.update_idletasks()
+
+    playlist = make_playlist(size)
+    view = PlaylistView(tree, scrollbar, lambda i: playlist[i], lambda: len(playlist), row_values)
+    result = {'benchmark': 'playlist_view', 'tracks': size}
+
+    result['load_ms'] = timed(root, view.reset)
+
+    def add():
+        playlist.append(make_playlist(1)[0])
+        view.insert(len(playlist) - 1)
+    result['add_ms'] = timed(root, add)
+    result['highlight_ms'] = timed(root, lambda: view.set_current(size // 2))
+
+    def remove():
+        del playlist[size // 3]
+        view.remove(size // 3)
+    result['remove_ms'] = timed(root, remove)
+    result['scroll_ms'] = timed(root, lambda: view.see(size - 1))
+
+    frame.destroy()
+    frame = ttk.Frame(root)
+    frame.pack(fill="both", expand=True)
+    tree = ttk.Treeview(frame, columns=("Title", "Duration", "Source"), show="headings", height=30)
+    tree.pack(fill="both", expand=True)
+    result['naive_rebuild_ms'] = timed(root, lambda: naive_rebuild(tree, playlist))
+    frame.destroy()
+    return result
+
+
+def main():
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError as e:
+        print(json.dumps({'benchmark': 'playlist_view', 'skipped': f"no display ({e})"}))
+        return
+    root.withdraw()
+    for size in SIZES:
+        print(json.dumps(bench_size(root, size)))
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Seeking in a 2-hour MP3: index build, lookup and seek latency
+
+The file is synthesized: silent 32 kbit/s MPEG-1 Layer III frames, about
+275,000 of them, so it needs no encoder.
+
+- index: time to walk every frame header into a SeekIndex, its size as
+  stored in the library, and the time of one lookup.
+- seek: MusicBackend.seek() to points across the file, once through the
+  mixer's own seek (what a file without an index gets) and once through
+  the index. The position reported right after the seek and 200 ms later
+  shows the clock follows the jump. Against the pygame stand-in in
+  fakes.py the mixer does no decoding, so only the index path's own
+  overhead is meaningful there ('mixer': 'stand-in').
+
+    python benchmarks/bench_seek.py
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Decoding costs the same without a sound card
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from audio_output import mixer
+from playback_engine import MusicBackend
+from seek_index import build_index
+from track import Track
+
+SECONDS = 2 * 3600
+# MPEG-1 Layer III, 32 kbit/s, 44.1 kHz, mono, no padding: 104 bytes, 1152 samples
+FRAME = bytes((0xff, 0xfb, 0x10, 0xc0)) + bytes(100)
+FRAME_SECONDS = 1152 / 44100
+TARGETS = (60, 1800, 3600, 7100)
+RUNS = 5
+
+
+class StaticIndexes:
+    """SeekIndexes stand-in that always answers with one prebuilt index"""
+
+    def __init__(self, index=None):
+        self.index = index
+
+    def get(self, path):
+        return self.index
+
+
+def write_mp3(path, seconds=SECONDS):
+    frames = int(seconds / FRAME_SECONDS) + 1
+    chunk = FRAME * 10000
+    with open(path, 'wb') as f:
+        for _ in range(frames // 10000):
+            f.write(chunk)
+        f.write(FRAME * (frames % 10000))
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def index_stats(path):
+    times = []
+    for _ in range(3):
+        started = time.perf_counter()
+        index = build_index(path)
+        times.append(time.perf_counter() - started)
+    row = index.to_row()
+    lookups = [random.uniform(0, index.duration) for _ in range(100000)]
+    started = time.perf_counter()
+    for seconds in lookups:
+        index.locate(seconds)
+    lookup = (time.perf_counter() - started) / len(lookups)
+    return index, {
+        'benchmark': 'seek', 'operation': 'index', 'file_mib': round(os.path.getsize(path) / 1024 ** 2, 1),
+        'duration_s': round(index.duration, 1), 'entries': len(index),
+        'build_ms': median(times) * 1000,
+        'stored_kib': round((len(row['times']) + len(row['offsets'])) / 1024, 1),
+        'lookup_us': lookup * 1e6,
+    }
+
+
+def seek_stats(path, index, stand_in):
+    track = Track("long mix", path=path, duration=index.duration)
+    for method, backend in (('mixer', MusicBackend()), ('index', MusicBackend(StaticIndexes(index)))):
+        for target in TARGETS:
+            latencies = []
+            for _ in range(RUNS):
+                # A fresh load each time, as after starting the track
+                backend.play(track, on_first_audio=lambda seconds: None, on_finished=lambda: None)
+                started = time.perf_counter()
+                landed = backend.seek(track, target)
+                latencies.append(time.perf_counter() - started)
+                reported = backend.position()
+            time.sleep(0.2)
+            later = backend.position()
+            backend.stop()
+            print(json.dumps({
+                'benchmark': 'seek', 'operation': 'seek', 'method': method,
+                'mixer': 'stand-in' if stand_in else 'pygame', 'target_s': target,
+                'landed_s': round(landed, 3), 'seek_ms': median(latencies) * 1000,
+                'max_seek_ms': max(latencies) * 1000,
+                'position_s': round(reported, 3), 'position_after_200ms_s': round(later, 3),
+            }), flush=True)
+
+
+def main():
+    stand_in = 'fakes' in sys.modules
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "long.mp3")
+        write_mp3(path)
+        index, record = index_stats(path)
+        print(json.dumps(record), flush=True)
+        mixer()
+        seek_stats(path, index, stand_in)
+
+
+if __name__ == "__main__":
+    main()
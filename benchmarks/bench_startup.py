@@ -0,0 +1,105 @@
+"""Cold start: import time and time to an interactive window
+
+Every sample is a fresh interpreter, so nothing is cached in sys.modules:
+
+- import: ``import main`` against the installed libraries, and which of
+  the heavy ones (pygame, yt-dlp, numpy, pystray, Pillow) it pulled in.
+  deferred_ms is what importing those afterwards costs, i.e. what the
+  startup path no longer pays for.
+- window: from the start of ``import main`` until the window's first idle
+  callback ran (MusicPlayer.on_window_ready), then until the background
+  warm-up (FFmpeg probe, mixer, yt-dlp) finished. Runs against the Tk and
+  audio stand-ins in fakes.py, so it needs no display and measures the
+  player's own startup work.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARK_DIR)
+RUNS = 5
+DEFERRED = ('pygame', 'yt_dlp', 'numpy', 'pystray', 'PIL')
+
+IMPORT_CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+import main
+import_ms = (time.perf_counter() - started) * 1000
+loaded = [name for name in {deferred!r} if name in sys.modules]
+started = time.perf_counter()
+for name in {deferred!r}:
+    try:
+        __import__(name)
+    except Exception:
+        pass
+print(json.dumps({{'import_ms': import_ms, 'loaded': loaded,
+                  'deferred_ms': (time.perf_counter() - started) * 1000}}))
+"""
+
+WINDOW_CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, {benchmarks!r})
+import fakes
+fakes.install()
+started = time.perf_counter()
+import main
+import_ms = (time.perf_counter() - started) * 1000
+ready, warm = [], []
+on_window_ready = main.MusicPlayer.on_window_ready
+def record_ready(self, *args):
+    ready.append(time.perf_counter())
+    on_window_ready(self, *args)
+main.MusicPlayer.on_window_ready = record_ready
+warm_up = main.PlayerCore.warm_up
+def record_warm_up(self):
+    warm_up(self)
+    warm.append(time.perf_counter())
+main.PlayerCore.warm_up = record_warm_up
+player = main.MusicPlayer()
+while not (ready and warm):
+    if not player.window.update():
+        time.sleep(0.0005)
+window_ms = (ready[0] - started) * 1000
+warm_ms = (warm[0] - started) * 1000
+player.quit_app()
+print(json.dumps({{'import_ms': import_ms, 'window_ms': window_ms, 'warm_up_done_ms': warm_ms}}))
+"""
+
+
+def run_child(code, cwd):
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, timeout=120)
+    if result.returncode:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summary(operation, samples, **extra):
+    record = {'benchmark': 'startup', 'operation': operation, 'runs': len(samples), **extra}
+    for key in samples[0]:
+        if key.endswith('_ms'):
+            values = sorted(sample[key] for sample in samples)
+            record[key] = values[len(values) // 2]
+    return record
+
+
+def main(runs=RUNS):
+    code = IMPORT_CHILD.format(root=ROOT, deferred=DEFERRED)
+    samples = [run_child(code, ROOT) for _ in range(runs)]
+    print(json.dumps(summary('import', samples, loaded=samples[-1]['loaded'])))
+
+    code = WINDOW_CHILD.format(root=ROOT, benchmarks=BENCHMARK_DIR)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "downloads"))
+        samples = [run_child(code, tmp) for _ in range(runs)]
+    print(json.dumps(summary('window', samples)))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
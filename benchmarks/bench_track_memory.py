@@ -0,0 +1,77 @@
+"""Memory held by a 1k/10k/100k track playlist in each representation
+
+Compares the list of dicts the player used to keep, a list of slotted
+Track objects and the columnar TrackTable that backs loaded playlists.
+Track data is built the way downloads produce it, so each title, path and
+URL is its own string while the source names repeat.
+
+    python benchmarks/bench_track_memory.py
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from track import Track, TrackTable
+
+SIZES = (1000, 10000, 100000)
+
+
+def track_fields(i):
+    source = "youtube" if i % 3 else "soundcloud"
+    return {
+        'title': f"Track number {i}",
+        'path': f"downloads/{source}-{i:08d}.opus",
+        'url': f"https://www.{source}.com/watch?v={i:08d}",
+        'duration': 180.0 + i % 120,
+        'source_id': f"{source}:{i:08d}",
+    }
+
+
+def as_dicts(size):
+    return [track_fields(i) for i in range(size)]
+
+
+def as_tracks(size):
+    tracks = []
+    for i in range(size):
+        fields = track_fields(i)
+        tracks.append(Track(fields['title'], path=fields['path'], url=fields['url'],
+                            duration=fields['duration'], source_id=fields['source_id'], id=i))
+    return tracks
+
+
+def as_table(size):
+    table = TrackTable()
+    for track in as_tracks(size):
+        table.append(track)
+    return table
+
+
+def measure(build, size):
+    """Bytes still allocated once build(size) has returned"""
+    gc.collect()
+    tracemalloc.start()
+    kept = build(size)
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current
+
+
+def main():
+    for size in SIZES:
+        result = {'benchmark': 'track_memory', 'tracks': size}
+        for name, build in (('dicts', as_dicts), ('tracks', as_tracks), ('table', as_table)):
+            used = measure(build, size)
+            result[f'{name}_mb'] = used / 2 ** 20
+            result[f'{name}_bytes_per_track'] = used / size
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
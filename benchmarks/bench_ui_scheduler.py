@@ -0,0 +1,95 @@
+"""Wakeups per second of the UI refresh scheduler
+
+Replays the player's refresh tasks against a simulated Tk event loop so it
+runs headless, and reports wakeups per second while playing, while idle
+with the window shown, and while hidden in the tray. The core callback
+task only runs when something is posted, simulated as one post every
+POST_INTERVAL_MS while playing (engine and status events).
+
+    python benchmarks/bench_ui_scheduler.py
+"""
+import heapq
+import itertools
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ui_scheduler import RefreshScheduler
+
+POST_INTERVAL_MS = 5000
+
+
+class SimulatedWindow:
+    """Implements the after/after_idle/after_cancel subset on a virtual clock"""
+
+    def __init__(self):
+        self.now_ms = 0
+        self._timers = []
+        self._ids = itertools.count()
+        self._cancelled = set()
+
+    def after(self, delay_ms, callback):
+        after_id = next(self._ids)
+        heapq.heappush(self._timers, (self.now_ms + delay_ms, after_id, callback))
+        return after_id
+
+    def after_idle(self, callback):
+        return self.after(0, callback)
+
+    def after_cancel(self, after_id):
+        self._cancelled.add(after_id)
+
+    def run_for(self, duration_ms):
+        end = self.now_ms + duration_ms
+        while self._timers and self._timers[0][0] <= end:
+            due, after_id, callback = heapq.heappop(self._timers)
+            if after_id in self._cancelled:
+                continue
+            self.now_ms = due
+            callback()
+        self.now_ms = end
+
+
+def measure(window, scheduler, seconds):
+    before = scheduler.wakeups
+    window.run_for(seconds * 1000)
+    return (scheduler.wakeups - before) / seconds
+
+
+def main(seconds=60):
+    window = SimulatedWindow()
+    scheduler = RefreshScheduler(window)
+    state = {'playing': True, 'posted': 0}
+
+    def process_pending():
+        processed, state['posted'] = state['posted'] > 0, 0
+        return processed
+
+    def post():
+        if state['playing']:
+            state['posted'] += 1
+            scheduler.wake("ui_queue")
+        window.after(POST_INTERVAL_MS, post)
+
+    scheduler.add_task("ui_queue", process_pending, 50)
+    scheduler.add_task("progress", lambda: state['playing'], 100)
+    window.after(POST_INTERVAL_MS, post)
+
+    playing = measure(window, scheduler, seconds)
+    state['playing'] = False
+    idle_visible = measure(window, scheduler, seconds)
+    scheduler.set_visible(False)
+    hidden = measure(window, scheduler, seconds)
+
+    print(json.dumps({
+        'benchmark': 'ui_scheduler',
+        'playing_wakeups_per_second': playing,
+        'idle_visible_wakeups_per_second': idle_visible,
+        'hidden_wakeups_per_second': hidden,
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,495 @@
+"""Stand-ins for yt-dlp, pygame, FFmpeg and the Tk/tray stack
+
+install() registers fake modules in sys.modules, so it has to run before
+the player's modules are imported, and puts fake ffmpeg/ffprobe
+executables first on PATH. With them the player runs on a headless box
+with no network, audio device or display. Downloads finish after
+``settings['extract_seconds'] + settings['transfer_seconds']``, 0 by
+default, so the numbers measure the player's own overhead.
+"""
+import heapq
+import itertools
+import os
+import re
+import stat
+import sys
+import tempfile
+import threading
+import time
+import types
+from urllib.parse import parse_qs, urlsplit
+
+settings = {
+    'extract_seconds': 0.0,
+    'transfer_seconds': 0.0,
+    'file_bytes': 4096,
+    'track_seconds': 3600,  # long enough that nothing ends on its own mid-benchmark
+    'input': "Benchmark",  # what CTkInputDialog answers
+    'directory': "",  # what filedialog.askdirectory answers
+}
+
+
+# yt-dlp
+
+def _video_id(url):
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+    if 'v' in query:
+        return query['v'][0]
+    return parts.path.rstrip("/").rsplit("/", 1)[-1] or "index"
+
+
+def _extractor_key(url):
+    if "youtube" in url or "youtu.be" in url:
+        return "Youtube"
+    if "soundcloud" in url:
+        return "SoundCloud"
+    return "Generic"
+
+
+class FakeInfoExtractor:
+    def __init__(self, name, pattern):
+        self.name = name
+        self.pattern = re.compile(pattern)
+
+    def suitable(self, url):
+        return bool(self.pattern.search(url))
+
+    def get_temp_id(self, url):
+        return _video_id(url) if self.name == "Youtube" else None
+
+
+EXTRACTORS = {
+    'Youtube': FakeInfoExtractor("Youtube", r"youtube\.com/watch\?|youtu\.be/"),
+    'SoundCloud': FakeInfoExtractor("SoundCloud", r"soundcloud\.com/[^/]+/[^/?]+"),
+}
+
+
+class FakeYoutubeDL:
+    """Answers extract_info() from the URL alone and writes a small file on download
+
+    Like yt-dlp, process_ie_result(info, download=True) downloads what an
+    extract_info(download=False) call returned.
+    """
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True, process=True):
+        search = re.match(r"(yt|sc)search(\d*):(.*)", url)
+        if search:
+            count = int(search.group(2) or 1)
+            return {'_type': 'playlist', 'title': search.group(3), 'entries': [
+                {'url': f"https://www.youtube.com/watch?v={search.group(3)}{i}", 'ie_key': 'Youtube',
+                 'title': f"{search.group(3)} {i}", 'duration': 200} for i in range(count)
+            ]}
+        if "list=" in url:
+            return {'_type': 'playlist', 'title': f"Playlist {_video_id(url)}", 'entries': [
+                {'url': f"https://www.youtube.com/watch?v=pl{i}", 'ie_key': 'Youtube',
+                 'title': f"Entry {i}", 'duration': 200} for i in range(25)
+            ]}
+
+        time.sleep(settings['extract_seconds'])
+        info = {
+            'id': _video_id(url),
+            'title': f"Track {_video_id(url)}",
+            'duration': 200,
+            'extractor_key': _extractor_key(url),
+            'webpage_url': url,
+            'acodec': 'mp3',
+            'abr': 128,
+            'asr': 44100,
+            'ext': 'mp3',
+        }
+        return self.process_ie_result(info, download) if download else info
+
+    def process_ie_result(self, info, download=True):
+        if not download:
+            return info
+        time.sleep(settings['transfer_seconds'])
+        path = self.params.get('outtmpl', '%(id)s.%(ext)s') % info
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"\0" * settings['file_bytes'])
+        for hook in self.params.get('progress_hooks', []):
+            hook({'status': 'downloading', 'downloaded_bytes': settings['file_bytes'],
+                  'total_bytes': settings['file_bytes']})
+            hook({'status': 'finished', 'filename': path})
+        info['requested_downloads'] = [dict(info, filepath=path)]
+        return info
+
+    def run_pp(self, postprocessor, info):
+        return info
+
+
+class FakeExtractAudioPP:
+    def __init__(self, downloader=None, **options):
+        self.options = options
+
+
+# pygame
+
+class FakePygameError(Exception):
+    pass
+
+
+class FakeMusic:
+    """pygame.mixer.music on the wall clock; a track plays for settings['track_seconds']
+
+    Like pygame, get_pos() counts time since play() and ignores the start
+    position and set_pos().
+    """
+
+    def __init__(self):
+        self.loaded = None
+        self.volume = 1.0
+        self.loads = 0
+        self._started = None
+        self._skipped = 0.0  # seconds jumped over since play()
+        self._paused_at = None
+        self._queued = None
+
+    def load(self, source, namehint=""):
+        if isinstance(source, str) and not os.path.exists(source):
+            raise FakePygameError(f"No file '{source}' found")
+        self.loaded = source
+        self.loads += 1
+
+    def play(self, loops=0, start=0.0):
+        self._started = time.monotonic() - start
+        self._skipped = start
+        self._paused_at = None
+
+    def queue(self, path):
+        self._queued = path
+
+    def pause(self):
+        if self._paused_at is None:
+            self._paused_at = time.monotonic()
+
+    def unpause(self):
+        if self._paused_at is not None and self._started is not None:
+            self._started += time.monotonic() - self._paused_at
+        self._paused_at = None
+
+    def stop(self):
+        self._started = None
+        self._paused_at = None
+
+    def unload(self):
+        self.loaded = None
+        self._queued = None
+
+    def set_pos(self, seconds):
+        if self._started is not None:
+            self._skipped += seconds - self._elapsed()
+            self._started = (self._paused_at or time.monotonic()) - seconds
+
+    def get_pos(self):
+        if self._started is None:
+            return -1
+        return int((self._elapsed() - self._skipped) * 1000)
+
+    def get_busy(self):
+        return self._started is not None and self._elapsed() < settings['track_seconds']
+
+    def _elapsed(self):
+        return (self._paused_at or time.monotonic()) - self._started
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def get_volume(self):
+        return self.volume
+
+
+class FakeChannel:
+    def __init__(self, index=0):
+        self.index = index
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+# Tk, customtkinter, pystray, PIL
+
+class FakeWidget:
+    """Accepts any widget call; remembers options so cget() answers"""
+
+    def __init__(self, master=None, **options):
+        self.master = master
+        self.options = dict(options)
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    config = configure
+
+    def cget(self, key):
+        return self.options.get(key, "")
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class FakeTclError(Exception):
+    pass
+
+
+class FakeWindow(FakeWidget):
+    """CTk window whose after() callbacks run from update() on the real clock
+
+    event_generate() may be called from any thread, as with a threaded
+    Tcl; the bound callback runs from the next update().
+    """
+
+    def __init__(self, **options):
+        super().__init__(None, **options)
+        self._timers = []
+        self._ids = itertools.count()
+        self._cancelled = set()
+        self._bindings = {}
+        self._timers_lock = threading.Lock()
+
+    def after(self, delay_ms, callback=None, *args):
+        with self._timers_lock:
+            after_id = next(self._ids)
+            heapq.heappush(self._timers, (time.monotonic() + delay_ms / 1000, after_id, callback, args))
+        return after_id
+
+    def bind(self, sequence, callback=None, add=None):
+        self._bindings[sequence] = callback
+
+    def event_generate(self, sequence, **options):
+        callback = self._bindings.get(sequence)
+        if callback is not None:
+            self.after(0, callback, None)
+
+    def after_idle(self, callback, *args):
+        return self.after(0, callback, *args)
+
+    def after_cancel(self, after_id):
+        self._cancelled.add(after_id)
+
+    def update(self):
+        """Run every callback that is due; returns how many ran"""
+        ran = 0
+        now = time.monotonic()
+        while True:
+            with self._timers_lock:
+                if not self._timers or self._timers[0][0] > now:
+                    break
+                _, after_id, callback, args = heapq.heappop(self._timers)
+            if after_id in self._cancelled:
+                self._cancelled.discard(after_id)
+                continue
+            callback(*args)
+            ran += 1
+        return ran
+
+    update_idletasks = update
+
+    def mainloop(self):
+        pass
+
+
+class FakeVar:
+    def __init__(self, master=None, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class FakeEntry(FakeWidget):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.text = ""
+
+    def get(self):
+        return self.text
+
+    def insert(self, index, text):
+        self.text = self.text + text if index == "end" else text + self.text
+
+    def delete(self, first, last=None):
+        self.text = ""
+
+
+class FakeSwitch(FakeWidget):
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.value = 0
+
+    def select(self):
+        self.value = 1
+
+    def deselect(self):
+        self.value = 0
+
+    def get(self):
+        return self.value
+
+
+class FakeInputDialog:
+    def __init__(self, text="", title=""):
+        self.text = text
+
+    def get_input(self):
+        return settings['input']
+
+
+class FakeTreeview(FakeWidget):
+    """The Treeview calls PlaylistView makes, on a dict of rows"""
+
+    def __init__(self, master=None, **options):
+        super().__init__(master, **options)
+        self.items = {}
+        self.order = []
+        self.selected = ()
+        self._ids = itertools.count()
+
+    def insert(self, parent, index, iid=None, **options):
+        iid = iid or f"I{next(self._ids)}"
+        self.items[iid] = options
+        if index == "end":
+            self.order.append(iid)
+        else:
+            self.order.insert(index, iid)
+        return iid
+
+    def delete(self, *iids):
+        for iid in iids:
+            self.items.pop(iid, None)
+        removed = set(iids)
+        self.order = [iid for iid in self.order if iid not in removed]
+
+    def get_children(self, item=""):
+        return tuple(self.order)
+
+    def item(self, iid, **options):
+        if options:
+            self.items[iid].update(options)
+        return self.items[iid]
+
+    def move(self, iid, parent, index):
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def selection(self):
+        return self.selected
+
+
+class FakeStyle:
+    def lookup(self, style, option):
+        return 20
+
+
+class FakeIcon(FakeWidget):
+    def __init__(self, name, image=None, menu=None):
+        super().__init__(None, menu=menu)
+        self.visible = False
+
+    def run(self):
+        pass
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+
+def _write_executable(directory, name, body):
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write(f"#!{sys.executable}\n{body}")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
+
+
+FFMPEG_SCRIPT = """import sys
+if '-version' in sys.argv:
+    print('ffmpeg version benchmark-fake')
+elif sys.argv[-1] == '-':
+    # One second of stereo float silence for decoders reading stdout
+    sys.stdout.buffer.write(bytes(44100 * 2 * 4))
+"""
+
+FFPROBE_SCRIPT = """import json, os, sys
+path = sys.argv[-1]
+if not os.path.exists(path):
+    sys.exit(1)
+print(json.dumps({'format': {'duration': '200.0', 'bit_rate': '128000'},
+                  'streams': [{'codec_name': 'mp3', 'sample_rate': '44100', 'bit_rate': '128000'}]}))
+"""
+
+
+def install(gui: bool = True) -> str:
+    """Register the stand-ins; returns the directory holding fake ffmpeg/ffprobe
+
+    With gui=False only yt-dlp, pygame and FFmpeg are replaced, so
+    benchmarks that need a real Tk keep it.
+    """
+    yt_dlp = _module("yt_dlp", YoutubeDL=FakeYoutubeDL, __path__=[])
+    yt_dlp.extractor = _module("yt_dlp.extractor", get_info_extractor=EXTRACTORS.__getitem__)
+    yt_dlp.postprocessor = _module("yt_dlp.postprocessor", FFmpegExtractAudioPP=FakeExtractAudioPP)
+    music = FakeMusic()
+    mixer = _module(
+        "pygame.mixer",
+        music=music,
+        init=lambda *args, **kwargs: None,
+        quit=lambda: None,
+        get_init=lambda: (44100, -16, 2),
+        get_sdl_mixer_version=lambda: (2, 6, 0),
+        set_reserved=lambda count: count,
+        Channel=FakeChannel,
+        Sound=FakeChannel,
+    )
+    pygame = _module("pygame", mixer=mixer, error=FakePygameError, __path__=[])
+    sys.modules.update({
+        'yt_dlp': yt_dlp,
+        'yt_dlp.extractor': yt_dlp.extractor,
+        'yt_dlp.postprocessor': yt_dlp.postprocessor,
+        'pygame': pygame,
+        'pygame.mixer': mixer,
+    })
+
+    if gui:
+        ttk = _module("tkinter.ttk", Treeview=FakeTreeview, Scrollbar=FakeWidget, Style=FakeStyle,
+                      Frame=FakeWidget)
+        filedialog = _module("tkinter.filedialog", askdirectory=lambda **kwargs: settings['directory'])
+        tkinter = _module("tkinter", ttk=ttk, filedialog=filedialog, TclError=FakeTclError, __path__=[])
+        ctk = _module(
+            "customtkinter",
+            CTk=FakeWindow, CTkFrame=FakeWidget, CTkLabel=FakeWidget, CTkButton=FakeWidget,
+            CTkRadioButton=FakeWidget, CTkSlider=FakeWidget, CTkSwitch=FakeSwitch, CTkEntry=FakeEntry,
+            CTkProgressBar=FakeWidget, CTkInputDialog=FakeInputDialog, StringVar=FakeVar,
+        )
+        image = _module("PIL.Image", new=lambda *args, **kwargs: None)
+        sys.modules.update({
+            'tkinter': tkinter,
+            'tkinter.ttk': ttk,
+            'tkinter.filedialog': filedialog,
+            'customtkinter': ctk,
+            'pystray': _module("pystray", Icon=FakeIcon, Menu=lambda *items: items,
+                               MenuItem=lambda text, action: (text, action)),
+            'PIL': _module("PIL", Image=image, __path__=[]),
+            'PIL.Image': image,
+        })
+
+    bin_dir = tempfile.mkdtemp(prefix="fake-ffmpeg-")
+    _write_executable(bin_dir, "ffmpeg", FFMPEG_SCRIPT)
+    _write_executable(bin_dir, "ffprobe", FFPROBE_SCRIPT)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', "")
+    return bin_dir
@@ -0,0 +1,108 @@
+"""Run every benchmark and append the results to a JSON-lines file
+
+Each benchmarks/bench_*.py script runs in its own process with the
+yt-dlp, pygame and FFmpeg stand-ins from fakes.py installed (the Tk
+stand-ins only where a script installs them itself), so the suite runs
+on a headless Linux box. Every JSON line a script prints is written out
+with the run's metadata (timestamp, git commit, Python, platform); a
+script that fails or times out is recorded with its exit code and the
+end of its stderr instead, so one broken benchmark never hides the rest.
+
+    python benchmarks/run_all.py [--output results.jsonl] [--only player loudness] [--real]
+
+--real runs the scripts against the installed libraries instead.
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCHMARK_DIR)
+TIMEOUT = 1800
+
+# Installs the audio/network stand-ins, then runs the script as __main__
+RUNNER = (
+    "import runpy, sys; sys.path.insert(0, {dir!r}); import fakes; fakes.install(gui=False); "
+    "sys.argv = [{script!r}]; runpy.run_path({script!r}, run_name='__main__')"
+)
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() or None
+
+
+def run_script(script, real):
+    if real:
+        command = [sys.executable, script]
+    else:
+        command = [sys.executable, "-c", RUNNER.format(dir=BENCHMARK_DIR, script=script)]
+    started = time.perf_counter()
+    try:
+        result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, timeout=TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return [], {'error': f"timed out after {TIMEOUT}s"}, time.perf_counter() - started
+    records = []
+    for line in result.stdout.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    failure = None
+    if result.returncode:
+        failure = {'error': f"exit code {result.returncode}", 'stderr': result.stderr[-2000:]}
+    return records, failure, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="JSON-lines file to append to (default: stdout)")
+    parser.add_argument("--only", nargs="*", help="script names without the bench_ prefix")
+    parser.add_argument("--real", action="store_true", help="use the installed yt-dlp/pygame/FFmpeg")
+    args = parser.parse_args(argv)
+
+    run = {
+        'run_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'fakes': not args.real,
+    }
+    scripts = sorted(glob.glob(os.path.join(BENCHMARK_DIR, "bench_*.py")))
+    if args.only:
+        scripts = [s for s in scripts if os.path.basename(s)[len("bench_"):-len(".py")] in args.only]
+
+    output = open(args.output, "a") if args.output else sys.stdout
+    failed = 0
+    try:
+        for script in scripts:
+            name = os.path.basename(script)[len("bench_"):-len(".py")]
+            records, failure, seconds = run_script(script, args.real)
+            if failure:
+                failed += 1
+                records.append(dict(failure, benchmark=name))
+            for record in records:
+                output.write(json.dumps(dict(run, script=name, **record)) + "\n")
+            output.flush()
+            print(f"{name}: {len(records)} results in {seconds:.1f}s" + (" (failed)" if failure else ""),
+                  file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from download_manager import DownloadPriority
+from search import SearchResult
+
+# URLs that name a playlist, album, channel or user rather than one track
+COLLECTION_PATTERNS = (
+    re.compile(r"youtube\.com/(playlist|channel/|c/|user/|@)", re.IGNORECASE),
+    re.compile(r"[?&]list=", re.IGNORECASE),
+    re.compile(r"soundcloud\.com/[^/?#]+/(sets|albums|tracks|likes|reposts)(/|$|\?)", re.IGNORECASE),
+    re.compile(r"soundcloud\.com/[^/?#]+/?$", re.IGNORECASE),
+)
+
+# Nested playlists (channel tabs) are followed this many levels deep
+MAX_NESTING = 2
+
+
+def is_collection_url(url: str) -> bool:
+    return any(pattern.search(url) for pattern in COLLECTION_PATTERNS)
+
+
+def extract_entries(url: str) -> Tuple[str, List[SearchResult]]:
+    """Title and entries of a playlist or channel, metadata only
+
+    One flat extraction lists the whole collection without resolving the
+    formats of any entry, which is what makes a large playlist cheap.
+    """
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+    }
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        entries: List[SearchResult] = []
+        _collect(ydl, info, entries, MAX_NESTING)
+    return info.get('title') or url, entries
+
+
+def _collect(ydl, info, entries: List[SearchResult], depth: int):
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        result = SearchResult.from_entry(info, info.get('extractor_key', ""))
+        if result:
+            entries.append(result)
+        return
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        # Channel pages list their tabs (Videos, Shorts...) as playlists
+        nested = entry.get('_type') == 'playlist' or entry.get('ie_key') == 'YoutubeTab'
+        if nested and depth > 0:
+            if entry.get('_type') != 'playlist':
+                entry = ydl.extract_info(entry['url'], download=False)
+            _collect(ydl, entry, entries, depth - 1)
+        elif not nested:
+            result = SearchResult.from_entry(entry, entry.get('ie_key', ""))
+            if result:
+                entries.append(result)
+
+
+class BulkImport:
+    """Feeds the entries of an imported collection to a DownloadManager
+
+    At most ``concurrency`` of its jobs are queued or running at a time, so
+    a 500 track import leaves room for tracks the user adds meanwhile, and
+    can be cancelled without flushing hundreds of queued jobs. Every entry
+    is a pending track that is already in the playlist; ``on_complete(track,
+    job)`` and ``on_error(track, job)`` report each one as it finishes,
+    including jobs later retried through the manager. ``options`` go with
+    every job to the manager's download function.
+    """
+
+    def __init__(self, manager, tracks: List, title: str = "", concurrency: int = 3,
+                 on_complete: Optional[Callable] = None, on_error: Optional[Callable] = None,
+                 on_finished: Optional[Callable] = None, options: Optional[Dict] = None):
+        self.manager = manager
+        self.tracks = tracks
+        self.title = title
+        self.concurrency = max(1, concurrency)
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.on_finished = on_finished
+        self.options = options
+        self.done = 0
+        self.failed = 0
+        self.cancelled = False
+        self._reported = False
+        self._next = 0
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return len(self.tracks)
+
+    @property
+    def finished(self) -> bool:
+        return self.done + self.failed >= self.total or (self.cancelled and not self._jobs)
+
+    def start(self):
+        for _ in range(self.concurrency):
+            self._submit_next()
+        self._report_finished()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            self.manager.cancel(job.id)
+
+    def _submit_next(self):
+        with self._lock:
+            if self.cancelled or self._next >= len(self.tracks):
+                return
+            track = self.tracks[self._next]
+            self._next += 1
+            job = self.manager.submit(
+                track.url,
+                on_complete=lambda job: self._job_done(track, job, True),
+                on_error=lambda job: self._job_done(track, job, False),
+                priority=DownloadPriority.BULK,
+                options=self.options
+            )
+            self._jobs[job.id] = job
+
+    def _job_done(self, track, job, ok: bool):
+        with self._lock:
+            # Retried jobs aren't ours anymore; they only fill in the track
+            ours = self._jobs.pop(job.id, None) is not None
+            if ours and ok:
+                self.done += 1
+            elif ours:
+                self.failed += 1
+        callback = self.on_complete if ok else self.on_error
+        if callback:
+            callback(track, job)
+        if ours:
+            self._submit_next()
+            self._report_finished()
+
+    def _report_finished(self):
+        with self._lock:
+            report = self.finished and not self._reported
+            self._reported = self._reported or report
+        if report and self.on_finished:
+            self.on_finished(self)
@@ -0,0 +1,254 @@
+import ipaddress
+import json
+import signal
+import socket
+import threading
+from concurrent.futures import TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from player_core import PlayerCore
+from search import is_url
+
+# The API has no authentication, so it only ever listens on loopback
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Seconds a request waits for the core thread before answering 503
+COMMAND_TIMEOUT = 5.0
+# Bodies larger than this are refused without being read
+MAX_BODY_BYTES = 64 * 1024
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class ControlError(Exception):
+    """A request the API refuses, with the HTTP status to answer it with"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _position(body: Dict) -> Optional[int]:
+    position = body.get('position')
+    if position is None:
+        return None
+    if not isinstance(position, int) or isinstance(position, bool) or position < 0:
+        raise ControlError(400, "position must be a non-negative integer")
+    return position
+
+
+def _enqueue(core: PlayerCore, body: Dict) -> Dict:
+    url = body.get('url')
+    if not isinstance(url, str) or not is_url(url.strip()):
+        raise ControlError(400, "url must be an http(s) URL")
+    reuse_duplicates = body.get('reuse_duplicates')
+    if reuse_duplicates is not None and not isinstance(reuse_duplicates, bool):
+        raise ControlError(400, "reuse_duplicates must be true or false")
+    queued = core.queue_url(url.strip(), body.get('title'), play=bool(body.get('play')),
+                            reuse_duplicates=reuse_duplicates)
+    if not queued:
+        raise ControlError(503, core.last_status['message'] if core.last_status else "Could not queue URL")
+    return {'queued': url.strip()}
+
+
+def _volume(core: PlayerCore, body: Dict) -> Dict:
+    volume = body.get('volume')
+    if not isinstance(volume, (int, float)) or isinstance(volume, bool):
+        raise ControlError(400, "volume must be a number between 0 and 1")
+    core.set_volume(volume)
+    return {'volume': core.volume}
+
+
+def _seek(core: PlayerCore, body: Dict) -> Dict:
+    seconds = body.get('seconds')
+    if not isinstance(seconds, (int, float)) or isinstance(seconds, bool) or seconds < 0:
+        raise ControlError(400, "seconds must be a non-negative number")
+    core.seek(seconds)
+    return {'seconds': seconds}
+
+
+# POST endpoints: (core, body) -> result, run on the core thread
+COMMANDS = {
+    '/play': lambda core, body: core.play(_position(body)),
+    '/pause': lambda core, body: core.pause(),
+    '/toggle': lambda core, body: core.toggle_play(),
+    '/stop': lambda core, body: core.stop(),
+    '/seek': _seek,
+    '/next': lambda core, body: core.next_track(),
+    '/previous': lambda core, body: core.previous_track(),
+    '/enqueue': _enqueue,
+    '/volume': _volume,
+    '/shuffle': lambda core, body: core.set_shuffle(bool(body.get('enabled', not core.shuffle_enabled))),
+    '/repeat': lambda core, body: core.set_repeat(bool(body.get('enabled', not core.repeat_enabled))),
+    '/duplicates': lambda core, body: core.find_duplicates(),
+}
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so scripts polling /status don't pay a TCP handshake each time
+    protocol_version = "HTTP/1.1"
+    server_version = "UniversalMelody"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        core = self.server.core
+        if url.path == '/status':
+            # Read straight from the core's attributes, never waiting on its thread
+            self._reply(200, core.status())
+        elif url.path == '/playlist':
+            query = parse_qs(url.query)
+            try:
+                offset = int(query.get('offset', ['0'])[0])
+                limit = min(int(query.get('limit', ['100'])[0]), 1000)
+            except ValueError:
+                self._reply(400, {'error': "offset and limit must be integers"})
+                return
+            self._run(lambda: {'playlist': core.playlist_name, 'tracks': len(core.playlist),
+                               'offset': offset, 'entries': core.playlist_page(offset, limit)})
+        elif url.path == '/duplicates':
+            self._reply(200, {'report': core.last_duplicate_report})
+        else:
+            self._reply(404, {'error': f"Unknown endpoint {url.path}"})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        command = COMMANDS.get(path)
+        if command is None:
+            self._discard_body()
+            self._reply(404, {'error': f"Unknown endpoint {path}"})
+            return
+        try:
+            body = self._read_body()
+        except ControlError as e:
+            self._reply(e.status, {'error': str(e)})
+            return
+        core = self.server.core
+        self._run(lambda: {'ok': True, 'result': command(core, body), 'status': core.status()})
+
+    def _run(self, fn):
+        """Run fn on the core thread, so commands apply in order with the player's own work"""
+        try:
+            result = self.server.core.call(fn, timeout=COMMAND_TIMEOUT)
+        except ControlError as e:
+            self._reply(e.status, {'error': str(e)})
+        except TimeoutError:
+            self._reply(503, {'error': "Player is busy, try again"})
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+        else:
+            self._reply(200, result)
+
+    def _read_body(self) -> Dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise ControlError(413, "Request body too large")
+        # A web page can only send this type after a CORS preflight, which is never answered
+        content_type = (self.headers.get('Content-Type') or "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._discard_body()
+            raise ControlError(415, "Content-Type must be application/json")
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ControlError(400, "Body must be JSON")
+        if not isinstance(body, dict):
+            raise ControlError(400, "Body must be a JSON object")
+        return body
+
+    def _discard_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if 0 < length <= MAX_BODY_BYTES:
+            self.rfile.read(length)
+        elif length:
+            self.close_connection = True
+
+    def _reply(self, status: int, payload: Dict):
+        data = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Every status poll would otherwise print a line
+        pass
+
+
+class ControlHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Backlog of connections waiting to be accepted, for bursts of clients
+    request_queue_size = 128
+
+    def __init__(self, address, core: PlayerCore):
+        self.core = core
+        if ":" in address[0]:
+            # An IPv6 loopback such as ::1 needs an IPv6 socket
+            self.address_family = socket.AF_INET6
+        super().__init__(address, ControlRequestHandler)
+
+
+class ControlServer:
+    """Local HTTP/JSON control API for a PlayerCore
+
+    GET /status and GET /playlist?offset=&limit= read the player, GET
+    /duplicates the last duplicate report; POST /play ({"position": n}
+    optional), /pause, /toggle, /stop, /seek ({"seconds"}), /next,
+    /previous, /enqueue ({"url", "title", "play", "reuse_duplicates"}),
+    /volume ({"volume"}), /shuffle and /repeat ({"enabled"} optional)
+    control it, and POST /duplicates starts a new report. Each client
+    connection gets its own thread; commands are handed to the core thread
+    with PlayerCore.call(), while /status reads without waiting on it.
+    POST requests must be sent as application/json, even without a body.
+    """
+
+    def __init__(self, core: PlayerCore, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        if not is_loopback(host):
+            raise ValueError(f"Control API must listen on a loopback address, not {host}")
+        self.core = core
+        self.httpd = ControlHTTPServer((host, port), core)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self):
+        return self.httpd.server_address[:2]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="control-server", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def run_headless(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Run the player without a window, controlled through the HTTP API"""
+    core = PlayerCore()
+    core.add_listener(
+        lambda event, data: print(data['message'], flush=True) if event == 'status' else None
+    )
+    server = ControlServer(core, host, port)
+    server.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: core.stop())
+    print(f"Control API listening on http://{server.address[0]}:{server.address[1]}", flush=True)
+    core.start()
+    try:
+        core.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        core.shutdown()
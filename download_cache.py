@@ -0,0 +1,198 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import instrumentation
+
+# Extractors we can map a URL to a video id for without touching the network
+OFFLINE_EXTRACTORS = ('Youtube', 'SoundCloud')
+
+
+class DownloadCache:
+    """Persistent index of downloaded files keyed by extractor and video id
+
+    Entries are evicted least recently used first once the files on disk
+    exceed ``max_bytes``. Cache hits only touch access times, so they are
+    written at most every SAVE_DELAY seconds and on flush(); store() and
+    link() save right away.
+    """
+
+    SAVE_DELAY = 5.0
+
+    def __init__(self, directory: str = "downloads", max_bytes: int = 2 * 1024 ** 3,
+                 is_protected: Optional[Callable[[str], bool]] = None):
+        self.directory = directory
+        self.index_path = os.path.join(directory, "cache_index.json")
+        self.max_bytes = max_bytes
+        self.is_protected = is_protected or (lambda path: False)
+        self.entries: Dict[str, Dict] = {}
+        self.aliases: Dict[str, str] = {}  # URL or offline id -> cache key
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self._save_timer: Optional[threading.Timer] = None
+        self.load()
+
+    @staticmethod
+    def make_key(extractor: str, video_id: str) -> str:
+        return f"{extractor.lower()}:{video_id}"
+
+    @classmethod
+    def offline_key(cls, url: str) -> Optional[str]:
+        """Work out the cache key from the URL alone, if the extractor allows it"""
+        from yt_dlp.extractor import get_info_extractor
+
+        for name in OFFLINE_EXTRACTORS:
+            ie = get_info_extractor(name)
+            if ie.suitable(url):
+                video_id = ie.get_temp_id(url)
+                return cls.make_key(name, video_id) if video_id else None
+        return None
+
+    def load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        with self._lock:
+            self.entries = data.get("entries", {})
+            self.aliases = data.get("aliases", {})
+
+    def save(self):
+        """Write the index atomically so a crash never leaves it half written"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            data = {"entries": self.entries, "aliases": self.aliases}
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+
+    def flush(self):
+        """Write changes still waiting for the save timer, e.g. at shutdown"""
+        with self._lock:
+            if self._save_timer is not None:
+                self.save()
+
+    def _save_later(self):
+        with self._lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.SAVE_DELAY, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Return the cached entry for a URL, or None on a miss"""
+        # offline_key() runs the extractor regexes; keep that off the lock
+        key = self.aliases.get(url) or self.offline_key(url)
+        with self._lock:
+            key = self.aliases.get(key, key)
+            entry = self.entries.get(key) if key else None
+            if entry and not os.path.exists(entry['path']):
+                # File was removed behind our back
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                instrumentation.count('cache.misses')
+                return None
+
+            self.hits += 1
+            instrumentation.count('cache.hits')
+            entry['last_access'] = time.time()
+            self.aliases[url] = key
+            self._save_later()
+            return dict(entry, cached=True)
+
+    def store(self, url: str, info: Dict, path: str) -> Dict:
+        """Record a freshly downloaded file and enforce the disk budget"""
+        key = self.make_key(info['extractor_key'], info['id'])
+        entry = {
+            'key': key,
+            'title': info['title'],
+            'path': path,
+            'duration': info.get('duration'),
+            'size': os.path.getsize(path),
+            'last_access': time.time(),
+        }
+        offline_key = self.offline_key(url)
+        with self._lock:
+            old = self.entries.get(key)
+            if (old and not old.get('linked') and old['path'] != path and os.path.exists(old['path'])
+                    and old['path'] not in self._linked_paths()):
+                os.remove(old['path'])
+            self.entries[key] = entry
+            self.aliases[url] = key
+            if offline_key and offline_key != key:
+                self.aliases[offline_key] = key
+            self.evict(keep=key)
+            self.save()
+        return dict(entry, cached=False)
+
+    def link(self, url: str, info: Dict, path: str) -> Dict:
+        """Record an existing file holding the same audio as url, in place of a download
+
+        The file isn't ours: it takes no room in the budget, so evict()
+        skips the entry and never deletes the file. When path is a cached
+        download, that entry is kept on disk for as long as this one exists.
+        The entry goes away once lookup() finds the file gone.
+        """
+        key = self.make_key(info['extractor_key'], info['id'])
+        entry = {
+            'key': key,
+            'title': info['title'],
+            'path': path,
+            'duration': info.get('duration'),
+            'size': 0,
+            'linked': True,
+            'last_access': time.time(),
+        }
+        offline_key = self.offline_key(url)
+        with self._lock:
+            self.entries[key] = entry
+            self.aliases[url] = key
+            if offline_key and offline_key != key:
+                self.aliases[offline_key] = key
+            self.save()
+        return dict(entry, cached=False)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry['size'] for entry in self.entries.values())
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Delete least recently used files until the cache fits the budget"""
+        freed = 0
+        with self._lock:
+            total = self.total_bytes()
+            linked_paths = self._linked_paths()
+            for key, entry in sorted(self.entries.items(), key=lambda item: item[1]['last_access']):
+                if total <= self.max_bytes:
+                    break
+                if (key == keep or entry.get('linked') or entry['path'] in linked_paths
+                        or self.is_protected(entry['path'])):
+                    continue
+                try:
+                    os.remove(entry['path'])
+                except FileNotFoundError:
+                    pass
+                total -= entry['size']
+                freed += entry['size']
+                self._remove(key)
+        return freed
+
+    def _linked_paths(self) -> set:
+        """Files that linked entries play, which must stay on disk"""
+        return {entry['path'] for entry in self.entries.values() if entry.get('linked')}
+
+    def _remove(self, key: str):
+        self.entries.pop(key, None)
+        for alias in [a for a, k in self.aliases.items() if k == key]:
+            del self.aliases[alias]
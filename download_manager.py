@@ -0,0 +1,433 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import instrumentation
+
+
+class DownloadCancelled(Exception):
+    """Raised from a progress hook to abort a cancelled download"""
+
+
+class DownloadPriority:
+    """Lower runs first; bulk imports wait behind everything a user is waiting for"""
+    PLAY_NOW = 0  # the track that should be playing
+    NEXT = 1  # upcoming tracks in play order
+    USER = 2  # added by hand
+    BULK = 3  # entries of an imported playlist or channel
+
+
+class DownloadJob:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, job_id: int, url: str, on_complete=None, on_error=None, on_progress=None,
+                 priority: int = DownloadPriority.USER, options: Optional[Dict] = None):
+        self.id = job_id
+        self.url = url
+        self.priority = priority
+        self.options = options or {}  # keyword arguments for download_fn
+        self.status = self.QUEUED
+        self.progress = 0.0
+        self.downloaded_bytes = 0
+        self.total_bytes = None
+        self.result = None
+        self.error = None
+        self.attempts = 0
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self._cancel_event = threading.Event()
+        self._last_progress_dispatch = 0.0
+        self._received: Optional[int] = None  # bytes of the current file charged to the budget
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds from submission until the job finished (or until now)"""
+        return (self.finished_at or time.monotonic()) - self.submitted_at
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.DONE, self.FAILED, self.CANCELLED)
+
+    def cancel(self):
+        self._cancel_event.set()
+
+
+class HostRateLimiter:
+    """Spaces out requests to the same host by at least ``min_interval`` seconds
+
+    Callers reserve the next free slot for the host under a lock and then
+    sleep outside it, so different hosts never wait on each other.
+    """
+
+    def __init__(self, min_interval: float = 0.5):
+        self.min_interval = min_interval
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url: str) -> str:
+        host = urlsplit(url).hostname or ""
+        # www.youtube.com, m.youtube.com and youtube.com share one budget
+        parts = host.split(".")
+        return ".".join(parts[-2:]) if len(parts) > 2 else host
+
+    def wait(self, url: str, cancelled: Optional[threading.Event] = None):
+        """Block until url's host may be contacted again"""
+        host = self.host(url)
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot.get(host, now), now)
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            if cancelled is not None:
+                cancelled.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+class _Flow:
+    __slots__ = ('weight', 'limit', 'tokens', 'updated', 'window_bytes', 'demand')
+
+    def __init__(self, weight: float, now: float):
+        self.weight = weight
+        self.limit = 0.0  # bytes per second, set by _share()
+        self.tokens = 0.0
+        self.updated = now
+        self.window_bytes = 0
+        self.demand = float('inf')  # what the source can deliver, once known
+
+
+class BandwidthBudget:
+    """Shares ``rate`` bytes per second between the running downloads
+
+    Each download reports the bytes it received from its progress hook and
+    is held there, so yt-dlp stops reading, until its share covers them.
+    Shares are weighted by priority (a PLAY_NOW download gets 8 times what
+    a BULK one gets) and max-min fair: a download whose source is slower
+    than its share keeps what it uses and the rest goes to the others.
+    A rate of None turns the budget off.
+    """
+
+    # Seconds of unused share a download may catch up on at once
+    BURST = 0.5
+    # Seconds between two measurements of what each download gets
+    REBALANCE_INTERVAL = 0.5
+
+    def __init__(self, rate: Optional[float] = None):
+        self.rate = rate
+        self._flows: Dict[int, _Flow] = {}
+        self._lock = threading.Lock()
+        self._measured_at = time.monotonic()
+
+    @staticmethod
+    def weight(priority: int) -> float:
+        return 2.0 ** (DownloadPriority.BULK - priority)
+
+    def set_rate(self, rate: Optional[float]):
+        with self._lock:
+            self.rate = rate
+            self._share(time.monotonic())
+
+    def add(self, job: DownloadJob):
+        with self._lock:
+            now = time.monotonic()
+            self._flows[job.id] = _Flow(self.weight(job.priority), now)
+            self._share(now)
+
+    def remove(self, job: DownloadJob):
+        with self._lock:
+            if self._flows.pop(job.id, None) is not None:
+                self._share(time.monotonic())
+
+    def reweight(self, job: DownloadJob):
+        with self._lock:
+            flow = self._flows.get(job.id)
+            if flow is not None:
+                flow.weight = self.weight(job.priority)
+                self._share(time.monotonic())
+
+    def consume(self, job: DownloadJob, nbytes: int, cancelled: Optional[threading.Event] = None):
+        """Account for nbytes received by job; blocks while it is over its share"""
+        if self.rate is None or nbytes <= 0:
+            return
+        with self._lock:
+            flow = self._flows.get(job.id)
+            if flow is None:
+                return
+            now = time.monotonic()
+            flow.window_bytes += nbytes
+            if now - self._measured_at >= self.REBALANCE_INTERVAL:
+                self._measure(now)
+            self._refill(flow, now)
+            flow.tokens -= nbytes
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(flow, now)
+                if self.rate is None or flow.tokens >= 0 or job.id not in self._flows:
+                    break
+                # Re-check at least every interval, the share may have grown
+                delay = min(-flow.tokens / flow.limit, self.REBALANCE_INTERVAL)
+            if cancelled is not None:
+                if cancelled.wait(delay):
+                    break
+            else:
+                time.sleep(delay)
+            waited += delay
+        if waited:
+            instrumentation.count('downloads.throttled_seconds', waited)
+
+    def _refill(self, flow: _Flow, now: float):
+        flow.tokens = min(flow.tokens + (now - flow.updated) * flow.limit, flow.limit * self.BURST)
+        flow.updated = now
+
+    def _measure(self, now: float):
+        """Find the downloads held back by their source rather than by the budget"""
+        elapsed = now - self._measured_at
+        self._measured_at = now
+        for flow in self._flows.values():
+            received = flow.window_bytes / elapsed
+            flow.window_bytes = 0
+            # Using most of its share: it could take more. Otherwise the
+            # source is the limit; leave it some room to speed up again.
+            flow.demand = float('inf') if received >= 0.9 * flow.limit else received * 1.25
+        self._share(now)
+
+    def _share(self, now: float):
+        """Weighted max-min fair split of the rate (water filling)"""
+        if self.rate is None:
+            return
+        remaining = self.rate
+        total_weight = sum(flow.weight for flow in self._flows.values())
+        for flow in sorted(self._flows.values(), key=lambda f: f.demand / f.weight):
+            self._refill(flow, now)
+            share = remaining * flow.weight / total_weight
+            # A floor keeps a download that was idle (extracting) from starting at zero
+            flow.limit = max(min(flow.demand, share), share / 4, 1.0)
+            remaining = max(remaining - flow.limit, 0.0)
+            total_weight -= flow.weight
+
+
+class DownloadManager:
+    """Runs downloads on a bounded pool of worker threads
+
+    ``download_fn(url, progress_hook, **options)`` does the actual work and
+    returns the yt-dlp info dict; ``options`` are given per job at submit(). Job callbacks are handed to ``dispatch`` so the caller
+    can marshal them back onto the UI thread.
+
+    Queued jobs start in priority order, then in submission order. The
+    ``urgent_workers`` extra threads only take PLAY_NOW and NEXT jobs, so a
+    track about to play starts even while a bulk import keeps every
+    regular worker busy. Running downloads share ``bandwidth``.
+    """
+
+    # Minimum seconds between two progress callbacks for the same job
+    PROGRESS_INTERVAL = 0.25
+
+    def __init__(self, download_fn: Callable, workers: int = 3, dispatch: Optional[Callable] = None,
+                 urgent_workers: int = 1, bandwidth: Optional[BandwidthBudget] = None):
+        self.download_fn = download_fn
+        self.dispatch = dispatch or (lambda callback, *args: callback(*args))
+        self.bandwidth = bandwidth or BandwidthBudget()
+        self._heap = []  # (priority, submission order, job)
+        self._ready = threading.Condition()
+        self._stopped = False
+        self._jobs: Dict[int, DownloadJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+        for _ in range(max(1, workers)):
+            self._start_worker(DownloadPriority.BULK)
+        for _ in range(max(0, urgent_workers)):
+            self._start_worker(DownloadPriority.NEXT)
+
+    def submit(self, url: str, on_complete=None, on_error=None, on_progress=None,
+               priority: int = DownloadPriority.USER, options: Optional[Dict] = None) -> DownloadJob:
+        """Queue a download and return its job"""
+        job = DownloadJob(next(self._ids), url, on_complete, on_error, on_progress, priority, options)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._push(job)
+        instrumentation.count('downloads.queued')
+        return job
+
+    def prioritize(self, url: str, priority: int) -> bool:
+        """Move unfinished downloads of url up to priority; False if there are none"""
+        found = False
+        for job in self.jobs():
+            if job.url != url or job.finished:
+                continue
+            found = True
+            if priority >= job.priority:
+                continue
+            job.priority = priority
+            if job.status == DownloadJob.QUEUED:
+                # The old heap entry is skipped once this one has been taken
+                self._push(job)
+            else:
+                self.bandwidth.reweight(job)
+        return found
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job"""
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel()
+        return True
+
+    def cancel_all(self) -> int:
+        """Cancel every job that has not finished yet"""
+        return sum(1 for job in self.jobs() if self.cancel(job.id))
+
+    def retry(self, job_id: int) -> Optional[DownloadJob]:
+        """Re-queue a failed or cancelled job with the same callbacks"""
+        job = self._jobs.get(job_id)
+        if job is None or job.status not in (DownloadJob.FAILED, DownloadJob.CANCELLED):
+            return None
+        return self.submit(job.url, job.on_complete, job.on_error, job.on_progress, job.priority, job.options)
+
+    def retry_failed(self) -> List[DownloadJob]:
+        """Re-queue every failed job"""
+        failed = [job for job in self.jobs() if job.status == DownloadJob.FAILED]
+        retried = [self.retry(job.id) for job in failed]
+        with self._lock:
+            for job in failed:
+                self._jobs.pop(job.id, None)
+        return retried
+
+    def jobs(self) -> List[DownloadJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def pending_count(self) -> int:
+        """Number of jobs that are queued or still downloading"""
+        return sum(1 for job in self.jobs() if not job.finished)
+
+    def forget_finished(self):
+        """Drop successfully finished jobs from the job table"""
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.status == DownloadJob.DONE]:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        """Cancel outstanding work and stop the worker threads"""
+        self.cancel_all()
+        with self._ready:
+            # Workers finish the cancelled jobs still queued, then exit
+            self._stopped = True
+            self._ready.notify_all()
+
+    def _start_worker(self, lowest_priority: int):
+        worker = threading.Thread(target=self._worker, args=(lowest_priority,), daemon=True)
+        worker.start()
+        self._workers.append(worker)
+
+    def _push(self, job: DownloadJob):
+        with self._ready:
+            heapq.heappush(self._heap, (job.priority, job.id, job))
+            self._ready.notify_all()
+
+    def _next_job(self, lowest_priority: int) -> Optional[DownloadJob]:
+        """Take the first queued job up to lowest_priority; None once stopped"""
+        with self._ready:
+            while True:
+                while self._heap:
+                    priority, _, job = self._heap[0]
+                    if job.status == DownloadJob.QUEUED and priority == job.priority:
+                        break
+                    # Taken already, or re-queued with a higher priority
+                    heapq.heappop(self._heap)
+                if self._heap and self._heap[0][0] <= lowest_priority:
+                    job = heapq.heappop(self._heap)[2]
+                    job.status = DownloadJob.RUNNING
+                    return job
+                if self._stopped and not self._heap:
+                    return None
+                self._ready.wait()
+
+    def _worker(self, lowest_priority: int):
+        while True:
+            job = self._next_job(lowest_priority)
+            if job is None:
+                return
+            instrumentation.count('downloads.queued', -1)
+            if job.cancelled:
+                self._finish(job, DownloadJob.CANCELLED)
+                continue
+
+            job.attempts += 1
+            self.bandwidth.add(job)
+            try:
+                with instrumentation.span('download.job', url=job.url, attempt=job.attempts,
+                                          priority=job.priority):
+                    job.result = self.download_fn(job.url, self._make_hook(job), **job.options)
+            except Exception as e:
+                self.bandwidth.remove(job)
+                if job.cancelled:
+                    self._finish(job, DownloadJob.CANCELLED)
+                else:
+                    job.error = e
+                    self._finish(job, DownloadJob.FAILED)
+                continue
+
+            self.bandwidth.remove(job)
+            if job.cancelled:
+                self._finish(job, DownloadJob.CANCELLED)
+            else:
+                job.progress = 1.0
+                self._finish(job, DownloadJob.DONE)
+
+    def _finish(self, job: DownloadJob, status: str):
+        job.status = status
+        job.finished_at = time.monotonic()
+        instrumentation.count(f"downloads.{status}")
+        if status == DownloadJob.DONE and job.on_complete:
+            self.dispatch(job.on_complete, job)
+        elif status in (DownloadJob.FAILED, DownloadJob.CANCELLED) and job.on_error:
+            self.dispatch(job.on_error, job)
+
+    def _make_hook(self, job: DownloadJob):
+        """Build a yt-dlp progress hook that tracks and can abort ``job``"""
+        def hook(d):
+            if job.cancelled:
+                raise DownloadCancelled(f"Download cancelled: {job.url}")
+
+            received = 0
+            if d.get('status') == 'downloading':
+                job.downloaded_bytes = d.get('downloaded_bytes') or 0
+                job.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+                if job.total_bytes:
+                    job.progress = min(job.downloaded_bytes / job.total_bytes, 1.0)
+                # The first report of a file includes what a resumed download already had
+                if job._received is not None:
+                    received = max(job.downloaded_bytes - job._received, 0)
+                job._received = max(job._received or 0, job.downloaded_bytes)
+            elif d.get('status') == 'finished':
+                job.progress = 1.0
+                job._received = None
+
+            now = time.monotonic()
+            if job.on_progress and now - job._last_progress_dispatch >= self.PROGRESS_INTERVAL:
+                job._last_progress_dispatch = now
+                self.dispatch(job.on_progress, job)
+
+            self.bandwidth.consume(job, received, job._cancel_event)
+
+        return hook
@@ -0,0 +1,359 @@
+import os
+import subprocess
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from batch_worker import BatchWorker, ProcessPool
+from media_probe import file_state
+
+# numpy is only needed where audio is fingerprinted or compared
+if TYPE_CHECKING:
+    import numpy as np
+
+# Audio is decoded to mono at this rate; the bands below stay under its Nyquist frequency
+FINGERPRINT_RATE = 5512
+# 0.37 s analysis frames, one 32-bit sub-fingerprint every 46 ms
+FRAME_SIZE = 2048
+HOP_SIZE = 256
+# 33 logarithmically spaced bands give the 32 bits of a sub-fingerprint
+BANDS = 33
+LOW_HZ = 300.0
+HIGH_HZ = 2000.0
+# Frames analyzed per FFT call, about 23 s of audio
+FRAMES_PER_READ = 512
+
+# Share of differing bits below which two fingerprints are the same recording;
+# unrelated audio sits around 0.5
+MATCH_BER = 0.35
+# Seconds one copy may start earlier or later than another (intros, silence)
+MAX_SHIFT_SECONDS = 15.0
+# Fingerprints must overlap this long to be compared at all
+MIN_OVERLAP_SECONDS = 10.0
+# Seconds of a stream decoded to check it against the library before downloading
+PREFIX_SECONDS = 30.0
+# Files whose durations differ by more than this share are never the same recording
+DURATION_TOLERANCE = 0.05
+# One in HASH_SAMPLING sub-fingerprint values goes into the lookup table. The
+# choice depends on the value alone, so copies keep the same ones.
+HASH_SAMPLING = 16
+# Lookup hashes a file must share with a query before the two are compared
+MIN_HASH_HITS = 3
+# Hashes found in more files than this (silence, tones) point at no match in particular
+COMMON_HASH_PATHS = 50
+# Library files one lookup compares at most, those sharing the most hashes first
+MAX_COMPARES = 32
+
+
+def _band_matrix(size: int = FRAME_SIZE, rate: int = FINGERPRINT_RATE) -> "np.ndarray":
+    """(rfft bins, BANDS) matrix summing a power spectrum into the fingerprint bands"""
+    import numpy as np
+
+    freqs = np.fft.rfftfreq(size, 1 / rate)
+    edges = np.geomspace(LOW_HZ, HIGH_HZ, BANDS + 1)
+    band = np.searchsorted(edges, freqs, side='right') - 1
+    matrix = np.zeros((len(freqs), BANDS), dtype=np.float32)
+    inside = (band >= 0) & (band < BANDS)
+    matrix[np.nonzero(inside)[0], band[inside]] = 1.0
+    return matrix
+
+
+class Fingerprinter:
+    """Sub-fingerprints of mono PCM fed in any number of pieces
+
+    Each 32-bit sub-fingerprint holds the signs of the energy differences
+    between neighbouring bands, differentiated over time (Haitsma and
+    Kalker). The sign pattern survives re-encoding, volume changes and
+    equalization, so copies of a recording from different sources differ
+    in few bits. Frames of a piece are windowed and transformed in one
+    vectorized FFT.
+    """
+
+    def __init__(self):
+        import numpy as np
+
+        self.window = np.hanning(FRAME_SIZE).astype(np.float32)
+        self.bands = _band_matrix()
+        self.samples = 0
+        self._pieces: List["np.ndarray"] = []
+        self._leftover = np.zeros(0, dtype=np.float32)
+        self._previous: Optional["np.ndarray"] = None  # band differences of the last frame
+
+    def add(self, samples: "np.ndarray"):
+        """Feed float samples"""
+        import numpy as np
+        from numpy.lib.stride_tricks import sliding_window_view
+
+        self.samples += len(samples)
+        samples = np.concatenate((self._leftover, samples)) if len(self._leftover) else samples
+        if len(samples) < FRAME_SIZE:
+            self._leftover = samples
+            return
+        frames = sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+        self._leftover = samples[len(frames) * HOP_SIZE:]
+        for start in range(0, len(frames), FRAMES_PER_READ):
+            spectrum = np.fft.rfft(frames[start:start + FRAMES_PER_READ] * self.window, axis=1)
+            energy = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32) @ self.bands
+            differences = energy[:, :-1] - energy[:, 1:]
+            if self._previous is not None:
+                differences = np.concatenate((self._previous, differences))
+            self._previous = differences[-1:]
+            bits = differences[1:] > differences[:-1]
+            if len(bits):
+                self._pieces.append(np.packbits(bits, axis=1, bitorder='little').view('<u4').ravel())
+
+    def fingerprint(self) -> "np.ndarray":
+        import numpy as np
+
+        return np.concatenate(self._pieces) if self._pieces else np.zeros(0, dtype='<u4')
+
+    @property
+    def duration(self) -> float:
+        return self.samples / FINGERPRINT_RATE
+
+
+def fingerprint_source(source: str, ffmpeg: str = "ffmpeg", seconds: Optional[float] = None,
+                       headers: Optional[Dict] = None) -> Optional[Fingerprinter]:
+    """Decode a file or URL through FFmpeg and fingerprint it, the first seconds only if given"""
+    import numpy as np
+
+    command = [ffmpeg, '-v', 'error']
+    if headers:
+        command += ['-headers', "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    command += ['-i', source, '-vn']
+    if seconds:
+        command += ['-t', str(seconds)]
+    command += ['-ac', '1', '-ar', str(FINGERPRINT_RATE), '-f', 'f32le', '-']
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    fingerprinter = Fingerprinter()
+    read_size = FRAME_SIZE * FRAMES_PER_READ // 2 * 4
+    with process:
+        while True:
+            data = process.stdout.read(read_size)
+            if not data:
+                break
+            fingerprinter.add(np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32))
+    if process.returncode or not fingerprinter.samples:
+        return None
+    return fingerprinter
+
+
+def fingerprint_file(path: str, ffmpeg: str = "ffmpeg") -> Optional[Dict]:
+    """Fingerprint a whole file; runs in a worker process"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    fingerprinter = fingerprint_source(path, ffmpeg)
+    if fingerprinter is None:
+        return None
+    fingerprint = fingerprinter.fingerprint()
+    return {
+        'path': path,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'duration': fingerprinter.duration,
+        'fingerprint': fingerprint.tobytes(),
+        'hashes': sampled_hashes(fingerprint),
+    }
+
+
+def from_bytes(data: bytes) -> "np.ndarray":
+    import numpy as np
+
+    return np.frombuffer(data, dtype='<u4')
+
+
+def sampled_hashes(fingerprint: "np.ndarray") -> List[int]:
+    """The distinct sub-fingerprint values that go into the lookup table"""
+    import numpy as np
+
+    # 0 is what silence gives, in every file
+    return [int(value) for value in np.unique(fingerprint[fingerprint % HASH_SAMPLING == 0]) if value]
+
+
+def _bit_errors(xor: "np.ndarray") -> "np.ndarray":
+    """Differing bits per row of a 2-D array of XORed sub-fingerprints"""
+    import numpy as np
+
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor).sum(axis=-1, dtype=np.int64)
+    return np.unpackbits(xor.view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int64)
+
+
+def compare(query: "np.ndarray", reference: "np.ndarray",
+            max_shift: float = MAX_SHIFT_SECONDS) -> Tuple[float, float]:
+    """(bit error rate, seconds query starts into reference) at the best alignment
+
+    query[i] is lined up with reference[i + shift] for every shift up to
+    max_shift seconds either way that leaves MIN_OVERLAP_SECONDS of
+    overlap; 1.0 when none does.
+    """
+    import numpy as np
+
+    frames_per_second = FINGERPRINT_RATE / HOP_SIZE
+    limit = int(max_shift * frames_per_second)
+    min_overlap = int(MIN_OVERLAP_SECONDS * frames_per_second)
+    best = (1.0, 0.0)
+    for shift in range(-limit, limit + 1):
+        start = max(0, -shift)
+        end = min(len(query), len(reference) - shift)
+        if end - start < min_overlap:
+            continue
+        errors = int(_bit_errors(query[start:end] ^ reference[start + shift:end + shift]))
+        ber = errors / (32 * (end - start))
+        if ber < best[0]:
+            best = (ber, shift / frames_per_second)
+    return best
+
+
+class FingerprintIndex(BatchWorker):
+    """Fingerprints library files on a process pool and finds copies of a recording
+
+    Fingerprints are kept in the library keyed by path, valid while mtime
+    and size match, with a sample of their sub-fingerprint values in a
+    lookup table. A lookup compares a query against at most MAX_COMPARES
+    files, picked by duration and by how many of those values they share,
+    so its cost doesn't grow with the library.
+    """
+
+    name = "fingerprint"
+
+    def __init__(self, library, workers: Optional[int] = None,
+                 on_analyzed: Optional[Callable[[Dict[str, Dict]], None]] = None,
+                 dispatch: Optional[Callable] = None, pool: Optional[ProcessPool] = None):
+        super().__init__(fingerprint_file, workers, on_analyzed, dispatch, pool)
+        self.library = library
+        self._waiting: List[Callable[[Dict], None]] = []  # report callbacks
+
+    def analyze_library(self) -> int:
+        """Queue every library file without a fingerprint"""
+        paths = self.library.paths_without_fingerprint()
+        self.request(paths)
+        return len(paths)
+
+    def report_when_ready(self, callback: Callable[[Dict], None]):
+        """Call back with report() through dispatch once the queue has drained"""
+        with self._lock:
+            self._waiting.append(callback)
+        self.wake()
+
+    def match(self, fingerprint: "np.ndarray", duration: Optional[float] = None,
+              exclude: Iterable[str] = ()) -> Optional[Dict]:
+        """A library file holding the same recording as a fingerprint, None if none does
+
+        With a duration, files lasting within DURATION_TOLERANCE of it are
+        the candidates, even ones sharing no hash: a query of a few seconds
+        has few values exactly in common with its original. Without one,
+        files need MIN_HASH_HITS. Returns {'path', 'ber', 'shift'}.
+        """
+        hits = self.library.fingerprint_hash_hits(sampled_hashes(fingerprint))
+        if duration:
+            candidates = set(self.library.fingerprints_by_duration(
+                duration * (1 - DURATION_TOLERANCE), duration * (1 + DURATION_TOLERANCE)
+            ))
+        else:
+            candidates = {path for path, count in hits.items() if count >= MIN_HASH_HITS}
+        candidates.difference_update(exclude)
+        candidates = sorted(candidates, key=lambda path: -hits.get(path, 0))[:MAX_COMPARES]
+        rows = self.library.get_fingerprints(candidates)
+        for path in candidates:
+            row = rows.get(path)
+            if row is None or file_state(path) != (row['mtime'], row['size']):
+                continue
+            ber, shift = compare(fingerprint, from_bytes(row['fingerprint']))
+            if ber < MATCH_BER:
+                # Any match is the same recording; the likeliest ones come first
+                return {'path': path, 'ber': ber, 'shift': shift}
+        return None
+
+    def match_stream(self, url: str, duration: Optional[float], headers: Optional[Dict] = None,
+                     ffmpeg: str = "ffmpeg") -> Optional[Dict]:
+        """match() for audio not downloaded yet, from the first PREFIX_SECONDS of its stream
+
+        Nothing is fetched unless a fingerprinted file has about the same
+        duration, so adding something new to the library costs one query.
+        """
+        if not duration or not self.library.fingerprints_by_duration(
+            duration * (1 - DURATION_TOLERANCE), duration * (1 + DURATION_TOLERANCE)
+        ):
+            return None
+        fingerprinter = fingerprint_source(url, ffmpeg, seconds=PREFIX_SECONDS, headers=headers)
+        if fingerprinter is None:
+            return None
+        return self.match(fingerprinter.fingerprint(), duration)
+
+    def report(self) -> Dict:
+        """Groups of library files holding the same recording
+
+        Each group keeps its largest file, usually the best encoding; the
+        others' bytes are what removing duplicates would reclaim. Files
+        changed since they were fingerprinted are left out.
+        """
+        pairs = self.library.duplicate_hash_pairs(MIN_HASH_HITS, COMMON_HASH_PATHS)
+        rows = self.library.get_fingerprints({path for pair in pairs for path in pair})
+        sizes = {}
+        for path, row in rows.items():
+            if file_state(path) == (row['mtime'], row['size']):
+                sizes[path] = row['size']
+        fingerprints = {}
+        parent = {}
+
+        def root(path):
+            while parent[path] != path:
+                path = parent[path]
+            return path
+
+        for a, b in pairs:
+            if a not in sizes or b not in sizes:
+                continue
+            low, high = sorted((rows[a]['duration'], rows[b]['duration']))
+            if low < high * (1 - DURATION_TOLERANCE):
+                continue
+            parent.setdefault(a, a)
+            parent.setdefault(b, b)
+            if root(a) == root(b):
+                continue
+            for path in (a, b):
+                if path not in fingerprints:
+                    fingerprints[path] = from_bytes(rows[path]['fingerprint'])
+            if compare(fingerprints[a], fingerprints[b])[0] < MATCH_BER:
+                parent[root(b)] = root(a)
+
+        groups: Dict[str, List[str]] = {}
+        for path in parent:
+            groups.setdefault(root(path), []).append(path)
+        report = []
+        for paths in groups.values():
+            if len(paths) < 2:
+                continue
+            paths.sort(key=lambda path: (-sizes[path], path))
+            reclaimable = sum(sizes[path] for path in paths[1:])
+            report.append({
+                'keep': paths[0],
+                'duplicates': paths[1:],
+                'reclaimable_bytes': reclaimable,
+            })
+        report.sort(key=lambda group: -group['reclaimable_bytes'])
+        return {
+            'groups': report,
+            'duplicate_files': sum(len(group['duplicates']) for group in report),
+            'reclaimable_bytes': sum(group['reclaimable_bytes'] for group in report),
+        }
+
+    def store(self, results: List[Dict]):
+        self.library.store_fingerprints(results)
+
+    def idle(self):
+        with self._lock:
+            waiting, self._waiting = self._waiting, []
+        if not waiting:
+            return
+        try:
+            report = self.report()
+        except Exception as e:
+            print(f"Error finding duplicates: {e}")
+            report = None
+        for callback in waiting:
+            self.dispatch(callback, report)
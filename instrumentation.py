@@ -0,0 +1,268 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+# Seconds between two writes of buffered events
+WRITE_INTERVAL = 0.5
+
+# Off by default: span() then returns one shared no-op context manager and
+# begin()/end()/count() return after a single check, so instrumented code
+# costs next to nothing until enable() is called
+_tracer: Optional["Tracer"] = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """A timed section; works as a context manager or through begin()/end()"""
+
+    __slots__ = ('tracer', 'name', 'args', 'start', 'thread')
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = time.perf_counter()
+        self.thread = threading.current_thread()
+
+    def set(self, **args):
+        """Attach more arguments, e.g. results known only at the end"""
+        self.args.update(args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.finish(self)
+        return False
+
+
+class Tracer:
+    """Writes spans and counter changes to a trace file
+
+    Events go onto a queue that a background thread writes out every
+    WRITE_INTERVAL seconds, so callers never wait on file I/O. 'jsonl'
+    writes one JSON object per line and rolls over to ``path.1`` ...
+    ``path.N`` once the file passes ``max_bytes``. 'chrome' writes the
+    Chrome trace event format (chrome://tracing, Perfetto) as a streamed
+    JSON array, which stays loadable even if the process dies before
+    close().
+    """
+
+    def __init__(self, path: str, format: str = "jsonl", max_bytes: int = 10 * 1024 ** 2, backups: int = 3):
+        if format not in ("jsonl", "chrome"):
+            raise ValueError(f"Unknown trace format {format!r}")
+        self.path = path
+        self.format = format
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.counters: Dict[str, float] = {}
+        # perf_counter() has no fixed origin; trace timestamps are wall clock microseconds
+        self.origin_us = time.time() * 1e6 - time.perf_counter() * 1e6
+        self.pid = os.getpid()
+        self._events = queue.Queue()
+        self._lock = threading.Lock()
+        self._file = None
+        self._named_threads = set()
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+        self._writer.start()
+
+    def finish(self, span: Span, end: Optional[float] = None):
+        end = time.perf_counter() if end is None else end
+        self._events.put(('span', span.name, span.start, end - span.start, span.thread, span.args))
+
+    def record(self, name: str, start: float, end: float, **args):
+        """A span measured elsewhere, from perf_counter() start and end times"""
+        self._events.put(('span', name, start, end - start, threading.current_thread(), args))
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            total = self.counters[name] = self.counters.get(name, 0) + value
+        self._events.put(('counter', name, time.perf_counter(), total, threading.current_thread(), None))
+
+    def close(self):
+        self._stopped.set()
+        # The writer drains the queue once more before it exits
+        self._writer.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # Writer thread
+
+    def _write_loop(self):
+        while not self._stopped.wait(WRITE_INTERVAL):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        lines = []
+        while True:
+            try:
+                kind, name, start, value, thread, args = self._events.get_nowait()
+            except queue.Empty:
+                break
+            lines.append(self._format(kind, name, start, value, thread, args))
+        if not lines:
+            return
+        with self._lock:
+            self._open()
+            self._file.write("".join(lines))
+            self._file.flush()
+            if self.format == "jsonl" and self._file.tell() > self.max_bytes:
+                self._rotate()
+
+    def _format(self, kind, name, start, value, thread, args) -> str:
+        ts = self.origin_us + start * 1e6
+        if self.format == "jsonl":
+            if kind == 'span':
+                event = {'span': name, 'ts_us': round(ts), 'dur_ms': value * 1000,
+                         'thread': thread.name, 'args': args}
+            else:
+                event = {'counter': name, 'ts_us': round(ts), 'value': value}
+            return json.dumps(event, default=str) + "\n"
+        lines = ""
+        if thread.ident not in self._named_threads:
+            # Name the thread once so the viewer shows it instead of a bare id
+            self._named_threads.add(thread.ident)
+            lines = json.dumps({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': thread.ident,
+                                'args': {'name': thread.name}}) + ",\n"
+        if kind == 'span':
+            event = {'name': name, 'cat': name.split(".", 1)[0], 'ph': 'X', 'ts': ts, 'dur': value * 1e6,
+                     'pid': self.pid, 'tid': thread.ident, 'args': args}
+        else:
+            event = {'name': name, 'ph': 'C', 'ts': ts, 'pid': self.pid, 'tid': thread.ident, 'args': {name: value}}
+        return lines + json.dumps(event, default=str) + ",\n"
+
+    def _open(self):
+        if self._file is not None:
+            return
+        if self.format == "chrome":
+            self._file = open(self.path, "w")
+            self._file.write("[\n")
+        else:
+            self._file = open(self.path, "a")
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+def enable(path: str, format: str = "jsonl", max_bytes: int = 10 * 1024 ** 2, backups: int = 3) -> Tracer:
+    """Start recording to path; the trace is flushed at exit"""
+    global _tracer
+    disable()
+    _tracer = Tracer(path, format, max_bytes, backups)
+    atexit.register(disable)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, **args):
+    """``with span('download.extract_info', url=url):`` times the block"""
+    tracer = _tracer
+    if tracer is None:
+        return NULL_SPAN
+    return Span(tracer, name, args)
+
+
+def begin(name: str, **args) -> Optional[Span]:
+    """Start a span that ends elsewhere, e.g. in a callback on another thread"""
+    tracer = _tracer
+    if tracer is None:
+        return None
+    return Span(tracer, name, args)
+
+
+def end(span: Optional[Span], **args):
+    if span is None:
+        return
+    span.args.update(args)
+    span.tracer.finish(span)
+
+
+def record(name: str, start: float, end: float, **args):
+    tracer = _tracer
+    if tracer is not None:
+        tracer.record(name, start, end, **args)
+
+
+def count(name: str, value: float = 1):
+    tracer = _tracer
+    if tracer is not None:
+        tracer.count(name, value)
+
+
+class DownloadPhases:
+    """Splits one yt-dlp download into spans
+
+    extract_info and process_ie_result run extraction, format selection,
+    the transfer and the postprocessors without a break; their progress
+    and postprocessor hooks mark where one phase ends and the next begins.
+    Only built while tracing is enabled.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.started = time.perf_counter()
+        self.transfer_started: Optional[float] = None
+        self.extracted = False
+        self._postprocessors: Dict[str, float] = {}
+
+    def progress_hook(self, d: Dict):
+        now = time.perf_counter()
+        if d.get('status') == 'downloading' and self.transfer_started is None:
+            self.transfer_started = now
+            if not self.extracted:
+                # Format selection also fetches and parses pages before the first byte
+                self.extracted = True
+                record('download.extract', self.started, now, url=self.url)
+        elif d.get('status') == 'finished' and self.transfer_started is not None:
+            record('download.transfer', self.transfer_started, now, url=self.url,
+                   bytes=d.get('total_bytes') or d.get('downloaded_bytes'))
+            self.transfer_started = None
+
+    def postprocessor_hook(self, d: Dict):
+        name = d.get('postprocessor')
+        if d.get('status') == 'started':
+            self._postprocessors[name] = time.perf_counter()
+        elif d.get('status') == 'finished' and name in self._postprocessors:
+            record('download.postprocess', self._postprocessors.pop(name), time.perf_counter(),
+                   url=self.url, postprocessor=name)
@@ -0,0 +1,702 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections.abc import MutableSequence
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from track import Track, TrackTable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    source_id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    path TEXT,
+    url TEXT,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_title ON tracks(title);
+CREATE INDEX IF NOT EXISTS idx_tracks_path ON tracks(path);
+
+CREATE TABLE IF NOT EXISTS playlists (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS playlist_entries (
+    playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    track_id INTEGER NOT NULL REFERENCES tracks(id),
+    PRIMARY KEY (playlist_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_track ON playlist_entries(track_id);
+
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    track_id INTEGER NOT NULL REFERENCES tracks(id)
+);
+CREATE INDEX IF NOT EXISTS idx_files_directory ON files(directory);
+
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL,
+    codec TEXT,
+    bitrate INTEGER,
+    sample_rate INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS loudness (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    integrated_lufs REAL,
+    peak REAL NOT NULL,
+    gain_db REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS seek_indexes (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    times BLOB NOT NULL,
+    offsets BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS fingerprints (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    fingerprint BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_duration ON fingerprints(duration);
+
+CREATE TABLE IF NOT EXISTS fingerprint_hashes (
+    hash INTEGER NOT NULL,
+    fingerprint_id INTEGER NOT NULL REFERENCES fingerprints(id) ON DELETE CASCADE,
+    PRIMARY KEY (hash, fingerprint_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_fingerprint_hashes_id ON fingerprint_hashes(fingerprint_id);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+TRACK_COLUMNS = "id, source_id, title, path, url, duration"
+
+PROBE_COLUMNS = ('path', 'mtime', 'size', 'duration', 'codec', 'bitrate', 'sample_rate')
+
+LOUDNESS_COLUMNS = ('path', 'mtime', 'size', 'integrated_lufs', 'peak', 'gain_db')
+
+SEEK_INDEX_COLUMNS = ('path', 'mtime', 'size', 'duration', 'times', 'offsets')
+
+FINGERPRINT_COLUMNS = ('path', 'mtime', 'size', 'duration', 'fingerprint')
+
+DEFAULT_PLAYLIST = "Default"
+
+
+def row_to_track(row) -> Track:
+    return Track(row['title'], path=row['path'], url=row['url'], duration=row['duration'],
+                 source_id=row['source_id'], id=row['id'])
+
+
+class Library:
+    """SQLite storage for tracks and named playlists
+
+    Every change is written as its own small transaction, so there is no
+    whole-file save and a crash can't corrupt what was already stored.
+    """
+
+    # Rows fetched per query when a lazy playlist needs a track
+    PAGE_SIZE = 500
+
+    def __init__(self, path: str = "library.db"):
+        self.path = path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    # Meta values
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # Tracks
+
+    def upsert_track(self, track: Track) -> int:
+        """Insert or update a track and store its id in track.id"""
+        with self._lock, self.conn:
+            track_id = self._upsert_track(track)
+        return track_id
+
+    def _upsert_track(self, track: Track) -> int:
+        source_id = track.source_id
+        self.conn.execute(
+            "INSERT INTO tracks (source_id, title, path, url, duration) VALUES (?, ?, ?, ?, ?) "
+            # A partial Track (no path yet, or no url) must not wipe what is known
+            "ON CONFLICT(source_id) DO UPDATE SET "
+            "title = excluded.title, path = COALESCE(excluded.path, tracks.path), "
+            "url = COALESCE(excluded.url, tracks.url), "
+            "duration = COALESCE(excluded.duration, tracks.duration)",
+            (source_id, track.title, track.path, track.url, track.duration)
+        )
+        row = self.conn.execute("SELECT id FROM tracks WHERE source_id = ?", (source_id,)).fetchone()
+        track.id = row['id']
+        return track.id
+
+    def update_track(self, track: Track) -> int:
+        """Write back a changed track, merging it into an existing row with the same source id
+
+        Returns the id the track had before, which differs from track.id
+        after a merge.
+        """
+        old_id = track.id
+        with self._lock, self.conn:
+            existing = self.conn.execute(
+                "SELECT id FROM tracks WHERE source_id = ?", (track.source_id,)
+            ).fetchone()
+            if existing and existing['id'] != track.id:
+                # Already known under its final id: point entries at that row
+                self.conn.execute(
+                    "UPDATE playlist_entries SET track_id = ? WHERE track_id = ?",
+                    (existing['id'], track.id)
+                )
+                self.conn.execute("DELETE FROM tracks WHERE id = ?", (track.id,))
+                track.id = existing['id']
+            self.conn.execute(
+                "UPDATE tracks SET source_id = ?, title = ?, path = ?, url = ?, duration = ? WHERE id = ?",
+                (track.source_id, track.title, track.path, track.url, track.duration, track.id)
+            )
+        return old_id
+
+    def get_tracks(self, track_ids: Iterable[int]) -> Dict[int, Track]:
+        ids = list(track_ids)
+        tracks = {}
+        with self._lock:
+            for start in range(0, len(ids), self.PAGE_SIZE):
+                chunk = ids[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT {TRACK_COLUMNS} FROM tracks WHERE id IN ({placeholders})", chunk
+                ):
+                    tracks[row['id']] = row_to_track(row)
+        return tracks
+
+    def find_by_path(self, path: str) -> Optional[Track]:
+        with self._lock:
+            row = self.conn.execute(f"SELECT {TRACK_COLUMNS} FROM tracks WHERE path = ?", (path,)).fetchone()
+        return row_to_track(row) if row else None
+
+    def find_by_paths(self, paths: Iterable[str]) -> List[Track]:
+        paths = list(paths)
+        tracks = []
+        with self._lock:
+            for start in range(0, len(paths), self.PAGE_SIZE):
+                chunk = paths[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT {TRACK_COLUMNS} FROM tracks WHERE path IN ({placeholders})", chunk
+                ):
+                    tracks.append(row_to_track(row))
+        return tracks
+
+    # Playlists
+
+    def playlist_names(self) -> List[str]:
+        with self._lock:
+            return [row['name'] for row in self.conn.execute("SELECT name FROM playlists ORDER BY name")]
+
+    def playlist_id(self, name: str, create: bool = True) -> Optional[int]:
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT id FROM playlists WHERE name = ?", (name,)).fetchone()
+            if row:
+                return row['id']
+            if not create:
+                return None
+            cursor = self.conn.execute(
+                "INSERT INTO playlists (name, created_at) VALUES (?, ?)", (name, time.time())
+            )
+            return cursor.lastrowid
+
+    def entry_ids(self, playlist_id: int) -> array:
+        """Track ids of a playlist in order, without loading the tracks"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT track_id FROM playlist_entries WHERE playlist_id = ? ORDER BY position",
+                (playlist_id,)
+            )
+            return array('q', (row[0] for row in rows))
+
+    def append_entry(self, playlist_id: int, track: Track) -> int:
+        """Add a track to the end of a playlist in one transaction"""
+        with self._lock, self.conn:
+            track_id = self._upsert_track(track)
+            self.conn.execute(
+                "INSERT INTO playlist_entries (playlist_id, position, track_id) "
+                "SELECT ?, COALESCE(MAX(position), -1) + 1, ? FROM playlist_entries WHERE playlist_id = ?",
+                (playlist_id, track_id, playlist_id)
+            )
+        return track_id
+
+    def append_entries(self, playlist_id: int, tracks: List[Track]):
+        """Bulk version of append_entry, one transaction for all tracks"""
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM playlist_entries WHERE playlist_id = ?",
+                (playlist_id,)
+            ).fetchone()
+            position = row[0]
+            entries = []
+            for track in tracks:
+                entries.append((playlist_id, position, self._upsert_track(track)))
+                position += 1
+            self.conn.executemany(
+                "INSERT INTO playlist_entries (playlist_id, position, track_id) VALUES (?, ?, ?)", entries
+            )
+
+    def clear_playlist(self, playlist_id: int):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM playlist_entries WHERE playlist_id = ?", (playlist_id,))
+
+    def copy_playlist(self, source_id: int, name: str) -> int:
+        """Replace the playlist called name with the entries of another playlist"""
+        target_id = self.playlist_id(name)
+        if target_id == source_id:
+            return target_id
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM playlist_entries WHERE playlist_id = ?", (target_id,))
+            self.conn.execute(
+                "INSERT INTO playlist_entries (playlist_id, position, track_id) "
+                "SELECT ?, position, track_id FROM playlist_entries WHERE playlist_id = ?",
+                (target_id, source_id)
+            )
+        return target_id
+
+    def append_files(self, playlist_id: int, paths: Iterable[str]) -> List[Track]:
+        """Append the scanned files at paths that a playlist lacks, ordered by path
+
+        Returns the appended tracks in order, for the in-memory playlist.
+        """
+        paths = list(paths)
+        tracks = []
+        with self._lock, self.conn:
+            for start in range(0, len(paths), self.PAGE_SIZE):
+                chunk = paths[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT tracks.* FROM files JOIN tracks ON tracks.id = files.track_id "
+                    f"WHERE files.path IN ({placeholders}) AND files.track_id NOT IN "
+                    f"(SELECT track_id FROM playlist_entries WHERE playlist_id = ?)",
+                    chunk + [playlist_id]
+                )
+                tracks.extend(row_to_track(row) for row in rows)
+            tracks.sort(key=lambda track: track.path)
+            row = self.conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM playlist_entries WHERE playlist_id = ?",
+                (playlist_id,)
+            ).fetchone()
+            self.conn.executemany(
+                "INSERT INTO playlist_entries (playlist_id, position, track_id) VALUES (?, ?, ?)",
+                [(playlist_id, row[0] + i, track.id) for i, track in enumerate(tracks)]
+            )
+        return tracks
+
+    def remove_missing_files(self, playlist_id: int, paths: Optional[Iterable[str]] = None) -> int:
+        """Drop entries of scanned files that are gone: those at paths, or all of them
+
+        Positions keep their gaps; order is all that matters and appends
+        still go after the last entry.
+        """
+        with self._lock, self.conn:
+            if paths is None:
+                cursor = self.conn.execute(
+                    "DELETE FROM playlist_entries WHERE playlist_id = ? AND track_id IN "
+                    "(SELECT id FROM tracks WHERE source_id LIKE 'file:%' "
+                    "AND NOT EXISTS (SELECT 1 FROM files WHERE files.track_id = tracks.id))",
+                    (playlist_id,)
+                )
+                return cursor.rowcount
+            removed = 0
+            source_ids = [f"file:{path}" for path in paths]
+            for start in range(0, len(source_ids), self.PAGE_SIZE):
+                chunk = source_ids[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = self.conn.execute(
+                    f"DELETE FROM playlist_entries WHERE playlist_id = ? AND track_id IN "
+                    f"(SELECT id FROM tracks WHERE source_id IN ({placeholders}))",
+                    [playlist_id] + chunk
+                )
+                removed += cursor.rowcount
+            return removed
+
+    # Scanned local files
+
+    def file_states_under(self, root: str) -> Dict[str, Tuple[float, int]]:
+        """mtime and size of every known file below root, by path"""
+        prefix = os.path.join(root, "")
+        # Range scan over the primary key instead of a LIKE pattern
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path, mtime, size FROM files WHERE path >= ? AND path < ?", (prefix, upper)
+            )
+            return {row[0]: (row[1], row[2]) for row in rows}
+
+    def file_states_in(self, directories: Iterable[str]) -> Dict[str, Tuple[float, int]]:
+        """mtime and size of the known files directly inside the given directories"""
+        directories = list(directories)
+        states = {}
+        with self._lock:
+            for start in range(0, len(directories), self.PAGE_SIZE):
+                chunk = directories[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT path, mtime, size FROM files WHERE directory IN ({placeholders})", chunk
+                ):
+                    states[row[0]] = (row[1], row[2])
+        return states
+
+    def record_files(self, files: List[Tuple[Track, float, int]]):
+        """Store scanned files and their tracks in one transaction"""
+        with self._lock, self.conn:
+            rows = []
+            for track, mtime, size in files:
+                track_id = self._upsert_track(track)
+                rows.append((track.path, os.path.dirname(track.path), mtime, size, track_id))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (path, directory, mtime, size, track_id) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def remove_files(self, paths: Iterable[str]):
+        """Forget files that disappeared; their tracks stay for other playlists"""
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in paths))
+
+    # Media probes
+
+    def get_probes(self, paths: Iterable[str]) -> Dict[str, Dict]:
+        """Stored probe results by path, whatever mtime they were taken at"""
+        paths = list(paths)
+        probes = {}
+        columns = ", ".join(PROBE_COLUMNS)
+        with self._lock:
+            for start in range(0, len(paths), self.PAGE_SIZE):
+                chunk = paths[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT {columns} FROM probes WHERE path IN ({placeholders})", chunk
+                ):
+                    probes[row['path']] = dict(row)
+        return probes
+
+    def store_probes(self, probes: List[Dict]):
+        """Save probe results and fill in the duration of tracks that lack one"""
+        columns = ", ".join(PROBE_COLUMNS)
+        placeholders = ", ".join("?" * len(PROBE_COLUMNS))
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO probes ({columns}) VALUES ({placeholders})",
+                [tuple(probe.get(column) for column in PROBE_COLUMNS) for probe in probes]
+            )
+            self.conn.executemany(
+                "UPDATE tracks SET duration = ? WHERE path = ? AND duration IS NULL",
+                [(probe['duration'], probe['path']) for probe in probes if probe.get('duration')]
+            )
+
+    # Loudness
+
+    def get_loudness(self, paths: Iterable[str]) -> Dict[str, Dict]:
+        paths = list(paths)
+        results = {}
+        columns = ", ".join(LOUDNESS_COLUMNS)
+        with self._lock:
+            for start in range(0, len(paths), self.PAGE_SIZE):
+                chunk = paths[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT {columns} FROM loudness WHERE path IN ({placeholders})", chunk
+                ):
+                    results[row['path']] = dict(row)
+        return results
+
+    def store_loudness(self, results: List[Dict]):
+        columns = ", ".join(LOUDNESS_COLUMNS)
+        placeholders = ", ".join("?" * len(LOUDNESS_COLUMNS))
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO loudness ({columns}) VALUES ({placeholders})",
+                [tuple(result.get(column) for column in LOUDNESS_COLUMNS) for result in results]
+            )
+
+    def paths_without_loudness(self) -> List[str]:
+        """Track files that were never measured"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT tracks.path FROM tracks LEFT JOIN loudness ON loudness.path = tracks.path "
+                "WHERE tracks.path IS NOT NULL AND loudness.path IS NULL"
+            )
+            return [row[0] for row in rows]
+
+    # Seek indexes
+
+    def get_seek_index(self, path: str) -> Optional[Dict]:
+        columns = ", ".join(SEEK_INDEX_COLUMNS)
+        with self._lock:
+            row = self.conn.execute(f"SELECT {columns} FROM seek_indexes WHERE path = ?", (path,)).fetchone()
+        return dict(row) if row else None
+
+    def store_seek_index(self, index: Dict):
+        columns = ", ".join(SEEK_INDEX_COLUMNS)
+        placeholders = ", ".join("?" * len(SEEK_INDEX_COLUMNS))
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO seek_indexes ({columns}) VALUES ({placeholders})",
+                tuple(index.get(column) for column in SEEK_INDEX_COLUMNS)
+            )
+
+    # Fingerprints
+
+    def get_fingerprints(self, paths: Iterable[str]) -> Dict[str, Dict]:
+        paths = list(paths)
+        results = {}
+        columns = ", ".join(FINGERPRINT_COLUMNS)
+        with self._lock:
+            for start in range(0, len(paths), self.PAGE_SIZE):
+                chunk = paths[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(
+                    f"SELECT {columns} FROM fingerprints WHERE path IN ({placeholders})", chunk
+                ):
+                    results[row['path']] = dict(row)
+        return results
+
+    def store_fingerprints(self, results: List[Dict]):
+        """Save fingerprints, replacing the lookup hashes of each path with result['hashes']"""
+        columns = ", ".join(FINGERPRINT_COLUMNS)
+        placeholders = ", ".join("?" * len(FINGERPRINT_COLUMNS))
+        updates = ", ".join(f"{column} = excluded.{column}" for column in FINGERPRINT_COLUMNS[1:])
+        with self._lock, self.conn:
+            for result in results:
+                # An upsert keeps the row id, so only the hashes need replacing
+                self.conn.execute(
+                    f"INSERT INTO fingerprints ({columns}) VALUES ({placeholders}) "
+                    f"ON CONFLICT(path) DO UPDATE SET {updates}",
+                    tuple(result.get(column) for column in FINGERPRINT_COLUMNS)
+                )
+                fingerprint_id = self.conn.execute(
+                    "SELECT id FROM fingerprints WHERE path = ?", (result['path'],)
+                ).fetchone()[0]
+                self.conn.execute("DELETE FROM fingerprint_hashes WHERE fingerprint_id = ?", (fingerprint_id,))
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO fingerprint_hashes (hash, fingerprint_id) VALUES (?, ?)",
+                    [(value, fingerprint_id) for value in result['hashes']]
+                )
+
+    def fingerprints_by_duration(self, low: float, high: float) -> List[str]:
+        """Paths of fingerprinted files lasting between low and high seconds"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path FROM fingerprints WHERE duration BETWEEN ? AND ?", (low, high)
+            )
+            return [row[0] for row in rows]
+
+    def fingerprint_hash_hits(self, hashes: Iterable[int]) -> Dict[str, int]:
+        """path -> how many of hashes its fingerprint shares"""
+        hashes = list(hashes)
+        hits: Dict[str, int] = {}
+        with self._lock:
+            for start in range(0, len(hashes), self.PAGE_SIZE):
+                chunk = hashes[start:start + self.PAGE_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for path, count in self.conn.execute(
+                    "SELECT fingerprints.path, COUNT(*) FROM fingerprint_hashes "
+                    "JOIN fingerprints ON fingerprints.id = fingerprint_hashes.fingerprint_id "
+                    f"WHERE fingerprint_hashes.hash IN ({placeholders}) GROUP BY fingerprints.path", chunk
+                ):
+                    hits[path] = hits.get(path, 0) + count
+        return hits
+
+    def duplicate_hash_pairs(self, min_hits: int, max_paths: int) -> List[Tuple[str, str]]:
+        """Pairs of paths sharing at least min_hits hashes
+
+        Hashes found in more than max_paths files (silence, test tones) say
+        nothing about which files match and are left out of the join.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "WITH shared AS (SELECT hash FROM fingerprint_hashes GROUP BY hash "
+                "                HAVING COUNT(*) BETWEEN 2 AND ?), "
+                "pairs AS (SELECT a.fingerprint_id AS a, b.fingerprint_id AS b FROM shared "
+                "          JOIN fingerprint_hashes a ON a.hash = shared.hash "
+                "          JOIN fingerprint_hashes b ON b.hash = shared.hash AND b.fingerprint_id > a.fingerprint_id "
+                "          GROUP BY a.fingerprint_id, b.fingerprint_id HAVING COUNT(*) >= ?) "
+                "SELECT fa.path, fb.path FROM pairs "
+                "JOIN fingerprints fa ON fa.id = pairs.a JOIN fingerprints fb ON fb.id = pairs.b",
+                (max_paths, min_hits)
+            )
+            return [(row[0], row[1]) for row in rows]
+
+    def paths_without_fingerprint(self) -> List[str]:
+        """Track files that were never fingerprinted"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT tracks.path FROM tracks LEFT JOIN fingerprints ON fingerprints.path = tracks.path "
+                "WHERE tracks.path IS NOT NULL AND fingerprints.path IS NULL"
+            )
+            return [row[0] for row in rows]
+
+    def load_playlist(self, name: str) -> "LazyPlaylist":
+        return LazyPlaylist(self, self.entry_ids(self.playlist_id(name)))
+
+    def import_playlist_json(self, json_path: str = "playlist.json", name: str = DEFAULT_PLAYLIST) -> int:
+        """One-time import of the old playlist.json format"""
+        if self.get_meta("imported_playlist_json"):
+            return 0
+        try:
+            with open(json_path, "r") as f:
+                tracks = [Track.from_dict(data) for data in json.load(f)["tracks"]]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            tracks = []
+        if tracks:
+            self.append_entries(self.playlist_id(name), tracks)
+        self.set_meta("imported_playlist_json", json_path)
+        return len(tracks)
+
+
+class LazyPlaylist(MutableSequence):
+    """Playlist that holds only track ids and loads track rows on demand
+
+    Rows are fetched a page at a time around the index that was asked for
+    and kept in a columnar TrackTable, so opening a huge playlist costs one
+    id query, and a loaded one costs a few arrays rather than an object per
+    track. Indexing returns a fresh Track; write changes back with update().
+
+    The playback engine's thread reads tracks while the UI thread does, so
+    the table and the row index only change under a lock.
+
+    update_many() finds indices through a map from track id to indices,
+    built on first use. Appends and updates keep it current; other
+    inserts and deletes shift indices, so they drop it to be rebuilt.
+    """
+
+    def __init__(self, library: Library, track_ids: array):
+        self.library = library
+        self.table = TrackTable()
+        self._ids = track_ids
+        self._rows = array('l', [-1]) * len(track_ids)  # table row per index, -1 until loaded
+        self._positions: Optional[Dict[int, List[int]]] = None  # track id -> indices
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        with self._lock:
+            if index < 0:
+                index += len(self._ids)
+            if self._rows[index] < 0:
+                self._load_page(index)
+            return self.table.get(self._rows[index])
+
+    def __setitem__(self, index, track: Track):
+        with self._lock:
+            if index < 0:
+                index += len(self._ids)
+            self._move(index, self._ids[index], track.id)
+            self._ids[index] = track.id
+            self._rows[index] = self.table.append(track)
+
+    def __delitem__(self, index):
+        with self._lock:
+            if index in (-1, len(self._ids) - 1) and self._positions is not None:
+                self._move(len(self._ids) - 1, self._ids[-1], None)
+            else:
+                self._positions = None
+            del self._ids[index]
+            del self._rows[index]
+
+    def insert(self, index, track: Track):
+        with self._lock:
+            if index >= len(self._ids) and self._positions is not None:
+                self._positions.setdefault(track.id, []).append(len(self._ids))
+            else:
+                self._positions = None
+            self._ids.insert(index, track.id)
+            self._rows.insert(index, self.table.append(track))
+
+    def update(self, track: Track, old_id: Optional[int] = None) -> List[int]:
+        """Write a changed track back to every index holding it; returns those indices"""
+        return self.update_many({track.id if old_id is None else old_id: track})
+
+    def update_many(self, tracks: Dict[int, Track]) -> List[int]:
+        """update() for several tracks, keyed by their old id, in one pass"""
+        indices = []
+        with self._lock:
+            if self._positions is None:
+                self._positions = {}
+                for index, track_id in enumerate(self._ids):
+                    self._positions.setdefault(track_id, []).append(index)
+            for old_id, track in tracks.items():
+                for index in list(self._positions.get(old_id, ())):
+                    indices.append(index)
+                    self._move(index, old_id, track.id)
+                    self._ids[index] = track.id
+                    if self._rows[index] >= 0:
+                        self.table.set(self._rows[index], track)
+                    else:
+                        self._rows[index] = self.table.append(track)
+        return sorted(indices)
+
+    def _move(self, index: int, old_id: int, new_id: Optional[int]):
+        """Keep the id map current when index changes track; called with the lock held"""
+        if self._positions is None or old_id == new_id:
+            return
+        positions = self._positions[old_id]
+        positions.remove(index)
+        if not positions:
+            del self._positions[old_id]
+        if new_id is not None:
+            self._positions.setdefault(new_id, []).append(index)
+
+    def _load_page(self, index: int):
+        """Load the rows around index; called with the lock held"""
+        start = max(index - Library.PAGE_SIZE // 4, 0)
+        end = min(start + Library.PAGE_SIZE, len(self._ids))
+        missing = [i for i in range(start, end) if self._rows[i] < 0]
+        tracks = self.library.get_tracks({self._ids[i] for i in missing})
+        for i in missing:
+            track = tracks.get(self._ids[i])
+            if track is None:
+                track = Track("(missing track)", path=None, source_id=f"missing:{self._ids[i]}", id=self._ids[i])
+            self._rows[i] = self.table.append(track)
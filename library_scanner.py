@@ -0,0 +1,280 @@
+import os
+import threading
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from track import Track
+
+try:
+    import mutagen
+except ImportError:  # Tags are optional; titles fall back to file names
+    mutagen = None
+
+AUDIO_EXTENSIONS = frozenset((
+    '.mp3', '.ogg', '.opus', '.flac', '.wav', '.m4a', '.aac', '.wma', '.aiff', '.aif', '.mod', '.xm',
+))
+
+# Tracks written to the library per transaction while scanning
+BATCH_SIZE = 1000
+
+
+def is_audio_file(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+
+
+def read_tags(path: str) -> Tuple[str, Optional[float]]:
+    """Display title and duration of a file, from its tags when mutagen is installed"""
+    title = os.path.splitext(os.path.basename(path))[0]
+    duration = None
+    if mutagen is None:
+        return title, duration
+    try:
+        audio = mutagen.File(path, easy=True)
+    except Exception:
+        audio = None
+    if audio is None:
+        return title, duration
+    if audio.info is not None:
+        duration = getattr(audio.info, 'length', None)
+    tags = audio.tags or {}
+    if tags.get('title'):
+        title = tags['title'][0]
+        if tags.get('artist'):
+            title = f"{tags['artist'][0]} - {title}"
+    return title, duration
+
+
+class ScanStats:
+    def __init__(self):
+        self.files = 0
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+        self.seconds = 0.0
+        # Files that are new to the library, and files that disappeared
+        self.added_paths: List[str] = []
+        self.removed_paths: List[str] = []
+        # mtime of every directory walked, for LibraryWatcher
+        self.directories: Dict[str, float] = {}
+
+    @property
+    def unchanged(self) -> int:
+        return self.files - self.added - self.updated
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+    def as_dict(self) -> Dict:
+        return {
+            'files': self.files, 'added': self.added, 'updated': self.updated,
+            'removed': self.removed, 'unchanged': self.unchanged, 'seconds': self.seconds,
+        }
+
+
+class LibraryScanner:
+    """Walks music folders into the library, touching only what changed
+
+    Directories are listed on a thread pool, one task per directory, and
+    the mtime and size of every audio file are compared with what the
+    library recorded last time. Only new or changed files have their tags
+    read, again on the pool, and the results are written in batches.
+    """
+
+    def __init__(self, library, workers: int = 8, read_tags: Callable = read_tags):
+        self.library = library
+        self.workers = max(1, workers)
+        self.read_tags = read_tags
+
+    def scan(self, roots: Iterable[str], on_progress: Optional[Callable[[ScanStats], None]] = None) -> ScanStats:
+        """Walk roots recursively and sync the library with them"""
+        roots = [os.path.abspath(root) for root in roots]
+        known: Dict[str, Tuple[float, int]] = {}
+        for root in roots:
+            known.update(self.library.file_states_under(root))
+        return self._sync(roots, None, known, on_progress)
+
+    def rescan_directories(self, directories: Iterable[str], known_directories: Iterable[str] = ()) -> ScanStats:
+        """Re-list only the given directories
+
+        Subdirectories not in known_directories are new and get walked fully.
+        """
+        directories = [os.path.abspath(directory) for directory in directories]
+        known = self.library.file_states_in(directories)
+        for directory in directories:
+            if not os.path.isdir(directory):
+                # Gone along with everything below it
+                known.update(self.library.file_states_under(directory))
+        return self._sync(directories, set(known_directories) | set(directories), known, None)
+
+    def _sync(self, directories: List[str], known_directories: Optional[set],
+              known: Dict[str, Tuple[float, int]], on_progress: Optional[Callable]) -> ScanStats:
+        """List directories and write what differs from known; known_directories=None recurses everywhere"""
+        started = time.perf_counter()
+        stats = ScanStats()
+        seen = set()
+        changed: List[Tuple[str, float, int]] = []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # Listings come back through a queue so huge trees cost O(1) per directory
+            listings = queue.Queue()
+            outstanding = 0
+            for directory in directories:
+                if os.path.isdir(directory):
+                    pool.submit(self._list_into, directory, listings)
+                    outstanding += 1
+            while outstanding:
+                directory, mtime, files, subdirectories = listings.get()
+                outstanding -= 1
+                if mtime is not None:
+                    stats.directories[directory] = mtime
+                for path, file_mtime, size in files:
+                    stats.files += 1
+                    seen.add(path)
+                    if known.get(path) != (file_mtime, size):
+                        changed.append((path, file_mtime, size))
+                for subdirectory in subdirectories:
+                    if known_directories is None or subdirectory not in known_directories:
+                        pool.submit(self._list_into, subdirectory, listings)
+                        outstanding += 1
+
+            for start in range(0, len(changed), BATCH_SIZE):
+                batch = changed[start:start + BATCH_SIZE]
+                tags = pool.map(self.read_tags, [path for path, _, _ in batch])
+                records = []
+                for (path, mtime, size), (title, duration) in zip(batch, tags):
+                    if path in known:
+                        stats.updated += 1
+                    else:
+                        stats.added += 1
+                        stats.added_paths.append(path)
+                    track = Track(title, path=path, duration=duration, source_id=f"file:{path}")
+                    records.append((track, mtime, size))
+                self.library.record_files(records)
+                if on_progress:
+                    on_progress(stats)
+
+        removed = [path for path in known if path not in seen]
+        if removed:
+            self.library.remove_files(removed)
+        stats.removed = len(removed)
+        stats.removed_paths = removed
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    @classmethod
+    def _list_into(cls, directory: str, listings: queue.Queue):
+        try:
+            listings.put(cls._list_directory(directory))
+        except Exception as e:
+            print(f"Error listing {directory}: {e}")
+            listings.put((directory, None, [], []))
+
+    @staticmethod
+    def _list_directory(directory: str):
+        files = []
+        subdirectories = []
+        try:
+            mtime = os.stat(directory).st_mtime
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.path)
+                        elif entry.is_file() and is_audio_file(entry.name):
+                            stat = entry.stat()
+                            files.append((entry.path, stat.st_mtime, stat.st_size))
+                    except OSError:
+                        continue
+        except OSError:
+            mtime = None
+        return directory, mtime, files, subdirectories
+
+
+class LibraryWatcher:
+    """Keeps scanned folders in sync by polling directory mtimes
+
+    Adding or removing a file changes its directory's mtime, so each poll
+    only stats the known directories and re-lists the ones that changed;
+    files are not stat'ed again until a full scan. ``on_change(stats)``
+    is called from the watcher thread whenever the library changed.
+    """
+
+    def __init__(self, scanner: LibraryScanner, interval: float = 10.0,
+                 on_change: Optional[Callable[[ScanStats], None]] = None):
+        self.scanner = scanner
+        self.interval = interval
+        self.on_change = on_change
+        self.roots: List[str] = []
+        self._directories: Dict[str, float] = {}
+        self._to_scan: List[str] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, roots: Iterable[str] = ()):
+        """Scan roots incrementally, then keep polling them"""
+        for root in roots:
+            self.add_root(root)
+        self._thread = threading.Thread(target=self._run, name="library-watcher", daemon=True)
+        self._thread.start()
+
+    def add_root(self, root: str):
+        root = os.path.abspath(root)
+        with self._lock:
+            if root not in self.roots:
+                self.roots.append(root)
+            self._to_scan.append(root)
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def poll(self) -> ScanStats:
+        """Re-list directories whose mtime moved since the last look"""
+        with self._lock:
+            directories = list(self._directories.items())
+        changed = []
+        for directory, mtime in directories:
+            try:
+                if os.stat(directory).st_mtime != mtime:
+                    changed.append(directory)
+            except OSError:
+                changed.append(directory)
+        if not changed:
+            return ScanStats()
+        stats = self.scanner.rescan_directories(changed, known_directories=[d for d, _ in directories])
+        with self._lock:
+            for directory in changed:
+                if directory not in stats.directories:
+                    self._forget(directory)
+            self._directories.update(stats.directories)
+        return stats
+
+    def _forget(self, directory: str):
+        prefix = os.path.join(directory, "")
+        for known in [d for d in self._directories if d == directory or d.startswith(prefix)]:
+            del self._directories[known]
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                to_scan, self._to_scan = self._to_scan, []
+            try:
+                if to_scan:
+                    stats = self.scanner.scan(to_scan)
+                    with self._lock:
+                        self._directories.update(stats.directories)
+                else:
+                    stats = self.poll()
+            except Exception as e:
+                print(f"Error scanning library: {e}")
+                stats = None
+            if stats is not None and (stats.changed or to_scan) and self.on_change:
+                self.on_change(stats)
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,210 @@
+import math
+import os
+import subprocess
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from batch_worker import BatchWorker, ProcessPool
+from media_probe import file_state
+
+# numpy is only needed where tracks are measured, in the worker processes
+if TYPE_CHECKING:
+    import numpy as np
+
+# Loudness every track is normalized to (ReplayGain 2 reference level)
+TARGET_LUFS = -18.0
+# Largest boost or cut applied to a single track
+MAX_GAIN_DB = 18.0
+
+ANALYSIS_RATE = 44100
+CHANNELS = 2
+# BS.1770 gating blocks: 400 ms windows moving in 100 ms steps
+SEGMENT_SECONDS = 0.1
+SEGMENTS_PER_BLOCK = 4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+# Segments decoded per read, about 10 s of audio
+SEGMENTS_PER_READ = 100
+
+
+def _biquad_response(b, a, freqs, rate):
+    import numpy as np
+
+    z = np.exp(-2j * np.pi * freqs / rate)
+    return (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+
+
+def k_weighting_power(size: int, rate: int = ANALYSIS_RATE) -> "np.ndarray":
+    """|H(f)|^2 of the BS.1770 K-weighting filter at the rfft bins of size samples"""
+    import numpy as np
+
+    freqs = np.fft.rfftfreq(size, 1 / rate)
+
+    # Stage 1: high shelf, +4 dB above ~1.7 kHz
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = _biquad_response(
+        ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+        freqs, rate
+    )
+
+    # Stage 2: high pass around 38 Hz
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    highpass = _biquad_response(
+        (1.0, -2.0, 1.0),
+        (1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+        freqs, rate
+    )
+    return np.abs(shelf * highpass) ** 2
+
+
+class LoudnessMeter:
+    """Integrated loudness and sample peak of PCM fed in any number of pieces
+
+    The signal is cut into 100 ms segments and each segment's K-weighted
+    mean square comes from its spectrum (Parseval), for all segments of a
+    piece in one vectorized FFT. Four consecutive segments form one gating
+    block, so blocks never need their own filtering pass.
+    """
+
+    def __init__(self, rate: int = ANALYSIS_RATE, channels: int = CHANNELS):
+        import numpy as np
+
+        self.rate = rate
+        self.channels = channels
+        self.segment = int(rate * SEGMENT_SECONDS)
+        self.weights = k_weighting_power(self.segment, rate)
+        # rfft bins other than DC and Nyquist stand for two frequencies
+        self.weights[1:(self.segment + 1) // 2] *= 2
+        self.powers: List["np.ndarray"] = []
+        self.peak = 0.0
+        self._leftover = np.zeros((0, channels), dtype=np.float32)
+
+    def add(self, samples: "np.ndarray"):
+        """Feed interleaved float samples, shape (n, channels)"""
+        import numpy as np
+
+        if len(samples):
+            self.peak = max(self.peak, float(np.abs(samples).max()))
+        samples = np.concatenate((self._leftover, samples)) if len(self._leftover) else samples
+        count = len(samples) // self.segment
+        self._leftover = samples[count * self.segment:]
+        if not count:
+            return
+        segments = samples[:count * self.segment].reshape(count, self.segment, self.channels)
+        spectrum = np.fft.rfft(segments, axis=1)
+        # Mean square per segment, summed over channels (weight 1.0 for L/R)
+        energy = (np.abs(spectrum) ** 2 * self.weights[:, None]).sum(axis=(1, 2))
+        self.powers.append(energy / (self.segment * self.segment))
+
+    def integrated(self) -> Optional[float]:
+        """Gated integrated loudness in LUFS, None for silence or very short input"""
+        import numpy as np
+
+        if not self.powers:
+            return None
+        powers = np.concatenate(self.powers)
+        if len(powers) < SEGMENTS_PER_BLOCK:
+            return None
+        blocks = np.convolve(powers, np.full(SEGMENTS_PER_BLOCK, 1 / SEGMENTS_PER_BLOCK), mode='valid')
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(blocks)
+        blocks = blocks[loudness > ABSOLUTE_GATE]
+        if not len(blocks):
+            return None
+        relative = -0.691 + 10 * np.log10(blocks.mean()) + RELATIVE_GATE
+        with np.errstate(divide='ignore'):
+            gated = blocks[-0.691 + 10 * np.log10(blocks) > relative]
+        return -0.691 + 10 * math.log10(gated.mean())
+
+
+def track_gain(integrated: Optional[float], peak: float) -> float:
+    """Gain in dB towards TARGET_LUFS, reduced so the peak doesn't clip"""
+    if integrated is None:
+        return 0.0
+    gain = TARGET_LUFS - integrated
+    if peak > 0:
+        gain = min(gain, -20 * math.log10(peak))
+    return max(-MAX_GAIN_DB, min(MAX_GAIN_DB, gain))
+
+
+def measure_file(path: str, ffmpeg: str = "ffmpeg") -> Optional[Dict]:
+    """Decode a file through FFmpeg and measure it; runs in a worker process"""
+    import numpy as np
+
+    try:
+        stat = os.stat(path)
+        process = subprocess.Popen(
+            [ffmpeg, '-v', 'error', '-i', path, '-vn', '-ac', str(CHANNELS), '-ar', str(ANALYSIS_RATE),
+             '-f', 'f32le', '-'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+    except OSError:
+        return None
+    meter = LoudnessMeter()
+    frame_bytes = 4 * CHANNELS
+    read_size = meter.segment * SEGMENTS_PER_READ * frame_bytes
+    with process:
+        while True:
+            data = process.stdout.read(read_size)
+            if not data:
+                break
+            usable = len(data) - len(data) % frame_bytes
+            meter.add(np.frombuffer(data[:usable], dtype=np.float32).reshape(-1, CHANNELS))
+    if process.returncode:
+        return None
+    integrated = meter.integrated()
+    return {
+        'path': path,
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'integrated_lufs': integrated,
+        'peak': meter.peak,
+        'gain_db': track_gain(integrated, meter.peak),
+    }
+
+
+class LoudnessAnalyzer(BatchWorker):
+    """Measures tracks on a process pool and keeps the results in the library
+
+    Results are keyed by path and valid while mtime and size match, so each
+    file is decoded once. ``on_analyzed(results)`` receives every finished
+    batch as a path -> result dict, through ``dispatch``.
+    """
+
+    name = "loudness"
+
+    def __init__(self, library, workers: Optional[int] = None,
+                 on_analyzed: Optional[Callable[[Dict[str, Dict]], None]] = None,
+                 dispatch: Optional[Callable] = None, pool: Optional[ProcessPool] = None):
+        super().__init__(measure_file, workers, on_analyzed, dispatch, pool)
+        self.library = library
+
+    def gain_for(self, path: Optional[str]) -> Optional[float]:
+        """Cached gain in dB for a file, None if it hasn't been measured"""
+        if not path:
+            return None
+        result = self.library.get_loudness([path]).get(path)
+        if result is None or file_state(path) != (result['mtime'], result['size']):
+            return None
+        return result['gain_db']
+
+    def needed(self, paths: List[str]) -> List[str]:
+        """Files not measured since they last changed"""
+        stored = self.library.get_loudness(paths)
+        return [path for path in paths
+                if path not in stored or file_state(path) != (stored[path]['mtime'], stored[path]['size'])]
+
+    def analyze_library(self) -> int:
+        """Queue every library file without a current measurement"""
+        paths = self.library.paths_without_loudness()
+        self.request(paths)
+        return len(paths)
+
+    def store(self, results: List[Dict]):
+        self.library.store_loudness(results)
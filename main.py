@@ -1,47 +1,54 @@
-import customtkinter as ctk
-import yt_dlp
-import pygame
-import pystray
-from PIL import Image
-import threading
+import argparse
 import os
-import subprocess
+import sys
+import threading
 import time
-from typing import Dict, List
-from tkinter import ttk
-import urllib.request
-from io import BytesIO
-import json
+from typing import Dict
+
+import instrumentation
+from player_core import PlayerCore
+from search import is_url
+from track import Track
+
+try:
+    import customtkinter as ctk
+    from tkinter import TclError, filedialog, ttk
+
+    from playlist_view import PlaylistView
+    from ui_scheduler import RefreshScheduler
+except ImportError:  # No Tk on this machine; only --headless can run
+    ctk = None
 
 class MusicPlayer:
-    def __init__(self):
-        self.current_track = None
-        self.playlist = []
-        self.is_playing = False
-        self.current_position = 0
-        self.volume = 0.5  # 50% default volume
-        self.shuffle_enabled = False
-        self.repeat_enabled = False
-        self.original_playlist = []  # Store original playlist order for shuffle
-        
-        pygame.mixer.init()
-        pygame.mixer.music.set_volume(self.volume)
-        
+    """Tk window and tray icon; one client of a PlayerCore"""
+
+    def __init__(self, core: PlayerCore = None):
+        started = time.perf_counter()
+        self.core = core or PlayerCore()
+        self.search_results = []
+        self.icon = None  # set once the tray icon is up
+
         # Initialize the main window
         self.window = ctk.CTk()
         self.window.title("Universal Music Player")
         self.window.geometry("1000x700")
         self.window.protocol("WM_DELETE_WINDOW", self.minimize_to_tray)
-        
+        self.scheduler = RefreshScheduler(self.window)
+        self.core.add_listener(self.on_core_event)
+        self.core_wake_pending = threading.Event()
+        self.window.bind("<<CorePosted>>", self.on_core_posted)
+        self.core.on_post = self.request_core_wake
+
         # Create main containers
         self.create_main_layout()
-        self.setup_system_tray()
-        
+        # The first idle moment comes once the window is drawn and takes input
+        self.window.after_idle(self.on_window_ready, started)
+
         # Start update loops
         self.start_progress_update()
         
-        # Load saved playlist if exists
-        self.load_saved_playlist()
+        # Load saved playlist and start watching music folders
+        self.core.start()
 
     def create_main_layout(self):
         # Create main frames
@@ -66,10 +73,6 @@ class MusicPlayer:
         # Status label
         self.status_label = ctk.CTkLabel(self.window, text="")
         self.status_label.pack(pady=5)
-        
-        # Check FFmpeg on startup
-        if not self.check_ffmpeg():
-            self.show_ffmpeg_instructions()
 
     def setup_left_panel(self):
         # Source selection
@@ -100,8 +103,46 @@ class MusicPlayer:
             number_of_steps=100,
             command=self.volume_changed
         )
-        self.volume_slider.set(self.volume)
+        self.volume_slider.set(self.core.volume)
         self.volume_slider.pack(pady=5, padx=10, fill="x")
+
+        self.stream_switch = ctk.CTkSwitch(
+            self.left_frame,
+            text="Stream while downloading",
+            command=self.toggle_streaming
+        )
+        self.stream_switch.pack(pady=(10, 5), padx=10)
+
+        self.reuse_switch = ctk.CTkSwitch(
+            self.left_frame,
+            text="Reuse library copies",
+            command=self.toggle_reuse_duplicates
+        )
+        if self.core.reuse_duplicates:
+            self.reuse_switch.select()
+        self.reuse_switch.pack(pady=5, padx=10)
+
+        self.normalize_switch = ctk.CTkSwitch(
+            self.left_frame,
+            text="Normalize loudness",
+            command=self.toggle_normalize_loudness
+        )
+        self.normalize_switch.select()
+        self.normalize_switch.pack(pady=5, padx=10)
+
+        self.analyze_loudness_btn = ctk.CTkButton(
+            self.left_frame,
+            text="Analyze Loudness",
+            command=self.analyze_library_loudness
+        )
+        self.analyze_loudness_btn.pack(pady=5, padx=10, fill="x")
+
+        self.find_duplicates_btn = ctk.CTkButton(
+            self.left_frame,
+            text="Find Duplicates",
+            command=self.find_duplicates
+        )
+        self.find_duplicates_btn.pack(pady=5, padx=10, fill="x")
         
         # Playlist operations
         self.save_playlist_btn = ctk.CTkButton(
@@ -125,6 +166,24 @@ class MusicPlayer:
         )
         self.clear_playlist_btn.pack(pady=5, padx=10, fill="x")
 
+        # Download queue operations
+        self.downloads_label = ctk.CTkLabel(self.left_frame, text="Downloads")
+        self.downloads_label.pack(pady=(20, 5))
+
+        self.cancel_downloads_btn = ctk.CTkButton(
+            self.left_frame,
+            text="Cancel Downloads",
+            command=self.cancel_downloads
+        )
+        self.cancel_downloads_btn.pack(pady=5, padx=10, fill="x")
+
+        self.retry_downloads_btn = ctk.CTkButton(
+            self.left_frame,
+            text="Retry Failed",
+            command=self.retry_downloads
+        )
+        self.retry_downloads_btn.pack(pady=5, padx=10, fill="x")
+
     def setup_right_panel(self):
         # Search frame
         self.search_frame = ctk.CTkFrame(self.right_frame)
@@ -142,6 +201,45 @@ class MusicPlayer:
             command=self.add_to_playlist
         )
         self.add_button.pack(side="right")
+
+        # Search candidates, shown only while there are results
+        self.results_frame = ctk.CTkFrame(self.right_frame)
+
+        self.results_header = ctk.CTkFrame(self.results_frame)
+        self.results_header.pack(fill="x")
+
+        self.results_label = ctk.CTkLabel(self.results_header, text="Search results")
+        self.results_label.pack(side="left", padx=5)
+
+        self.close_results_btn = ctk.CTkButton(
+            self.results_header,
+            text="✕",
+            width=30,
+            command=self.hide_search_results
+        )
+        self.close_results_btn.pack(side="right", padx=5)
+
+        self.pin_results_btn = ctk.CTkButton(
+            self.results_header,
+            text="Add Selected",
+            command=self.pin_search_results
+        )
+        self.pin_results_btn.pack(side="right", padx=5)
+
+        self.results_tree = ttk.Treeview(
+            self.results_frame,
+            columns=("Title", "Duration", "Uploader"),
+            show="headings",
+            height=6
+        )
+        self.results_tree.heading("Title", text="Title")
+        self.results_tree.heading("Duration", text="Duration")
+        self.results_tree.heading("Uploader", text="Uploader")
+        self.results_tree.column("Title", width=300)
+        self.results_tree.column("Duration", width=100)
+        self.results_tree.column("Uploader", width=100)
+        self.results_tree.pack(fill="both", expand=True, pady=(5, 0))
+        self.results_tree.bind("<Double-1>", self.on_search_result_double_click)
         
         # Playlist frame
         self.playlist_frame = ctk.CTkFrame(self.right_frame)
@@ -162,8 +260,18 @@ class MusicPlayer:
         self.playlist_tree.column("Duration", width=100)
         self.playlist_tree.column("Source", width=100)
         
-        self.playlist_tree.pack(fill="both", expand=True)
+        self.playlist_scrollbar = ttk.Scrollbar(self.playlist_frame, orient="vertical")
+        self.playlist_scrollbar.pack(side="right", fill="y")
+        self.playlist_tree.pack(side="left", fill="both", expand=True)
         self.playlist_tree.bind("<Double-1>", self.on_playlist_double_click)
+
+        self.playlist_view = PlaylistView(
+            self.playlist_tree,
+            self.playlist_scrollbar,
+            get_track=self.core.get_track,
+            length=lambda: len(self.core.playlist),
+            row_values=self.playlist_row_values
+        )
         
         # Progress bar and time labels
         self.progress_frame = ctk.CTkFrame(self.right_frame)
@@ -175,6 +283,7 @@ class MusicPlayer:
         self.progress_bar = ctk.CTkProgressBar(self.progress_frame)
         self.progress_bar.pack(side="left", fill="x", expand=True, padx=5)
         self.progress_bar.set(0)
+        self.progress_bar.bind("<Button-1>", self.on_progress_click)
         
         self.time_total = ctk.CTkLabel(self.progress_frame, text="0:00")
         self.time_total.pack(side="left", padx=5)
@@ -226,60 +335,93 @@ class MusicPlayer:
     def source_changed(self):
         source = self.source_var.get()
         if source == "Local Files":
-            self.url_entry.configure(placeholder_text="Click 'Add to Playlist' to browse files")
+            self.url_entry.configure(placeholder_text="Click 'Add to Playlist' to add a music folder")
         else:
             self.url_entry.configure(placeholder_text="Enter URL or search term")
 
     def volume_changed(self, value):
-        self.volume = value
-        pygame.mixer.music.set_volume(value)
+        self.core.set_volume(value)
+
+    def toggle_normalize_loudness(self):
+        self.core.set_normalize_loudness(bool(self.normalize_switch.get()))
+
+    def analyze_library_loudness(self):
+        self.core.analyze_library_loudness()
+
+    def find_duplicates(self):
+        self.core.find_duplicates()
+
+    def toggle_streaming(self):
+        self.core.set_streaming(bool(self.stream_switch.get()))
+
+    def toggle_reuse_duplicates(self):
+        self.core.set_reuse_duplicates(bool(self.reuse_switch.get()))
 
     def save_playlist(self):
-        playlist_data = {
-            "tracks": self.playlist
-        }
-        with open("playlist.json", "w") as f:
-            json.dump(playlist_data, f)
-        self.show_success("Playlist saved!")
-
-    def load_saved_playlist(self):
-        try:
-            with open("playlist.json", "r") as f:
-                playlist_data = json.load(f)
-                self.playlist = playlist_data["tracks"]
-                self.original_playlist = self.playlist.copy()
-                self.update_playlist_display()
-        except FileNotFoundError:
-            pass
+        name = ctk.CTkInputDialog(text="Save playlist as:", title="Save Playlist").get_input()
+        if not name:
+            return
+        self.core.save_playlist(name.strip())
 
     def load_playlist(self):
-        # Implement playlist loading from file
-        pass
+        names = ", ".join(self.core.library.playlist_names())
+        name = ctk.CTkInputDialog(
+            text=f"Playlist to load:\n{names}",
+            title="Load Playlist"
+        ).get_input()
+        if not name:
+            return
+        self.core.load_playlist(name.strip())
 
     def clear_playlist(self):
-        self.playlist = []
-        self.original_playlist = []
-        self.update_playlist_display()
-        self.show_success("Playlist cleared")
+        self.core.clear_playlist()
 
     def on_playlist_double_click(self, event):
         selection = self.playlist_tree.selection()
         if selection:
-            index = self.playlist_tree.index(selection[0])
-            self.current_position = index
-            self.play_current_track()
+            self.core.play(self.playlist_view.index_of(selection[0]))
 
     def start_progress_update(self):
-        def update_progress():
-            while True:
-                if self.is_playing and pygame.mixer.music.get_busy():
-                    current_time = pygame.mixer.music.get_pos() / 1000  # Convert to seconds
-                    self.progress_bar.set(current_time / self.current_track_length)
-                    self.time_current.configure(text=self.format_time(current_time))
-                time.sleep(0.1)
+        # Core callbacks: every 50 ms while they keep coming, dormant otherwise
+        # and hidden or not; request_core_wake() runs it when one is posted
+        self.scheduler.add_task("ui_queue", self.core.process_pending, 50)
+        # Progress bar: 10 Hz while playing and visible, dormant otherwise
+        self.scheduler.add_task("progress", self.update_progress, 100)
+
+    def request_core_wake(self):
+        """Have the Tk thread run posted core callbacks; called from any thread"""
+        if self.core_wake_pending.is_set():
+            return
+        self.core_wake_pending.set()
+        try:
+            self.window.event_generate("<<CorePosted>>", when="tail")
+        except (RuntimeError, TclError):
+            # Main loop not running (yet); the task's first run drains the queue
+            self.core_wake_pending.clear()
 
-        self.progress_thread = threading.Thread(target=update_progress, daemon=True)
-        self.progress_thread.start()
+    def on_core_posted(self, event=None):
+        self.core_wake_pending.clear()
+        self.scheduler.wake("ui_queue")
+
+    def update_progress(self) -> bool:
+        if not self.core.is_playing:
+            return False
+        self.show_position(self.core.engine.playback_position())
+        return True
+
+    def show_position(self, current_time: float):
+        if self.core.current_track_length:
+            self.progress_bar.set(min(current_time / self.core.current_track_length, 1.0))
+        time_text = self.format_time(current_time)
+        if time_text != self.time_current.cget("text"):
+            self.time_current.configure(text=time_text)
+
+    def on_progress_click(self, event):
+        # Jump to the clicked fraction of the track
+        width = self.progress_bar.winfo_width()
+        if width and self.core.current_track_length:
+            fraction = min(max(event.x / width, 0.0), 1.0)
+            self.core.seek(fraction * self.core.current_track_length)
 
     def format_time(self, seconds):
         minutes = int(seconds // 60)
@@ -287,20 +429,40 @@ class MusicPlayer:
         return f"{minutes}:{seconds:02d}"
 
     def minimize_to_tray(self):
+        if self.icon is None:
+            # No tray icon (yet) to bring the window back from
+            self.window.iconify()
+            return
         self.window.withdraw()
+        self.scheduler.set_visible(False)
         self.icon.visible = True
 
+    def on_window_ready(self, started: float):
+        instrumentation.record('startup.window', started, time.perf_counter())
+        self.setup_system_tray()
+
     def setup_system_tray(self):
+        # pystray and Pillow load on the tray thread, after the window is up
+        threading.Thread(target=self.run_system_tray, name="tray", daemon=True).start()
+
+    def run_system_tray(self):
+        try:
+            import pystray
+            from PIL import Image
+        except Exception as e:  # Not installed, or no tray on this desktop
+            print(f"No tray icon: {e}")
+            return
         self.icon_image = Image.new('RGB', (64, 64), color='red')
-        self.icon = pystray.Icon(
+        icon = pystray.Icon(
             "music_player",
             self.icon_image,
             menu=pystray.Menu(
-                pystray.MenuItem("Show", self.show_window),
-                pystray.MenuItem("Exit", self.quit_app)
+                pystray.MenuItem("Show", lambda: self.core.post(self.show_window)),
+                pystray.MenuItem("Exit", lambda: self.core.post(self.quit_app))
             )
         )
-        threading.Thread(target=self.icon.run, daemon=True).start()
+        self.icon = icon
+        icon.run()
 
     def show_ffmpeg_instructions(self):
         """Show detailed FFmpeg installation instructions"""
@@ -340,219 +502,202 @@ FFmpeg is not installed. Please follow these steps:
         
         self.instructions_label.configure(text=instructions)
 
-    def check_ffmpeg(self) -> bool:
-        """Check if FFmpeg is installed and accessible"""
-        try:
-            # Try multiple possible ffmpeg commands
-            for cmd in ['ffmpeg', 'ffmpeg.exe']:
-                try:
-                    result = subprocess.run(
-                        [cmd, '-version'],
-                        capture_output=True,
-                        text=True
-                    )
-                    if result.returncode == 0:
-                        self.show_success("FFmpeg found and working!")
-                        self.instructions_label.configure(text="")  # Clear instructions
-                        return True
-                except FileNotFoundError:
-                    continue
-            
-            self.show_error("FFmpeg not found! See instructions below.")
-            return False
-            
-        except Exception as e:
-            self.show_error(f"Error checking FFmpeg: {str(e)}")
-            return False
-
     def show_error(self, message: str):
         """Display error message in the UI"""
-        self.status_label.configure(text=message, text_color="red")
+        self.scheduler.request(
+            "status", lambda: self.status_label.configure(text=message, text_color="red")
+        )
         
     def show_success(self, message: str):
         """Display success message in the UI"""
-        self.status_label.configure(text=message, text_color="green")
-
-    def download_track(self, url: str) -> Dict:
-        if not self.check_ffmpeg():
-            self.show_ffmpeg_instructions()
-            raise Exception("FFmpeg is required but not installed")
-            
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'outtmpl': 'downloads/%(title)s.%(ext)s',
-            'quiet': True,
-            'no_warnings': True
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                self.show_success("Downloading track...")
-                info = ydl.extract_info(url, download=True)
-                self.show_success("Download complete!")
-                return info
-        except Exception as e:
-            error_message = str(e)
-            if "ffmpeg" in error_message.lower():
-                self.show_error("FFmpeg error: Please install FFmpeg to continue")
+        self.scheduler.request(
+            "status", lambda: self.status_label.configure(text=message, text_color="green")
+        )
+
+    def on_core_event(self, event: str, data: Dict):
+        """Reflect core and playback state changes in the UI"""
+        if event == 'status':
+            if data['error']:
+                self.show_error(data['message'])
             else:
-                self.show_error(f"Download error: {error_message}")
-            raise
+                self.show_success(data['message'])
+        elif event == 'ffmpeg':
+            if data['found']:
+                self.instructions_label.configure(text="")  # Clear instructions
+            else:
+                self.show_ffmpeg_instructions()
+        elif event == 'playlist_reset':
+            self.update_playlist_display()
+        elif event == 'track_added':
+            self.playlist_view.insert(data['index'])
+        elif event == 'tracks_updated':
+            for index in data['indices']:
+                self.playlist_view.update(index)
+        elif event == 'search_results':
+            self.show_search_results(data['query'], data['results'])
+        elif event == 'duration':
+            self.time_total.configure(text=self.format_time(data['duration']))
+        elif event == 'playing':
+            self.time_total.configure(text=self.format_time(self.core.current_track_length))
+            self.play_button.configure(text="⏸")
+            self.scheduler.wake("progress")
+            self.playlist_view.update(data['position'])
+            self.playlist_view.set_current(data['position'])
+        elif event == 'seeked':
+            # Shown right away, also while paused
+            self.show_position(data['seconds'])
+        elif event in ('paused', 'stopped', 'error'):
+            self.play_button.configure(text="▶")
 
     def add_to_playlist(self):
-        url = self.url_entry.get()
-        if not url:
-            self.show_error("Please enter a URL")
+        if self.source_var.get() == "Local Files":
+            self.add_music_folder()
             return
-            
-        try:
-            info = self.download_track(url)
-            self.playlist.append({
-                'title': info['title'],
-                'path': f"downloads/{info['title']}.mp3"
-            })
-            self.original_playlist = self.playlist.copy()
-            self.update_playlist_display()
-            self.show_success(f"Added: {info['title']}")
+
+        text = self.url_entry.get().strip()
+        if not text:
+            self.show_error("Please enter a URL or search term")
+            return
+
+        if not is_url(text):
+            self.core.search(text, self.source_var.get())
+            return
+
+        if self.core.queue_url(text):
             self.url_entry.delete(0, 'end')  # Clear the entry
-        except Exception as e:
-            print(f"Error adding track: {e}")
+
+    def add_music_folder(self):
+        folder = filedialog.askdirectory(title="Add music folder")
+        if folder:
+            self.core.add_music_folder(folder)
+
+    def show_search_results(self, query: str, results):
+        self.search_results = results
+        self.results_tree.delete(*self.results_tree.get_children())
+        for index, result in enumerate(results):
+            duration = self.format_time(result.duration) if result.duration else ""
+            self.results_tree.insert("", "end", iid=str(index),
+                                     values=(result.title, duration, result.uploader or ""))
+        if not results:
+            self.show_error(f"No results for '{query}'")
+            return
+        self.results_label.configure(text=f"Results for '{query}'")
+        self.results_frame.pack(pady=(0, 10), padx=10, fill="x", before=self.playlist_frame)
+        self.show_success(f"{len(results)} results: double click to play, or select and add")
+
+    def hide_search_results(self):
+        self.results_frame.pack_forget()
+        self.search_results = []
+
+    def selected_search_results(self):
+        return [self.search_results[int(item)] for item in self.results_tree.selection()]
+
+    def on_search_result_double_click(self, event):
+        selected = self.selected_search_results()
+        if selected:
+            self.core.queue_url(selected[0].url, selected[0].title, play=True)
+
+    def pin_search_results(self):
+        """Add the selected candidates to the playlist, downloading them now"""
+        selected = self.selected_search_results()
+        if not selected:
+            self.show_error("Select one or more search results first")
+            return
+        for result in selected:
+            self.core.queue_url(result.url, result.title)
+
+    def cancel_downloads(self):
+        self.core.cancel_downloads()
+
+    def retry_downloads(self):
+        self.core.retry_downloads()
 
     def toggle_play(self):
-        if not self.is_playing and self.playlist:
-            self.play_current_track()
-        elif self.is_playing:
-            pygame.mixer.music.pause()
-            self.is_playing = False
-            self.play_button.configure(text="Play")
-        else:
-            pygame.mixer.music.unpause()
-            self.is_playing = True
-            self.play_button.configure(text="Pause")
+        self.core.toggle_play()
 
     def play_current_track(self):
-        if self.playlist:
-            track = self.playlist[self.current_position]
-            try:
-                pygame.mixer.music.load(track['path'])
-                pygame.mixer.music.play()
-                self.is_playing = True
-                self.play_button.configure(text="⏸")
-                
-                # Set up end of track handling
-                pygame.mixer.music.set_endevent(pygame.USEREVENT)
-                threading.Thread(target=self.check_track_end, daemon=True).start()
-                
-                # Update UI
-                self.show_success(f"Now playing: {track['title']}")
-                self.update_playlist_display()
-            except Exception as e:
-                self.show_error(f"Error playing track: {str(e)}")
+        self.core.play(self.core.current_position)
 
     def next_track(self):
-        """Play next track considering shuffle and repeat modes"""
-        if not self.playlist:
-            return
-            
-        if self.current_position + 1 >= len(self.playlist):
-            if self.repeat_enabled:
-                self.current_position = 0
-            else:
-                return
-        else:
-            self.current_position += 1
-            
-        self.play_current_track()
+        self.core.next_track()
 
     def previous_track(self):
-        """Play previous track considering shuffle and repeat modes"""
-        if not self.playlist:
-            return
-            
-        if self.current_position - 1 < 0:
-            if self.repeat_enabled:
-                self.current_position = len(self.playlist) - 1
-            else:
-                return
-        else:
-            self.current_position -= 1
-            
-        self.play_current_track()
-
-    def check_track_end(self):
-        """Check for track end and handle next track"""
-        while True:
-            for event in pygame.event.get():
-                if event.type == pygame.USEREVENT:
-                    # Track ended
-                    if self.repeat_enabled:
-                        # If repeat is enabled, play next track or restart playlist
-                        self.next_track()
-                    elif self.current_position + 1 < len(self.playlist):
-                        # If there are more tracks, play next
-                        self.next_track()
-                    else:
-                        # End of playlist
-                        self.is_playing = False
-                        self.play_button.configure(text="▶")
-            time.sleep(0.1)
+        self.core.previous_track()
 
     def toggle_shuffle(self):
         """Toggle shuffle mode for playlist"""
-        self.shuffle_enabled = not self.shuffle_enabled
-        
-        if self.shuffle_enabled:
-            # Store original playlist and create shuffled version
-            import random
-            self.original_playlist = self.playlist.copy()
-            random.shuffle(self.playlist)
-            self.shuffle_button.configure(fg_color="green")
-            self.show_success("Shuffle enabled")
-        else:
-            # Restore original playlist order
-            if self.original_playlist:
-                current_track = self.playlist[self.current_position] if self.playlist else None
-                self.playlist = self.original_playlist.copy()
-                # Maintain current track position
-                if current_track:
-                    self.current_position = self.playlist.index(current_track)
-            self.shuffle_button.configure(fg_color=("gray75", "gray30"))
-            self.show_success("Shuffle disabled")
-        
-        self.update_playlist_display()
+        self.core.set_shuffle(not self.core.shuffle_enabled)
+        color = "green" if self.core.shuffle_enabled else ("gray75", "gray30")
+        self.shuffle_button.configure(fg_color=color)
 
     def toggle_repeat(self):
         """Toggle repeat mode for playlist"""
-        self.repeat_enabled = not self.repeat_enabled
-        if self.repeat_enabled:
-            self.repeat_button.configure(fg_color="green")
-            self.show_success("Repeat enabled")
-        else:
-            self.repeat_button.configure(fg_color=("gray75", "gray30"))
-            self.show_success("Repeat disabled")
+        self.core.set_repeat(not self.core.repeat_enabled)
+        color = "green" if self.core.repeat_enabled else ("gray75", "gray30")
+        self.repeat_button.configure(fg_color=color)
 
     def update_playlist_display(self):
-        # Update the playlist display (implement this based on your UI needs)
-        pass
+        """Rebuild the whole playlist view once the current UI batch is done"""
+        self.scheduler.request("playlist", self.refresh_playlist_display)
+
+    def refresh_playlist_display(self):
+        core = self.core
+        self.playlist_view.current = core.current_position if core.current_track is not None else None
+        self.playlist_view.reset()
+
+    def playlist_row_values(self, track: Track) -> tuple:
+        if track.duration is None and track.path:
+            self.core.queue_probe(track.path)
+        duration = self.format_time(track.duration) if track.duration else ""
+        title = f"{track.title} (pending)" if track.pending else track.title
+        return (title, duration, track.source_label)
 
     def show_window(self):
         self.window.deiconify()
+        self.scheduler.set_visible(True)
 
     def quit_app(self):
+        self.scheduler.stop()
+        self.core.shutdown()
         self.window.quit()
-        self.icon.stop()
+        if self.icon is not None:
+            self.icon.stop()
 
     def run(self):
         self.window.mainloop()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Universal Music Player")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window, controlled through a local HTTP/JSON API")
+    parser.add_argument("--host", help="control API loopback address (headless only)")
+    parser.add_argument("--port", type=int, help="control API port (headless only)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="record download and playback timings to PATH")
+    parser.add_argument("--trace-format", choices=("jsonl", "chrome"), default="jsonl",
+                        help="rolling JSON lines, or a Chrome trace for chrome://tracing / Perfetto")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
+
     # Create downloads directory if it doesn't exist
     os.makedirs("downloads", exist_ok=True)
-    
-    player = MusicPlayer()
-    player.run() 
\ No newline at end of file
+
+    if args.trace:
+        instrumentation.enable(args.trace, args.trace_format)
+
+    if args.headless:
+        # Imported here so the window doesn't wait for the HTTP server modules
+        from control_server import DEFAULT_HOST, DEFAULT_PORT, is_loopback, run_headless
+
+        host = args.host or DEFAULT_HOST
+        if not is_loopback(host):
+            # The API has no authentication
+            sys.exit(f"--host must be a loopback address such as {DEFAULT_HOST}, not {host}")
+        run_headless(host, DEFAULT_PORT if args.port is None else args.port)
+    elif ctk is None:
+        sys.exit("customtkinter is needed for the window; use --headless without it")
+    else:
+        player = MusicPlayer()
+        player.run()
@@ -0,0 +1,156 @@
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Files handed to one pool.map call, and written in one transaction
+BATCH_SIZE = 64
+
+
+def _number(value, kind=float):
+    try:
+        return kind(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def file_state(path: str):
+    """(mtime, size) of a file, or None if it is gone"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def probe_file(path: str, ffprobe: str = "ffprobe") -> Optional[Dict]:
+    """Duration, codec, bitrate and sample rate of the first audio stream"""
+    state = file_state(path)
+    if state is None:
+        return None
+    try:
+        result = subprocess.run(
+            [ffprobe, '-v', 'error', '-select_streams', 'a:0',
+             '-show_entries', 'format=duration,bit_rate:stream=codec_name,sample_rate,bit_rate',
+             '-of', 'json', path],
+            capture_output=True, text=True, timeout=30
+        )
+        data = json.loads(result.stdout or "{}")
+    except (OSError, subprocess.TimeoutExpired, json.JSONDecodeError):
+        return None
+    fmt = data.get('format')
+    streams = data.get('streams')
+    if result.returncode != 0 or not fmt or not streams:
+        # Not media, or no audio stream: don't store a row of empty fields
+        return None
+    stream = streams[0]
+    return {
+        'path': path,
+        'mtime': state[0],
+        'size': state[1],
+        'duration': _number(fmt.get('duration')),
+        'codec': stream.get('codec_name'),
+        'bitrate': _number(stream.get('bit_rate') or fmt.get('bit_rate'), int),
+        'sample_rate': _number(stream.get('sample_rate'), int),
+    }
+
+
+def probe_from_info(path: str, info: Dict) -> Optional[Dict]:
+    """Probe result built from a yt-dlp info dict, so fresh downloads skip ffprobe"""
+    state = file_state(path)
+    if state is None:
+        return None
+    abr = _number(info.get('abr'))
+    return {
+        'path': path,
+        'mtime': state[0],
+        'size': state[1],
+        'duration': _number(info.get('duration')),
+        'codec': info.get('acodec'),
+        'bitrate': int(abr * 1000) if abr else None,
+        'sample_rate': _number(info.get('asr'), int),
+    }
+
+
+class MediaProbe:
+    """Probes audio files once and keeps the results in the library
+
+    Results are keyed by path and valid while the file's mtime and size
+    match, so a file is only ever probed again after it changed. Each
+    ffprobe is its own process; a thread pool keeps ``workers`` of them
+    running at once. ``on_probed(results)`` gets each finished batch as a
+    path -> probe dict, through ``dispatch``.
+    """
+
+    def __init__(self, library, workers: int = 4, ffprobe: str = "ffprobe",
+                 on_probed: Optional[Callable[[Dict[str, Dict]], None]] = None,
+                 dispatch: Optional[Callable] = None):
+        self.library = library
+        self.ffprobe = ffprobe
+        self.on_probed = on_probed
+        self.dispatch = dispatch or (lambda fn, *args: fn(*args))
+        self.probed = 0
+        self._in_flight = set()
+        self._failed = set()  # not probed again this session
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="probe")
+        self._batches = ThreadPoolExecutor(max_workers=1, thread_name_prefix="probe-batch")
+
+    def cached(self, paths: Iterable[str]) -> Dict[str, Dict]:
+        """Stored results that still match the files on disk"""
+        results = {}
+        for path, probe in self.library.get_probes(paths).items():
+            if file_state(path) == (probe['mtime'], probe['size']):
+                results[path] = probe
+        return results
+
+    def request(self, paths: Iterable[str]):
+        """Probe the paths that have no valid result yet, in the background"""
+        with self._lock:
+            paths = [path for path in set(paths)
+                     if path and path not in self._in_flight and path not in self._failed]
+            self._in_flight.update(paths)
+        if paths:
+            self._batches.submit(self._run, paths)
+
+    def record_info(self, path: str, info: Dict):
+        probe = probe_from_info(path, info)
+        if probe is not None:
+            self.library.store_probes([probe])
+
+    def shutdown(self):
+        self._batches.shutdown(wait=False)
+        self._pool.shutdown(wait=False)
+
+    def _run(self, paths: List[str]):
+        try:
+            cached = self.cached(paths)
+            missing = [path for path in paths if path not in cached]
+            if cached:
+                # Tracks added after the probe still need its duration
+                self.library.store_probes(list(cached.values()))
+                self._report(cached)
+            for start in range(0, len(missing), BATCH_SIZE):
+                batch = missing[start:start + BATCH_SIZE]
+                results = list(self._pool.map(self._probe, batch))
+                probes = [probe for probe in results if probe is not None]
+                with self._lock:
+                    self._failed.update(path for path, probe in zip(batch, results) if probe is None)
+                if probes:
+                    self.library.store_probes(probes)
+                    self.probed += len(probes)
+                    self._report({probe['path']: probe for probe in probes})
+        except Exception as e:
+            print(f"Error probing media: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.difference_update(paths)
+
+    def _probe(self, path: str) -> Optional[Dict]:
+        return probe_file(path, self.ffprobe)
+
+    def _report(self, results: Dict[str, Dict]):
+        if self.on_probed:
+            self.dispatch(self.on_probed, results)
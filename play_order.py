@@ -0,0 +1,158 @@
+import random
+from array import array
+from typing import Callable, Dict, List, Optional
+
+
+class PlayOrder:
+    """Order in which playlist indices are played
+
+    The playlist itself is never reordered. In shuffle mode the order is a
+    Fisher-Yates permutation drawn one step at a time: indices not yet
+    drawn live in a virtual array whose entries default to their own
+    position, and only swapped positions are stored. Enabling shuffle,
+    drawing the next track and stepping back through the history are all
+    O(1), and tracks appended to the playlist simply join the undrawn pool.
+    """
+
+    def __init__(self, length: Callable[[], int], rng: Optional[random.Random] = None):
+        self.length = length
+        self.rng = rng or random.Random()
+        self.shuffle = False
+        self.current: Optional[int] = None
+        self._reset_shuffle()
+
+    def reset(self):
+        """Forget the position and shuffle state, e.g. after switching playlists"""
+        self.current = None
+        self._reset_shuffle()
+
+    def set_shuffle(self, enabled: bool):
+        self.shuffle = enabled
+        self._reset_shuffle()
+        if enabled and self.current is not None:
+            self._draw_specific(self.current)
+            self._history.append(self.current)
+            self._cursor = 0
+
+    def jump(self, index: int) -> int:
+        """Play a specific index next, e.g. after a double click"""
+        self.current = index
+        if self.shuffle:
+            self._draw_specific(index)
+            # Jumping away discards the "forward" part of the history
+            del self._history[self._cursor + 1:]
+            self._history.append(index)
+            self._cursor = len(self._history) - 1
+        return index
+
+    def next(self, repeat: bool = False) -> Optional[int]:
+        """Advance to the next index, or None at the end of the playlist"""
+        length = self.length()
+        if not length:
+            return None
+
+        if not self.shuffle:
+            if self.current is None:
+                self.current = 0
+            elif self.current + 1 < length:
+                self.current += 1
+            elif repeat:
+                self.current = 0
+            else:
+                return None
+            return self.current
+
+        if self._cursor + 1 < len(self._history):
+            self._cursor += 1
+        else:
+            if self._drawn >= length:
+                if not repeat:
+                    return None
+                # Start a fresh permutation for the next round
+                last = self.current
+                self._reset_shuffle()
+                self._draw_specific(last)
+                self._history.append(last)
+                self._cursor = 0
+            self._history.append(self._draw())
+            self._cursor += 1
+        self.current = self._history[self._cursor]
+        return self.current
+
+    def previous(self, repeat: bool = False) -> Optional[int]:
+        """Step back, through the shuffle history when shuffling"""
+        length = self.length()
+        if not length or self.current is None:
+            return None
+
+        if self.shuffle:
+            if self._cursor == 0:
+                return None
+            self._cursor -= 1
+            self.current = self._history[self._cursor]
+            return self.current
+
+        if self.current > 0:
+            self.current -= 1
+        elif repeat:
+            self.current = length - 1
+        else:
+            return None
+        return self.current
+
+    def upcoming(self, count: int, repeat: bool = False) -> List[int]:
+        """The next count indices without moving, drawing ahead when shuffling"""
+        length = self.length()
+        if not self.shuffle:
+            start = -1 if self.current is None else self.current
+            result = []
+            for step in range(1, count + 1):
+                following = start + step
+                if following >= length:
+                    if not repeat:
+                        break
+                    following %= length
+                result.append(following)
+            return result
+
+        # Draws made here become the future part of the history
+        while len(self._history) - 1 - self._cursor < count and self._drawn < length:
+            self._history.append(self._draw())
+        return list(self._history[self._cursor + 1:self._cursor + 1 + count])
+
+    # Lazy Fisher-Yates over positions [drawn, length)
+
+    def _reset_shuffle(self):
+        self._swaps: Dict[int, int] = {}  # position -> index, only where they differ
+        self._where: Dict[int, int] = {}  # index -> position, the inverse
+        self._drawn = 0
+        self._history = array('l')
+        self._cursor = -1
+
+    def _value_at(self, position: int) -> int:
+        return self._swaps.get(position, position)
+
+    def _place(self, position: int, index: int):
+        if position == index:
+            self._swaps.pop(position, None)
+            self._where.pop(index, None)
+        else:
+            self._swaps[position] = index
+            self._where[index] = position
+
+    def _swap(self, a: int, b: int):
+        value_a, value_b = self._value_at(a), self._value_at(b)
+        self._place(a, value_b)
+        self._place(b, value_a)
+
+    def _draw(self) -> int:
+        position = self.rng.randrange(self._drawn, self.length())
+        self._swap(self._drawn, position)
+        self._drawn += 1
+        return self._value_at(self._drawn - 1)
+
+    def _draw_specific(self, index: int):
+        position = self._where.get(index, index)
+        if position >= self._drawn:
+            self._swap(self._drawn, position)
+            self._drawn += 1
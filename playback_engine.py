@@ -0,0 +1,553 @@
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import instrumentation
+from audio_output import mixer
+from play_order import PlayOrder
+from track import Track
+
+
+class PlaybackState:
+    STOPPED = "stopped"
+    LOADING = "loading"
+    PLAYING = "playing"
+    PAUSED = "paused"
+
+
+class MusicBackend:
+    """Plays downloaded files through pygame.mixer.music
+
+    The next file can be queued with pygame.mixer.music.queue(); the mixer
+    then switches to it inside its audio callback, without a gap. There is
+    no event for that without a display, so took_over() spots the switch
+    by get_pos() starting again from zero, or by the position running past
+    the length of the track that was playing.
+
+    get_pos() only counts milliseconds played since play(), whatever the
+    start position, so the position is kept as the second playback last
+    (re)started from plus the get_pos() progress since then. MP3 files with
+    a seek index are seeked by reopening them at a frame offset; anything
+    else goes through the mixer's own seek.
+    """
+
+    def __init__(self, seek_indexes=None):
+        self.seek_indexes = seek_indexes
+        self._queued = False
+        self._last_pos = 0
+        self._start = 0.0  # seconds into the current track where playback (re)started
+        self._anchor = 0  # get_pos() value at that moment
+        self._source = None  # file object the mixer reads after an indexed seek
+
+    def play(self, track: Track, on_first_audio: Callable, on_finished: Callable) -> Optional[Dict]:
+        started = time.perf_counter()
+        self._queued = False
+        with instrumentation.span('mixer.load', path=track.path):
+            mixer().music.load(track.path)
+        self._close_source()
+        with instrumentation.span('mixer.play'):
+            mixer().music.play()
+        self._last_pos = 0
+        self._start = 0.0
+        self._anchor = 0
+        on_first_audio(time.perf_counter() - started)
+        return None
+
+    def seek(self, track: Track, seconds: float, paused: bool = False) -> float:
+        """Continue track from seconds; returns the time playback actually resumed at"""
+        index = self.seek_indexes.get(track.path) if self.seek_indexes is not None else None
+        with instrumentation.span('mixer.seek', seconds=seconds, indexed=index is not None):
+            if index is not None:
+                # Reads only the frames since the nearest index entry
+                seconds, source = index.open_at(track.path, seconds)
+                mixer().music.load(source, "mp3")
+                self._close_source()
+                self._source = source
+                mixer().music.play()
+            else:
+                mixer().music.play(start=seconds)
+            if paused:
+                mixer().music.pause()
+        # Reloading dropped the queued track; the engine queues it again
+        self._queued = False
+        self._start = seconds
+        self._anchor = self._last_pos = mixer().music.get_pos()
+        return seconds
+
+    def queue(self, track: Track) -> bool:
+        """Start track as soon as the current one ends; False if the mixer refused it"""
+        import pygame
+
+        try:
+            mixer().music.queue(track.path)
+        except pygame.error:
+            return False
+        self._queued = True
+        return True
+
+    def took_over(self, length: Optional[float] = None) -> bool:
+        """True once, when the queued track has started playing"""
+        pos = mixer().music.get_pos()
+        restarted = pos < self._last_pos
+        overran = length is not None and self._start + (pos - self._anchor) / 1000 > length + 0.5
+        self._last_pos = pos
+        if not self._queued or not (restarted or overran):
+            return False
+        self._queued = False
+        self._anchor = 0 if restarted else self._anchor + int((length - self._start) * 1000)
+        self._start = 0.0
+        return True
+
+    def pause(self):
+        mixer().music.pause()
+
+    def resume(self):
+        mixer().music.unpause()
+
+    def stop(self):
+        self._queued = False
+        mixer().music.stop()
+        # Drop a queued track so it can't start on the next play()
+        mixer().music.unload()
+        self._close_source()
+
+    def is_busy(self) -> bool:
+        return mixer().music.get_busy()
+
+    def _close_source(self):
+        """Close the file of an earlier seek once the mixer has let go of it"""
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+
+    def position(self) -> float:
+        return max(self._start + (mixer().music.get_pos() - self._anchor) / 1000, 0.0)
+
+    @property
+    def needs_polling(self) -> bool:
+        # pygame only posts its end event with a display, so poll get_busy()
+        return True
+
+
+class StreamBackend:
+    """Plays not yet downloaded tracks through a StreamPlayer"""
+
+    def __init__(self, stream_player):
+        self.stream_player = stream_player
+
+    def resolve(self, track: Track) -> Dict:
+        """Slow network lookup, run off the engine thread; the result goes to play()"""
+        return self.stream_player.resolve(track.url)
+
+    def play(self, track: Track, on_first_audio: Callable, on_finished: Callable, info: Dict,
+             requested_at: Optional[float] = None) -> Optional[Dict]:
+        # The extracted info goes out with the 'playing' event
+        return self.stream_player.start(info, on_first_audio=on_first_audio, on_finished=on_finished,
+                                        requested_at=requested_at)
+
+    def pause(self):
+        self.stream_player.pause()
+
+    def resume(self):
+        self.stream_player.resume()
+
+    def stop(self):
+        self.stream_player.stop()
+
+    def is_busy(self) -> bool:
+        return self.stream_player.is_active()
+
+    def position(self) -> float:
+        return self.stream_player.position
+
+    @property
+    def needs_polling(self) -> bool:
+        # StreamPlayer reports the end itself through on_finished
+        return False
+
+
+class PlaybackEngine:
+    """Single-threaded playback state machine driven by a command queue
+
+    All mixer calls happen on the engine thread. Every track start gets a
+    new generation number, and end-of-track notices from an older
+    generation are dropped, so a track end advances the playlist exactly
+    once; a stream URL resolved on a worker thread comes back the same way
+    and is dropped if playback moved on meanwhile. While stopped or paused
+    the thread blocks on the queue and does not wake up at all.
+
+    ``notify(event, data)`` is called from the engine thread with one of
+    'loading', 'playing', 'first_audio', 'paused', 'stopped', 'seeked',
+    'missing', 'upcoming', 'transition' or 'error'.
+
+    After each start the next ``lookahead`` positions in play order go out
+    as 'upcoming' so they can be fetched ahead of time, and the following
+    file, if it is on disk, is queued in the mixer for a gapless switch.
+    'transition' reports the silence between two tracks in milliseconds.
+    """
+
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, get_track: Callable[[int], Optional[Track]], playlist_length: Callable[[], int],
+                 file_backend=None, stream_backend=None, notify: Optional[Callable] = None,
+                 lookahead: int = 2):
+        self.get_track = get_track
+        self.play_order = PlayOrder(playlist_length)
+        self.file_backend = file_backend or MusicBackend()
+        self.stream_backend = stream_backend
+        self.notify = notify or (lambda event, data: None)
+        self.state = PlaybackState.STOPPED
+        self.repeat = False
+        self.streaming_enabled = False
+        self.generation = 0
+        self.lookahead = lookahead
+        self.last_gap_ms: Optional[float] = None
+        self.gapless_transitions = 0
+        self.wakeups = 0
+        self.started_at = time.monotonic()
+        self._backend = None
+        self._queued: Optional[int] = None  # position queued in the file backend
+        # (track, position, on_first_audio, requested_at) waiting on a stream URL
+        self._resolving: Optional[Tuple] = None
+        self._playing_length: Optional[float] = None
+        self._last_busy_at: Optional[float] = None
+        self._ended_at: Optional[float] = None
+        # (seconds into the track, monotonic time taken if playing); see playback_position()
+        self._position_snapshot: Tuple[float, Optional[float]] = (0.0, None)
+        self._commands = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="PlaybackEngine", daemon=True)
+        self._thread.start()
+
+    # Commands, safe to call from any thread
+
+    def play(self, position: Optional[int] = None):
+        self._commands.put(('play', position))
+
+    def toggle(self):
+        self._commands.put(('toggle', None))
+
+    def pause(self):
+        self._commands.put(('pause', None))
+
+    def resume(self):
+        self._commands.put(('resume', None))
+
+    def stop(self):
+        self._commands.put(('stop', None))
+
+    def seek(self, seconds: float):
+        """Jump to a time in the current track, playing or paused"""
+        self._commands.put(('seek', seconds))
+
+    def next(self):
+        self._commands.put(('next', None))
+
+    def previous(self):
+        self._commands.put(('previous', None))
+
+    def set_shuffle(self, enabled: bool):
+        self._commands.put(('set_shuffle', enabled))
+
+    def reset_order(self):
+        """Forget position and shuffle history, e.g. after the playlist was replaced"""
+        self._commands.put(('reset_order', None))
+
+    def set_repeat(self, enabled: bool):
+        self._commands.put(('set_repeat', enabled))
+
+    def set_streaming(self, enabled: bool):
+        self._commands.put(('set_streaming', enabled))
+
+    def refresh_upcoming(self):
+        """Queue the next track again, e.g. once it finished downloading"""
+        self._commands.put(('refresh_upcoming', None))
+
+    def shutdown(self):
+        self._commands.put(('shutdown', None))
+        self._thread.join(timeout=2)
+
+    @property
+    def position(self) -> int:
+        """Playlist index of the current track"""
+        current = self.play_order.current
+        return 0 if current is None else current
+
+    def playback_position(self) -> float:
+        """Seconds into the current track; safe from any thread
+
+        Reading the mixer is for the engine thread only, so this goes on
+        from the position it last published, moved on by the time since
+        then while playing.
+        """
+        seconds, taken_at = self._position_snapshot
+        if taken_at is None:
+            return seconds
+        return seconds + time.monotonic() - taken_at
+
+    def stats(self) -> Dict:
+        """Thread and wakeup counters for checking the engine idles properly"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            'state': self.state,
+            'engine_alive': self._thread.is_alive(),
+            'process_threads': threading.active_count(),
+            'wakeups': self.wakeups,
+            'wakeups_per_second': self.wakeups / elapsed,
+            'last_gap_ms': self.last_gap_ms,
+            'gapless_transitions': self.gapless_transitions,
+        }
+
+    # Engine thread
+
+    def _run(self):
+        while True:
+            timeout = self.POLL_INTERVAL if self._polling() else None
+            try:
+                command, arg = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                command, arg = 'poll', None
+            self.wakeups += 1
+
+            if command == 'shutdown':
+                self._stop_backend()
+                return
+            try:
+                self._handle(command, arg)
+            except Exception as e:
+                self.state = PlaybackState.STOPPED
+                self.notify('error', {'message': str(e)})
+            self._publish_position()
+
+    def _publish_position(self):
+        backend = self._backend
+        try:
+            seconds = backend.position() if backend is not None else 0.0
+        except Exception:
+            seconds = 0.0  # mixer gone, e.g. during shutdown
+        playing = self.state == PlaybackState.PLAYING
+        self._position_snapshot = (seconds, time.monotonic() if playing else None)
+
+    def _polling(self) -> bool:
+        return (self.state == PlaybackState.PLAYING and self._backend is not None
+                and self._backend.needs_polling)
+
+    def _handle(self, command: str, arg):
+        if command == 'poll':
+            if not self._polling():
+                return
+            if self._backend.is_busy():
+                self._last_busy_at = time.monotonic()
+                if self._queued is not None and self._backend.took_over(self._playing_length):
+                    self._advance_queued()
+            else:
+                # The end happened somewhere since the last busy poll
+                self._ended_at = self._last_busy_at
+                self._advance(after_end=True)
+        elif command == 'ended':
+            if arg == self.generation and self.state == PlaybackState.PLAYING:
+                self._ended_at = time.monotonic()
+                self._advance(after_end=True)
+        elif command == 'resolved':
+            self._resolved(*arg)
+        elif command == 'play':
+            if arg is not None:
+                self.play_order.jump(arg)
+            self._start_current()
+        elif command == 'toggle':
+            if self.state == PlaybackState.PLAYING:
+                self._pause()
+            elif self.state == PlaybackState.PAUSED:
+                self._resume()
+            else:
+                self._start_current()
+        elif command == 'pause' and self.state == PlaybackState.PLAYING:
+            self._pause()
+        elif command == 'resume' and self.state == PlaybackState.PAUSED:
+            self._resume()
+        elif command == 'stop':
+            self._stop_backend()
+            self._set_stopped()
+        elif command == 'seek':
+            self._seek(arg)
+        elif command == 'next':
+            self._advance(after_end=False)
+        elif command == 'previous':
+            self._go_back()
+        elif command == 'set_shuffle':
+            self.play_order.set_shuffle(arg)
+            self._prepare_next()
+        elif command == 'reset_order':
+            self.play_order.reset()
+        elif command == 'set_repeat':
+            self.repeat = arg
+            self._prepare_next()
+        elif command == 'set_streaming':
+            self.streaming_enabled = arg
+        elif command == 'refresh_upcoming':
+            self._prepare_next(announce=False)
+
+    def _advance(self, after_end: bool):
+        position = self.play_order.next(self.repeat)
+        if position is not None:
+            self._start(position)
+        elif after_end or not self.play_order.length():
+            # End of playlist
+            self._stop_backend()
+            self._set_stopped()
+
+    def _advance_queued(self):
+        """The mixer already switched to the queued track; catch the state up"""
+        queued, self._queued = self._queued, None
+        position = self.play_order.next(self.repeat)
+        if position != queued:
+            # The order changed after queueing (playlist edited, shuffle toggled)
+            if position is None:
+                self._stop_backend()
+                self._set_stopped()
+            else:
+                self._start(position)
+            return
+        track = self.get_track(position)
+        self._playing_length = track.duration if track is not None else None
+        self.generation += 1
+        self.last_gap_ms = 0.0
+        self.gapless_transitions += 1
+        self.notify('transition', {'position': position, 'gap_ms': 0.0, 'gapless': True})
+        self.notify('playing', {'track': track, 'position': position, 'info': None})
+        self.notify('first_audio', {'track': track, 'position': position, 'seconds': 0.0})
+        self._prepare_next()
+
+    def _prepare_next(self, announce: bool = True):
+        """Announce the upcoming positions and queue the next one when possible"""
+        if self.state not in (PlaybackState.PLAYING, PlaybackState.PAUSED):
+            return
+        upcoming = self.play_order.upcoming(max(self.lookahead, 1), self.repeat)
+        if announce and self.lookahead and upcoming:
+            self.notify('upcoming', {'positions': upcoming[:self.lookahead]})
+        if self._backend is not self.file_backend or not upcoming or not hasattr(self._backend, 'queue'):
+            return
+        track = self.get_track(upcoming[0])
+        if track is not None and track.path is not None and os.path.exists(track.path):
+            if self._backend.queue(track):
+                self._queued = upcoming[0]
+
+    def _go_back(self):
+        position = self.play_order.previous(self.repeat)
+        if position is not None:
+            self._start(position)
+
+    def _start_current(self):
+        if self.play_order.current is None:
+            self._advance(after_end=False)
+        else:
+            self._start(self.play_order.current)
+
+    def _start(self, position: int):
+        track = self.get_track(position)
+        if track is None:
+            return
+        self._stop_backend()
+        self.generation += 1
+        generation = self.generation
+        ended_at, self._ended_at = self._ended_at, None
+
+        downloaded = track.path is not None and os.path.exists(track.path)
+        if downloaded:
+            backend = self.file_backend
+        elif track.url and self.streaming_enabled and self.stream_backend:
+            backend = self.stream_backend
+        else:
+            # Caller has to fetch the file and call play() again
+            self.state = PlaybackState.LOADING
+            self.notify('missing', {'track': track, 'position': position})
+            return
+
+        self.state = PlaybackState.LOADING
+        self.notify('loading', {'track': track, 'position': position})
+        self._backend = backend
+        self._playing_length = track.duration
+        # Load to first audio, ended from the backend's first audio callback
+        span = instrumentation.begin('play', title=track.title, position=position,
+                                     backend='file' if downloaded else 'stream')
+
+        def on_first_audio(seconds):
+            instrumentation.end(span, seconds=seconds)
+            if ended_at is not None:
+                self.last_gap_ms = (time.monotonic() - ended_at) * 1000
+                self.notify('transition', {'position': position, 'gap_ms': self.last_gap_ms, 'gapless': False})
+            self.notify('first_audio', {'track': track, 'position': position, 'seconds': seconds})
+
+        if hasattr(backend, 'resolve'):
+            # Resolving a stream takes a network round trip; keep the engine
+            # responsive meanwhile and pick the start up again in _resolved()
+            # Time to first audio counts from here, resolve round trip included
+            self._resolving = (track, position, on_first_audio, time.perf_counter())
+            threading.Thread(target=self._resolve, args=(backend, track, generation),
+                             name="StreamResolve", daemon=True).start()
+            return
+        self._begin(track, position, on_first_audio)
+
+    def _resolve(self, backend, track: Track, generation: int):
+        """Worker thread: resolve the stream and hand the result back to the engine"""
+        try:
+            result = backend.resolve(track)
+        except Exception as e:
+            result = e
+        self._commands.put(('resolved', (generation, result)))
+
+    def _resolved(self, generation: int, result):
+        if generation != self.generation or self._resolving is None or self.state != PlaybackState.LOADING:
+            return  # stopped or moved on to another track meanwhile
+        (track, position, on_first_audio, requested_at), self._resolving = self._resolving, None
+        if isinstance(result, Exception):
+            self._backend = None
+            raise result
+        self._begin(track, position, on_first_audio, info=result, requested_at=requested_at)
+
+    def _begin(self, track: Track, position: int, on_first_audio: Callable, **kwargs):
+        """Hand the track to the chosen backend and report it playing"""
+        generation = self.generation
+        info = self._backend.play(
+            track,
+            on_first_audio=on_first_audio,
+            on_finished=lambda: self._commands.put(('ended', generation)),
+            **kwargs
+        )
+        self.state = PlaybackState.PLAYING
+        self._last_busy_at = time.monotonic()
+        self.notify('playing', {'track': track, 'position': position, 'info': info})
+        self._prepare_next()
+
+    def _seek(self, seconds: float):
+        if self.state not in (PlaybackState.PLAYING, PlaybackState.PAUSED) or not hasattr(self._backend, 'seek'):
+            return  # nothing loaded, or a stream
+        if self._playing_length:
+            seconds = min(seconds, self._playing_length)
+        track = self.get_track(self.position)
+        seconds = self._backend.seek(track, max(seconds, 0.0), paused=self.state == PlaybackState.PAUSED)
+        self._queued = None
+        self.notify('seeked', {'track': track, 'position': self.position, 'seconds': seconds})
+        self._prepare_next(announce=False)
+
+    def _pause(self):
+        self._backend.pause()
+        self.state = PlaybackState.PAUSED
+        self.notify('paused', {'position': self.position})
+
+    def _resume(self):
+        self._backend.resume()
+        self.state = PlaybackState.PLAYING
+        self.notify('playing', {'track': self.get_track(self.position), 'position': self.position})
+
+    def _stop_backend(self):
+        self._queued = None
+        self._resolving = None
+        if self._backend is not None:
+            self._backend.stop()
+            self._backend = None
+
+    def _set_stopped(self):
+        self.state = PlaybackState.STOPPED
+        self.notify('stopped', {'position': self.position})
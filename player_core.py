@@ -0,0 +1,998 @@
+import json
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import audio_output
+import instrumentation
+from audio_formats import ffmpeg_available, needs_transcode, transcode_to_fallback, ydl_audio_options
+from batch_worker import ProcessPool
+from bulk_import import BulkImport, extract_entries, is_collection_url
+from download_cache import DownloadCache
+from download_manager import BandwidthBudget, DownloadManager, DownloadPriority, HostRateLimiter
+from fingerprint import FingerprintIndex
+from library import DEFAULT_PLAYLIST, Library
+from library_scanner import LibraryScanner, LibraryWatcher
+from loudness import LoudnessAnalyzer
+from media_probe import MediaProbe
+from playback_engine import MusicBackend, PlaybackEngine, PlaybackState, StreamBackend
+from prefetch import Prefetcher
+from search import SEARCH_PREFIXES, SearchService
+from seek_index import SeekIndexes
+from streaming import StreamPlayer
+from track import Track
+
+# Number of tracks downloaded in parallel
+DOWNLOAD_WORKERS = 3
+# Extra download workers that only take tracks about to play
+URGENT_DOWNLOAD_WORKERS = 1
+# Bytes per second shared by all downloads, split by priority; None for no limit
+DOWNLOAD_BANDWIDTH = None
+# Attempts at a dropped connection or fragment; the partial file is resumed
+DOWNLOAD_RETRIES = 10
+# Fragments of an HLS/DASH stream fetched at once
+FRAGMENT_DOWNLOADS = 4
+# Downloads of one imported playlist that may be queued or running at once
+BULK_IMPORT_CONCURRENCY = 3
+# Minimum seconds between two requests to the same host
+HOST_REQUEST_INTERVAL = 0.5
+# Disk budget for downloads/ before least recently used tracks are evicted
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Keep the source codec when the mixer can decode it instead of re-encoding to MP3
+NATIVE_CODEC_DOWNLOADS = True
+# ffprobe processes run at once to fill in missing durations
+PROBE_WORKERS = 4
+# Processes shared by loudness analysis and duplicate fingerprinting; None uses every core
+ANALYSIS_WORKERS = None
+# Default for adds that don't say: before downloading, decode the start of the stream and
+# reuse a library file holding the same audio. Costs a fetch of the first 30 s per add;
+# turn it off in the UI or per request through the control API.
+REUSE_DUPLICATE_FILES = True
+# Upcoming tracks (in play order) downloaded and warmed ahead of time
+PREFETCH_TRACKS = 2
+# SQLite file holding tracks and named playlists
+LIBRARY_PATH = "library.db"
+# Playlist holding every track found in the scanned music folders
+LOCAL_FILES_PLAYLIST = "Local Files"
+# Threads listing folders and reading tags, and seconds between change polls
+LIBRARY_SCAN_WORKERS = 8
+LIBRARY_POLL_SECONDS = 10
+# Candidates fetched per search, and how long a search result stays cached
+SEARCH_RESULTS = 10
+SEARCH_CACHE_SECONDS = 600
+
+
+def retry_delay(attempt: int) -> float:
+    """Seconds yt-dlp waits before retry number attempt: 1, 2, 4, ... 30"""
+    return min(2.0 ** attempt, 30.0)
+
+
+def track_summary(track: Optional[Track]) -> Optional[Dict]:
+    if track is None:
+        return None
+    return {
+        'id': track.id,
+        'title': track.title,
+        'duration': track.duration,
+        'source': track.source_label,
+        'url': track.url,
+        'path': track.path,
+        'pending': track.pending,
+    }
+
+
+class PlayerCore:
+    """Playlist, download and playback logic, independent of any UI
+
+    Worker threads hand their results back through post(); whoever owns
+    the core runs them on one thread, either with process_pending() from
+    a UI loop or with run() in headless mode, so core state only changes
+    on that thread. Other threads use call() to run a method there and
+    wait for the result.
+
+    Listeners added with add_listener() get ``callback(event, data)`` on
+    the core thread: the playback engine's events after the core has
+    handled them, plus 'status', 'ffmpeg', 'playlist_reset',
+    'track_added', 'tracks_updated', 'duration', 'search_results' and
+    'duplicate_report'.
+    """
+
+    def __init__(self, library_path: str = LIBRARY_PATH):
+        self.current_track = None
+        self.playlist = []
+        self.is_playing = False
+        self.current_position = 0
+        self.volume = 0.5  # 50% default volume
+        self.normalize_loudness = True
+        self.track_gain_db = 0.0  # Loudness correction of the playing track
+        self.shuffle_enabled = False
+        self.repeat_enabled = False
+        self.streaming_enabled = False
+        self.reuse_duplicates = REUSE_DUPLICATE_FILES
+        self.download_times = {}  # path -> seconds the download took, until first play
+        self.last_time_to_first_audio = None
+        self.last_gap_ms = None
+        self.last_gap_position = None
+        self.current_track_length = 0
+        self.last_status = None
+        self.ffmpeg_found: Optional[bool] = None  # probed once per session
+        self.last_duplicate_report: Optional[Dict] = None
+        self._ffmpeg_lock = threading.Lock()
+
+        # The mixer opens in warm_up(), or on first use if that comes earlier
+        audio_output.set_volume(self.volume)
+
+        self.library = Library(library_path)
+        self.playlist_name = DEFAULT_PLAYLIST
+        self.playlist_id = None
+
+        # Callbacks posted from worker threads, run on the core thread
+        self._callbacks = queue.Queue()
+        # Called from the posting thread after each post(), so a UI loop can wake up for it
+        self.on_post: Optional[Callable[[], None]] = None
+        self._listeners: List[Callable[[str, Dict], None]] = []
+        self.download_cache = DownloadCache(
+            "downloads",
+            max_bytes=CACHE_MAX_BYTES,
+            is_protected=self.is_current_track_path
+        )
+        self.rate_limiter = HostRateLimiter(HOST_REQUEST_INTERVAL)
+        self.bulk_imports = []
+        self.download_manager = DownloadManager(
+            self.download_track,
+            workers=DOWNLOAD_WORKERS,
+            dispatch=self.post,
+            urgent_workers=URGENT_DOWNLOAD_WORKERS,
+            bandwidth=BandwidthBudget(DOWNLOAD_BANDWIDTH)
+        )
+        self.media_probe = MediaProbe(
+            self.library,
+            workers=PROBE_WORKERS,
+            on_probed=self.on_media_probed,
+            dispatch=self.post
+        )
+        self.probe_queue = set()
+        self.analysis_pool = ProcessPool(ANALYSIS_WORKERS)
+        self.loudness = LoudnessAnalyzer(
+            self.library,
+            on_analyzed=self.on_loudness_analyzed,
+            dispatch=self.post,
+            pool=self.analysis_pool
+        )
+        self.fingerprints = FingerprintIndex(
+            self.library,
+            dispatch=self.post,
+            pool=self.analysis_pool
+        )
+        self.scanner = LibraryScanner(self.library, workers=LIBRARY_SCAN_WORKERS)
+        self.watcher = LibraryWatcher(
+            self.scanner,
+            interval=LIBRARY_POLL_SECONDS,
+            on_change=lambda stats: self.post(self.on_library_changed, stats)
+        )
+        self.search_service = SearchService(
+            results=SEARCH_RESULTS,
+            ttl=SEARCH_CACHE_SECONDS,
+            dispatch=self.post
+        )
+        self.seek_indexes = SeekIndexes(self.library)
+        self.stream_player = StreamPlayer(save_to=self.stream_cache_path, on_saved=self.on_stream_saved)
+        self.engine = PlaybackEngine(
+            get_track=self.get_track,
+            playlist_length=lambda: len(self.playlist),
+            file_backend=MusicBackend(self.seek_indexes),
+            stream_backend=StreamBackend(self.stream_player),
+            notify=lambda event, data: self.post(self.on_engine_event, event, data),
+            lookahead=PREFETCH_TRACKS
+        )
+        self.prefetcher = Prefetcher(
+            fetch=self.prefetch_track,
+            on_undecodable=lambda track: self.show_error(f"Can't play {track.title}: unsupported format")
+        )
+
+    def start(self):
+        """Open the last playlist, watch the music folders and warm up in the background"""
+        self.load_saved_playlist()
+        self.watcher.start(self.music_folders())
+        threading.Thread(target=self.warm_up, name="warm-up", daemon=True).start()
+
+    def warm_up(self):
+        """One-time setup kept off the startup path; runs on its own thread
+
+        Probes FFmpeg, opens the audio device and imports yt-dlp, so the
+        window comes up without waiting for them and the first add or
+        play doesn't either.
+        """
+        with instrumentation.span('startup.check_ffmpeg'):
+            found = self.check_ffmpeg()
+        self.post(self.on_ffmpeg_checked, found)
+        try:
+            with instrumentation.span('startup.mixer'):
+                audio_output.mixer()
+        except Exception as e:  # pygame.error without an audio device; retried on play
+            self.post(self.show_error, f"Audio output not available: {e}")
+        with instrumentation.span('startup.import_yt_dlp'):
+            import yt_dlp.extractor
+
+    # Core thread
+
+    def post(self, callback: Callable, *args):
+        """Schedule a callback from any thread to run on the core thread"""
+        self._callbacks.put((callback, args))
+        if self.on_post is not None:
+            self.on_post()
+
+    def call(self, callback: Callable, *args, timeout: float = 5.0):
+        """Run callback on the core thread and wait for its result"""
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(callback(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.post(run)
+        return future.result(timeout)
+
+    def process_pending(self) -> bool:
+        """Run the callbacks posted so far; for a UI loop that owns the core thread"""
+        processed = False
+        while True:
+            try:
+                callback, args = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            processed = True
+            self._invoke(callback, args)
+        return processed
+
+    def run(self):
+        """Run posted callbacks on this thread until stop()"""
+        while True:
+            callback, args = self._callbacks.get()
+            if callback is None:
+                return
+            self._invoke(callback, args)
+
+    def stop(self):
+        """Make run() return; safe from signal handlers and other threads"""
+        self._callbacks.put((None, ()))
+
+    def _invoke(self, callback: Callable, args: tuple):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Error in core callback: {e}")
+
+    def add_listener(self, callback: Callable[[str, Dict], None]):
+        self._listeners.append(callback)
+
+    def emit(self, event: str, data: Optional[Dict] = None):
+        data = data or {}
+        for listener in self._listeners:
+            try:
+                listener(event, data)
+            except Exception as e:
+                print(f"Error in {event} listener: {e}")
+
+    def show_error(self, message: str):
+        self.last_status = {'message': message, 'error': True}
+        self.emit('status', self.last_status)
+
+    def show_success(self, message: str):
+        self.last_status = {'message': message, 'error': False}
+        self.emit('status', self.last_status)
+
+    def status(self) -> Dict:
+        """Snapshot of the player; plain attribute reads, so any thread may call it"""
+        return {
+            'state': self.engine.state,
+            'track': track_summary(self.current_track),
+            'position': self.current_position if self.current_track is not None else None,
+            'elapsed': self.engine.playback_position() if self.is_playing else None,
+            'duration': self.current_track_length or None,
+            'playlist': self.playlist_name,
+            'tracks': len(self.playlist),
+            'volume': self.volume,
+            'shuffle': self.shuffle_enabled,
+            'repeat': self.repeat_enabled,
+            'streaming': self.streaming_enabled,
+            'normalize_loudness': self.normalize_loudness,
+            'reuse_duplicates': self.reuse_duplicates,
+            'downloads_pending': self.download_manager.pending_count(),
+            'last_status': self.last_status,
+        }
+
+    def playlist_page(self, offset: int = 0, limit: int = 100) -> List[Dict]:
+        end = min(max(offset, 0) + max(limit, 0), len(self.playlist))
+        return [dict(track_summary(self.playlist[index]), position=index)
+                for index in range(max(offset, 0), end)]
+
+    # Settings
+
+    def set_volume(self, value: float):
+        self.volume = max(0.0, min(float(value), 1.0))
+        self.apply_volume()
+
+    def apply_volume(self):
+        """Slider volume with the playing track's loudness correction"""
+        gain_db = self.track_gain_db if self.normalize_loudness else 0.0
+        # The mixer can't amplify, so boosts stop at full volume
+        volume = min(self.volume * 10 ** (gain_db / 20), 1.0)
+        audio_output.set_volume(volume)
+        self.stream_player.set_volume(volume)
+
+    def apply_track_gain(self, track: Track):
+        gain_db = self.loudness.gain_for(track.path)
+        if gain_db is None and track.path:
+            # Measured in the background; applied once the result is in
+            self.loudness.request([track.path], first=True)
+        self.track_gain_db = gain_db or 0.0
+        self.apply_volume()
+
+    def on_loudness_analyzed(self, results):
+        current = self.current_track
+        if current is not None and current.path in results:
+            self.track_gain_db = results[current.path]['gain_db']
+            self.apply_volume()
+
+    def set_normalize_loudness(self, enabled: bool):
+        self.normalize_loudness = enabled
+        self.apply_volume()
+
+    def analyze_library_loudness(self):
+        count = self.loudness.analyze_library()
+        if count:
+            self.show_success(f"Measuring loudness of {count} tracks in the background")
+        else:
+            self.show_success("Every track's loudness is already measured")
+
+    def find_duplicates(self):
+        """Fingerprint what isn't yet, then report groups of files holding the same audio"""
+        count = self.fingerprints.analyze_library()
+        self.fingerprints.report_when_ready(self.on_duplicate_report)
+        if count:
+            self.show_success(f"Fingerprinting {count} tracks to find duplicates")
+        else:
+            self.show_success("Looking for duplicates")
+
+    def on_duplicate_report(self, report: Optional[Dict]):
+        if report is None:
+            self.show_error("Could not check the library for duplicates")
+            return
+        self.last_duplicate_report = report
+        self.emit('duplicate_report', report)
+        if report['groups']:
+            self.show_success(
+                f"{len(report['groups'])} tracks have duplicates: removing {report['duplicate_files']} files "
+                f"would free {report['reclaimable_bytes'] / 1024 ** 2:.1f} MB"
+            )
+        else:
+            self.show_success("No duplicate tracks found")
+
+    def set_streaming(self, enabled: bool):
+        self.streaming_enabled = enabled
+        self.engine.set_streaming(enabled)
+        if enabled:
+            self.show_success("Streaming enabled: new tracks play while they download")
+        else:
+            self.show_success("Streaming disabled")
+
+    def set_reuse_duplicates(self, enabled: bool):
+        self.reuse_duplicates = enabled
+        if enabled:
+            self.show_success("New tracks already in the library will reuse the library file")
+        else:
+            self.show_success("New tracks are always downloaded")
+
+    def set_shuffle(self, enabled: bool):
+        self.shuffle_enabled = enabled
+        # The playlist keeps its order; only the engine's play order changes
+        self.engine.set_shuffle(enabled)
+        self.show_success("Shuffle enabled" if enabled else "Shuffle disabled")
+
+    def set_repeat(self, enabled: bool):
+        self.repeat_enabled = enabled
+        self.engine.set_repeat(enabled)
+        self.show_success("Repeat enabled" if enabled else "Repeat disabled")
+
+    def check_ffmpeg(self) -> bool:
+        """Check if FFmpeg is installed and accessible
+
+        Runs ffmpeg once per session, normally from warm_up(); callers that
+        come earlier wait for that probe instead of starting their own.
+        """
+        with self._ffmpeg_lock:
+            if self.ffmpeg_found is None:
+                self.ffmpeg_found = ffmpeg_available()
+            return self.ffmpeg_found
+
+    def on_ffmpeg_checked(self, found: bool):
+        if not found:
+            self.show_error("FFmpeg not found! See instructions below.")
+        self.emit('ffmpeg', {'found': found})
+
+    # Playlists
+
+    def save_playlist(self, name: str):
+        """Save the current playlist under a name; tracks themselves are stored as they are added"""
+        self.library.copy_playlist(self.playlist_id, name)
+        self.show_success(f"Playlist saved as '{name}'")
+
+    def load_saved_playlist(self):
+        # One-time migration of the old whole-file playlist.json
+        imported = self.library.import_playlist_json("playlist.json", DEFAULT_PLAYLIST)
+        if imported:
+            self.show_success(f"Imported {imported} tracks from playlist.json")
+        self.open_playlist(self.library.get_meta("active_playlist", DEFAULT_PLAYLIST))
+
+    def open_playlist(self, name: str):
+        """Make a named playlist the current one; track rows load lazily"""
+        self.engine.stop()
+        self.playlist_name = name
+        self.playlist_id = self.library.playlist_id(name)
+        self.library.set_meta("active_playlist", name)
+        if name == LOCAL_FILES_PLAYLIST:
+            self.library.remove_missing_files(self.playlist_id)
+        self.playlist = self.library.load_playlist(name)
+        self.current_track = None
+        self.current_position = 0
+        self.engine.reset_order()
+        self.emit('playlist_reset')
+
+    def load_playlist(self, name: str) -> bool:
+        if self.library.playlist_id(name, create=False) is None:
+            self.show_error(f"No playlist named '{name}'")
+            return False
+        self.open_playlist(name)
+        self.show_success(f"Loaded playlist '{name}' ({len(self.playlist)} tracks)")
+        return True
+
+    def clear_playlist(self):
+        self.library.clear_playlist(self.playlist_id)
+        self.engine.stop()
+        self.playlist = self.library.load_playlist(self.playlist_name)
+        self.current_track = None
+        self.current_position = 0
+        self.engine.reset_order()
+        self.emit('playlist_reset')
+        self.show_success("Playlist cleared")
+
+    def get_track(self, position: int):
+        if 0 <= position < len(self.playlist):
+            return self.playlist[position]
+        return None
+
+    def update_track(self, track: Track):
+        """Store a changed track and refresh every row showing it"""
+        old_id = self.library.update_track(track)
+        indices = self.playlist.update(track, old_id)
+        if indices:
+            self.emit('tracks_updated', {'indices': indices})
+
+    def _append_track(self, track: Track):
+        self.library.append_entry(self.playlist_id, track)
+        self.playlist.append(track)
+        self.emit('track_added', {'index': len(self.playlist) - 1})
+
+    # Local files
+
+    def music_folders(self) -> List[str]:
+        return json.loads(self.library.get_meta("music_folders", "[]"))
+
+    def add_music_folder(self, folder: str):
+        """Scan a folder into the Local Files playlist and keep watching it"""
+        folders = self.music_folders()
+        if folder not in folders:
+            folders.append(folder)
+            self.library.set_meta("music_folders", json.dumps(folders))
+        self.watcher.add_root(folder)
+        if self.engine.state == PlaybackState.STOPPED:
+            self.open_playlist(LOCAL_FILES_PLAYLIST)
+        self.show_success(f"Scanning {folder}...")
+
+    def on_library_changed(self, stats):
+        """Merge a scan into Local Files: new files go at the end, gone ones are dropped
+
+        Other entries, such as URLs added to the playlist by hand, stay put.
+        """
+        playlist_id = self.library.playlist_id(LOCAL_FILES_PLAYLIST)
+        showing = self.playlist_name == LOCAL_FILES_PLAYLIST
+        added = self.library.append_files(playlist_id, stats.added_paths)
+        if showing and added:
+            self.playlist.extend(added)
+            self.emit('playlist_reset')
+        self.show_success(
+            f"Local files: {stats.added} added, {stats.updated} updated, {stats.removed} removed "
+            f"({stats.files} files checked in {stats.seconds:.1f}s)"
+        )
+        if not stats.removed_paths:
+            return
+        if not showing:
+            self.library.remove_missing_files(playlist_id, stats.removed_paths)
+        elif self.engine.state == PlaybackState.STOPPED:
+            # Reloading drops them from the in-memory list too
+            self.open_playlist(LOCAL_FILES_PLAYLIST)
+        # While it plays, removing rows would shift the positions the engine
+        # plays by; open_playlist() drops them the next time it is opened
+
+    # Downloads
+
+    def is_current_track_path(self, path: str) -> bool:
+        return self.current_track is not None and self.current_track.path == path
+
+    def download_track(self, url: str, progress_hook=None, reuse_duplicates: bool = False) -> Dict:
+        """Download a track unless it is cached; runs on a download worker thread
+
+        With reuse_duplicates, a library file holding the same audio is
+        linked into the cache instead of downloading.
+        """
+        cached = self.download_cache.lookup(url)
+        if cached:
+            return cached
+
+        with instrumentation.span('download.rate_limit_wait', url=url):
+            self.rate_limiter.wait(url)
+        ydl_opts = {
+            **ydl_audio_options(native=NATIVE_CODEC_DOWNLOADS),
+            'outtmpl': 'downloads/%(extractor_key)s-%(id)s.%(ext)s',
+            # Playlists go through import_collection, never one big download
+            'noplaylist': True,
+            # A dropped transfer picks up from the .part file, here or on a later retry
+            'continuedl': True,
+            'retries': DOWNLOAD_RETRIES,
+            'fragment_retries': DOWNLOAD_RETRIES,
+            'retry_sleep_functions': {'http': retry_delay, 'fragment': retry_delay},
+            'concurrent_fragment_downloads': FRAGMENT_DOWNLOADS,
+            'quiet': True,
+            'no_warnings': True
+        }
+        if progress_hook:
+            ydl_opts['progress_hooks'] = [progress_hook]
+        if instrumentation.enabled():
+            phases = instrumentation.DownloadPhases(url)
+            ydl_opts['progress_hooks'] = ydl_opts.get('progress_hooks', []) + [phases.progress_hook]
+            ydl_opts['postprocessor_hooks'] = [phases.postprocessor_hook]
+
+        import yt_dlp
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with instrumentation.span('download.extract_info', url=url):
+                info = ydl.extract_info(url, download=False)
+            if reuse_duplicates:
+                with instrumentation.span('download.dedup', url=url):
+                    duplicate = self.find_duplicate(info)
+                if duplicate:
+                    return self.download_cache.link(url, info, duplicate)
+            with instrumentation.span('download.process_info', url=url):
+                info = ydl.process_ie_result(info, download=True)
+            download = info['requested_downloads'][0]
+            transcoded = NATIVE_CODEC_DOWNLOADS and needs_transcode(download)
+            if transcoded:
+                # Source codec isn't playable (e.g. AAC), fall back to re-encoding
+                with instrumentation.span('download.transcode', url=url, acodec=download.get('acodec')):
+                    download = transcode_to_fallback(ydl, download)
+
+        # Real file on disk after the FFmpeg postprocessors ran
+        with instrumentation.span('download.cache_store', url=url):
+            entry = self.download_cache.store(url, info, download['filepath'])
+        if not transcoded:
+            # The format info describes the file as is, no ffprobe needed
+            self.media_probe.record_info(entry['path'], {**download, 'duration': info.get('duration')})
+        self.index_download(url, entry)
+        return entry
+
+    def index_download(self, url: str, entry: Dict):
+        with instrumentation.span('download.seek_index', url=url):
+            self.seek_indexes.build(entry['path'])
+        self.fingerprints.request([entry['path']])
+
+    def stream_cache_path(self, info: Dict) -> Optional[str]:
+        """Where a stream of info is saved for the cache, or None to not keep it; engine thread"""
+        if not info.get('url') or (NATIVE_CODEC_DOWNLOADS and needs_transcode(info)):
+            return None  # split formats, or a codec the mixer can't play from a file
+        return os.path.join(self.download_cache.directory, f"{info['extractor_key']}-{info['id']}.{info['ext']}")
+
+    def on_stream_saved(self, info: Dict, path: str):
+        """A stream played to the end left its audio at path; runs on the stream reader thread"""
+        url = info.get('original_url') or info['webpage_url']
+        with instrumentation.span('download.cache_store', url=url):
+            entry = self.download_cache.store(url, info, path)
+        self.media_probe.record_info(entry['path'], info)
+        self.index_download(url, entry)
+        self.post(self.on_stream_cached, url, entry)
+
+    def on_stream_cached(self, url: str, entry: Dict):
+        track = self.current_track
+        if track is not None and track.url == url and track.path is None:
+            self.apply_download(track, entry)
+
+    def find_duplicate(self, info: Dict) -> Optional[str]:
+        """Library file holding the audio of an extracted, not yet downloaded track"""
+        if not info.get('url'):
+            return None  # split formats or a manifest FFmpeg can't open as one stream
+        try:
+            match = self.fingerprints.match_stream(info['url'], info.get('duration'),
+                                                   headers=info.get('http_headers'))
+        except Exception as e:
+            print(f"Error checking for duplicates: {e}")
+            return None
+        return match['path'] if match else None
+
+    def queue_url(self, url: str, title: str = None, play: bool = False,
+                  reuse_duplicates: Optional[bool] = None) -> bool:
+        """Download a track into the playlist, or stream it if streaming is on
+
+        With reuse_duplicates (the reuse_duplicates setting if None), a
+        library file holding the same audio is used instead of a download.
+        """
+        # Ends once the track is in the playlist, or right away for streams and collections
+        span = instrumentation.begin('add_to_playlist', url=url)
+        with instrumentation.span('add_to_playlist.check_ffmpeg'):
+            ffmpeg_found = self.check_ffmpeg()
+        if not ffmpeg_found:
+            self.show_error("FFmpeg not found! See instructions below.")
+            instrumentation.end(span, result='no_ffmpeg')
+            return False
+
+        if reuse_duplicates is None:
+            reuse_duplicates = self.reuse_duplicates
+        if is_collection_url(url):
+            self.import_collection(url, reuse_duplicates)
+            instrumentation.end(span, result='collection')
+            return True
+
+        if self.streaming_enabled:
+            self.add_streaming_track(url, title, play)
+            instrumentation.end(span, result='streaming')
+        else:
+            self.download_manager.submit(
+                url,
+                on_complete=lambda job: self.on_download_complete(job, play, span),
+                on_error=lambda job: self.on_download_error(job, span),
+                on_progress=self.on_download_progress,
+                priority=DownloadPriority.PLAY_NOW if play else DownloadPriority.USER,
+                options={'reuse_duplicates': reuse_duplicates}
+            )
+        self.show_success(f"Queued ({self.download_manager.pending_count()} pending): {title or url}")
+        return True
+
+    def import_collection(self, url: str, reuse_duplicates: bool = False):
+        """Add every entry of a playlist or channel as a pending track, then download them"""
+        self.show_success(f"Reading playlist: {url}")
+
+        def extract():
+            try:
+                self.rate_limiter.wait(url)
+                title, entries = extract_entries(url)
+            except Exception as e:
+                self.post(self.show_error, f"Could not read playlist: {e}")
+                return
+            self.post(self.on_collection_extracted, title, entries, reuse_duplicates)
+
+        threading.Thread(target=extract, name="bulk-import", daemon=True).start()
+
+    def on_collection_extracted(self, title: str, entries, reuse_duplicates: bool = False):
+        tracks = []
+        pending = []
+        for entry in entries:
+            cached = self.download_cache.lookup(entry.url)
+            if cached:
+                track = Track(cached['title'], path=cached['path'], url=entry.url,
+                              duration=cached['duration'], source_id=cached['key'])
+            else:
+                track = Track(entry.title, url=entry.url, duration=entry.duration,
+                              source_id=self.download_cache.offline_key(entry.url))
+                pending.append(track)
+            tracks.append(track)
+        if not tracks:
+            self.show_error(f"No tracks found in {title}")
+            return
+
+        self.library.append_entries(self.playlist_id, tracks)
+        self.playlist.extend(tracks)
+        self.emit('playlist_reset')
+
+        bulk = BulkImport(
+            self.download_manager,
+            pending,
+            title=title,
+            concurrency=BULK_IMPORT_CONCURRENCY,
+            on_complete=lambda track, job: self.on_import_download_complete(bulk, track, job),
+            on_finished=self.on_import_finished,
+            options={'reuse_duplicates': reuse_duplicates}
+        )
+        self.bulk_imports.append(bulk)
+        self.show_success(f"Added {len(tracks)} tracks from {title}, downloading {len(pending)}")
+        bulk.start()
+
+    def on_import_download_complete(self, bulk, track, job):
+        self.on_pending_download_complete(track, job)
+        if not bulk.finished:
+            self.show_success(f"Importing {bulk.title}: {bulk.done + bulk.failed}/{bulk.total}")
+
+    def on_import_finished(self, bulk):
+        self.bulk_imports.remove(bulk)
+        self.download_manager.forget_finished()
+        failed = f", {bulk.failed} failed (Retry Failed to try again)" if bulk.failed else ""
+        self.show_success(f"Imported {bulk.title}: {bulk.done} downloaded{failed}")
+
+    def search(self, query: str, source: str):
+        """Look the query up without downloading anything; results go out as 'search_results'"""
+        if source not in SEARCH_PREFIXES:
+            self.show_error("Select YouTube or SoundCloud to search")
+            return
+        self.show_success(f"Searching {source} for '{query}'...")
+        self.search_service.search(query, source, self.on_search_results, self.on_search_error)
+
+    def on_search_results(self, query: str, results):
+        self.emit('search_results', {'query': query, 'results': results})
+
+    def on_search_error(self, query: str, error: Exception):
+        self.show_error(f"Search failed for '{query}': {error}")
+
+    def on_download_progress(self, job):
+        if job.status == job.RUNNING:
+            self.show_success(f"Downloading {job.url}: {job.progress:.0%}")
+
+    def on_download_complete(self, job, play: bool = False, span=None):
+        info = job.result
+        if not info['cached'] and not info.get('linked'):
+            self.download_times[info['path']] = job.elapsed
+        track = Track(info['title'], path=info['path'], url=job.url, duration=info['duration'],
+                      source_id=info['key'])
+        self._append_track(track)
+        if play:
+            self.current_position = len(self.playlist) - 1
+            self.engine.play(self.current_position)
+        self.download_manager.forget_finished()
+        pending = self.download_manager.pending_count()
+        suffix = f" ({pending} still downloading)" if pending else ""
+        if info.get('linked'):
+            source, result = " from library", 'linked'
+        elif info['cached']:
+            source, result = " from cache", 'cached'
+        else:
+            source, result = "", 'downloaded'
+        self.show_success(f"Added{source}: {info['title']}{suffix}")
+        instrumentation.end(span, result=result)
+
+    def add_streaming_track(self, url: str, title: str = None, play: bool = False):
+        """Add a track right away and play it while it downloads into the cache
+
+        The stream itself fills the cache (see StreamPlayer), so a track only
+        gets a download job of its own when it isn't streamed right away.
+        """
+        track = Track(title or url, url=url)
+        self._append_track(track)
+        if play or not self.is_playing:
+            self.current_position = len(self.playlist) - 1
+            self.engine.play(self.current_position)
+        else:
+            self.download_manager.submit(
+                url,
+                on_complete=lambda job: self.on_pending_download_complete(track, job),
+                on_error=self.on_download_error
+            )
+
+    def on_pending_download_complete(self, track, job):
+        self.apply_download(track, job.result)
+
+    def apply_download(self, track: Track, entry: Dict):
+        # A stream keeps playing; later plays use the cached file
+        track.title = entry['title']
+        track.path = entry['path']
+        track.duration = entry['duration']
+        track.source_id = entry['key']
+        self.update_track(track)
+
+    def on_download_error(self, job, span=None):
+        instrumentation.end(span, result=job.status)
+        if job.status == job.CANCELLED:
+            self.show_error(f"Download cancelled: {job.url}")
+            return
+
+        error_message = str(job.error)
+        print(f"Error adding track: {error_message}")
+        if "ffmpeg" in error_message.lower():
+            self.show_error("FFmpeg error: Please install FFmpeg to continue")
+        else:
+            self.show_error(f"Download error: {error_message}")
+
+    def cancel_downloads(self):
+        for bulk in self.bulk_imports:
+            bulk.cancel()
+        cancelled = self.download_manager.cancel_all()
+        self.show_success(f"Cancelled {cancelled} download(s)")
+
+    def retry_downloads(self):
+        retried = self.download_manager.retry_failed()
+        if retried:
+            self.show_success(f"Retrying {len(retried)} download(s)")
+        else:
+            self.show_error("No failed downloads to retry")
+
+    def prefetch_track(self, track: Track):
+        self.download_manager.submit(
+            track.url,
+            on_complete=lambda job: self.on_prefetch_complete(track, job),
+            on_error=lambda job: self.on_prefetch_error(track, job),
+            priority=DownloadPriority.NEXT
+        )
+
+    def on_prefetch_complete(self, track: Track, job):
+        self.prefetcher.done(track)
+        self.on_pending_download_complete(track, job)
+        if self.is_waiting_for(track):
+            # Playback caught up with the prefetch (see fetch_missing_track)
+            self.engine.play(self.engine.position)
+        else:
+            # Now on disk, so it can be queued for a gapless start
+            self.engine.refresh_upcoming()
+
+    def on_prefetch_error(self, track: Track, job):
+        self.prefetcher.done(track)
+        if self.is_waiting_for(track):
+            self.on_download_error(job)
+
+    def is_waiting_for(self, track: Track) -> bool:
+        """Whether the engine is loading track and waits for its download"""
+        if self.engine.state != PlaybackState.LOADING:
+            return False
+        # Playlists hand out a fresh Track per lookup, so compare what identifies it
+        current = self.get_track(self.engine.position)
+        if current is None:
+            return False
+        if current.id is not None and track.id is not None:
+            return current.id == track.id
+        return current.url is not None and current.url == track.url
+
+    def fetch_missing_track(self, track, position: int):
+        """Download a track evicted from the cache, then play it"""
+        if not track.url:
+            self.show_error(f"File not found: {track.path}")
+            return
+        if self.prefetcher.is_fetching(track):
+            # Its completion starts playback; it only has to stop waiting its turn
+            self.download_manager.prioritize(track.url, DownloadPriority.PLAY_NOW)
+            self.show_success(f"Downloading: {track.title}")
+            return
+        self.show_success(f"Re-downloading: {track.title}")
+        self.download_manager.submit(
+            track.url,
+            on_complete=lambda job: self.on_redownload_complete(track, position, job),
+            on_error=self.on_download_error,
+            priority=DownloadPriority.PLAY_NOW
+        )
+
+    def on_redownload_complete(self, track, position: int, job):
+        track.path = job.result['path']
+        self.update_track(track)
+        if self.engine.state == PlaybackState.LOADING and self.engine.position == position:
+            self.engine.play(position)
+
+    # Playback
+
+    def on_engine_event(self, event: str, data: Dict):
+        """Track engine state changes, then pass them on to the listeners"""
+        if event == 'loading':
+            self.current_track = data['track']
+            self.current_position = data['position']
+            self.show_success(f"Loading: {data['track'].title}")
+        elif event == 'playing':
+            track = data['track']
+            info = data.get('info')
+            if info and track.pending:
+                # Streaming resolved the title and length before the download did
+                track.title = info.get('title', track.title)
+                track.duration = info.get('duration')
+                self.playlist.update(track)
+            self.current_track = track
+            self.current_position = data['position']
+            self.current_track_length = track.duration or 0
+            self.apply_track_gain(track)
+            if not track.duration and track.path:
+                self.queue_probe(track.path)
+            # Local files and older downloads are indexed the first time they play
+            self.seek_indexes.request([track.path])
+            self.is_playing = True
+        elif event == 'first_audio':
+            track = data['track']
+            # Download-then-play: the first play also waited for the download
+            self.last_time_to_first_audio = data['seconds'] + self.download_times.pop(track.path, 0)
+            gap = ""
+            if self.last_gap_position == data['position']:
+                gap = f", {self.last_gap_ms:.0f} ms gap"
+            self.show_success(
+                f"Now playing: {track.title} "
+                f"(first audio after {self.last_time_to_first_audio:.2f}s{gap})"
+            )
+        elif event == 'transition':
+            self.last_gap_ms = data['gap_ms']
+            self.last_gap_position = data['position']
+        elif event == 'upcoming':
+            upcoming = [self.get_track(position) for position in data['positions']]
+            self.prefetcher.prefetch(upcoming)
+            self.loudness.request(track.path for track in upcoming if track is not None and track.path)
+        elif event in ('paused', 'stopped'):
+            self.is_playing = False
+        elif event == 'missing':
+            self.fetch_missing_track(data['track'], data['position'])
+        elif event == 'error':
+            self.is_playing = False
+            self.show_error(f"Error playing track: {data['message']}")
+        self.emit(event, data)
+
+    def play(self, position: Optional[int] = None):
+        """Play a playlist position, or resume / start the current track"""
+        if not self.playlist:
+            return
+        if position is not None:
+            self.current_position = position
+            self.engine.play(position)
+        elif self.engine.state == PlaybackState.PAUSED:
+            self.engine.resume()
+        elif self.engine.state == PlaybackState.STOPPED:
+            self.engine.play(self.current_position)
+
+    def pause(self):
+        self.engine.pause()
+
+    def seek(self, seconds: float):
+        """Jump to a time in the current track; the engine reports it as 'seeked'"""
+        if self.current_track is not None:
+            self.engine.seek(max(float(seconds), 0.0))
+
+    def toggle_play(self):
+        if self.playlist:
+            self.engine.toggle()
+
+    def stop(self):
+        self.engine.stop()
+
+    def next_track(self):
+        """Play next track considering shuffle and repeat modes"""
+        self.engine.next()
+
+    def previous_track(self):
+        """Play previous track considering shuffle and repeat modes"""
+        self.engine.previous()
+
+    # Durations
+
+    def queue_probe(self, path: str):
+        """Probe a file for its duration, batched with the other paths asked for now"""
+        if not self.probe_queue:
+            self.post(self.flush_probe_queue)
+        self.probe_queue.add(path)
+
+    def flush_probe_queue(self):
+        paths, self.probe_queue = self.probe_queue, set()
+        self.media_probe.request(paths)
+
+    def on_media_probed(self, results):
+        current = self.current_track
+        if current is not None and current.path in results and not self.current_track_length:
+            self.current_track_length = results[current.path].get('duration') or 0
+            self.emit('duration', {'track': current, 'duration': self.current_track_length})
+        # The library already has the durations; refresh the rows showing them
+        tracks = self.library.find_by_paths(path for path, probe in results.items() if probe.get('duration'))
+        indices = self.playlist.update_many({track.id: track for track in tracks})
+        if indices:
+            self.emit('tracks_updated', {'indices': indices})
+
+    def shutdown(self):
+        self.watcher.stop()
+        self.download_manager.shutdown()
+        self.engine.shutdown()
+        self.prefetcher.shutdown()
+        self.media_probe.shutdown()
+        self.seek_indexes.shutdown()
+        self.loudness.shutdown()
+        self.fingerprints.shutdown()
+        self.analysis_pool.shutdown()
+        self.download_cache.flush()
+        self.library.close()
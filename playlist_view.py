@@ -0,0 +1,216 @@
+from tkinter import ttk
+from typing import Callable, List, Optional
+
+from track import Track
+
+# Above this many tracks only the visible rows exist in the Treeview
+VIRTUAL_THRESHOLD = 2000
+
+
+class PlaylistView:
+    """Keeps the playlist Treeview in sync through incremental updates
+
+    Callers report what changed (insert, remove, move, update, current row)
+    instead of rebuilding the tree. Playlists longer than VIRTUAL_THRESHOLD
+    are virtualized: the tree only holds a pool of rows for the visible
+    window, and a separate scrollbar moves that window over the playlist.
+    """
+
+    def __init__(self, tree, scrollbar, get_track: Callable[[int], Track], length: Callable[[], int],
+                 row_values: Callable[[Track], tuple]):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.get_track = get_track
+        self.length = length
+        self.row_values = row_values
+        self.current: Optional[int] = None
+        self.virtual = False
+        self.offset = 0
+        self.window_rows = 25
+        self._items: List[str] = []  # full mode: one item per playlist entry
+        self._pool: List[str] = []  # virtual mode: items for the visible window
+        self._pool_rows: List[Optional[tuple]] = []  # what each pooled item currently shows
+
+        self.tree.tag_configure("current", background="#2f6f3f", foreground="white")
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self._on_wheel_units(-3))
+        self.tree.bind("<Button-5>", lambda e: self._on_wheel_units(3))
+        self._use_native_scrolling()
+
+    def reset(self):
+        """Rebuild the tree from scratch, e.g. after loading or clearing"""
+        self.tree.delete(*self.tree.get_children())
+        self._items = []
+        self._pool = []
+        self._pool_rows = []
+        length = self.length()
+        if self.current is not None and self.current >= length:
+            self.current = None
+        self.virtual = length > VIRTUAL_THRESHOLD
+
+        if self.virtual:
+            self.scrollbar.configure(command=self._on_scroll)
+            self.tree.configure(yscrollcommand="")
+            self.offset = min(self.offset, self._max_offset())
+            self._render()
+        else:
+            self._use_native_scrolling()
+            for index in range(length):
+                self._items.append(self.tree.insert("", "end", values=self.row_values(self.get_track(index)),
+                                                    tags=self._tags(index)))
+
+    def insert(self, index: int):
+        """A track was inserted at index"""
+        if self.current is not None and index <= self.current:
+            self.current += 1
+        if self.virtual != (self.length() > VIRTUAL_THRESHOLD):
+            self.reset()
+        elif self.virtual:
+            if index < self.offset:
+                # Keep the same rows in view
+                self.offset += 1
+            elif index < self.offset + self.window_rows:
+                self._render()
+            self._update_scrollbar()
+        else:
+            item = self.tree.insert("", index, values=self.row_values(self.get_track(index)),
+                                    tags=self._tags(index))
+            self._items.insert(index, item)
+
+    def remove(self, index: int):
+        """The track at index was removed"""
+        if self.current == index:
+            self.current = None
+        elif self.current is not None and index < self.current:
+            self.current -= 1
+        if self.virtual != (self.length() > VIRTUAL_THRESHOLD):
+            self.reset()
+        elif self.virtual:
+            if index < self.offset:
+                self.offset -= 1
+            self.offset = min(self.offset, self._max_offset())
+            self._render()
+            self._update_scrollbar()
+        else:
+            self.tree.delete(self._items.pop(index))
+
+    def move(self, old_index: int, new_index: int):
+        """The track at old_index now lives at new_index"""
+        if self.current == old_index:
+            self.current = new_index
+        elif self.current is not None:
+            if old_index < self.current <= new_index:
+                self.current -= 1
+            elif new_index <= self.current < old_index:
+                self.current += 1
+        if self.virtual:
+            low, high = min(old_index, new_index), max(old_index, new_index)
+            if low < self.offset + self.window_rows and high >= self.offset:
+                self._render()
+        else:
+            item = self._items.pop(old_index)
+            self._items.insert(new_index, item)
+            self.tree.move(item, "", new_index)
+
+    def update(self, index: int):
+        """The track at index changed (title, duration, ...)"""
+        if self.virtual:
+            if self.offset <= index < self.offset + self.window_rows:
+                self._render()
+        elif 0 <= index < len(self._items):
+            self.tree.item(self._items[index], values=self.row_values(self.get_track(index)))
+
+    def set_current(self, index: Optional[int]):
+        """Highlight the row of the track that is playing"""
+        previous, self.current = self.current, index
+        if self.virtual:
+            self._render()
+            return
+        for row in (previous, index):
+            if row is not None and row < len(self._items):
+                self.tree.item(self._items[row], tags=self._tags(row))
+
+    def index_of(self, item: str) -> int:
+        """Playlist index shown by a tree item"""
+        if self.virtual:
+            return self.offset + self._pool.index(item)
+        return self._items.index(item)
+
+    def see(self, index: int):
+        """Scroll so that index is visible"""
+        if self.virtual:
+            if not self.offset <= index < self.offset + self.window_rows:
+                self._scroll_to(index - self.window_rows // 2)
+        elif 0 <= index < len(self._items):
+            self.tree.see(self._items[index])
+
+    def _tags(self, index: int) -> tuple:
+        return ("current",) if index == self.current else ()
+
+    def _use_native_scrolling(self):
+        self.scrollbar.configure(command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+
+    def _max_offset(self) -> int:
+        return max(self.length() - self.window_rows, 0)
+
+    def _render(self):
+        """Point the pooled items at the rows of the current window"""
+        length = self.length()
+        while len(self._pool) < self.window_rows:
+            self._pool.append(self.tree.insert("", "end", values=()))
+            self._pool_rows.append(None)
+        while len(self._pool) > self.window_rows:
+            self.tree.delete(self._pool.pop())
+            self._pool_rows.pop()
+
+        for slot, item in enumerate(self._pool):
+            index = self.offset + slot
+            if index < length:
+                row = (self.row_values(self.get_track(index)), self._tags(index))
+            else:
+                row = ((), ())
+            # Only touch the widget for rows whose content changed
+            if row != self._pool_rows[slot]:
+                self.tree.item(item, values=row[0], tags=row[1])
+                self._pool_rows[slot] = row
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        length = self.length()
+        if not length:
+            self.scrollbar.set(0, 1)
+            return
+        self.scrollbar.set(self.offset / length, min((self.offset + self.window_rows) / length, 1.0))
+
+    def _scroll_to(self, offset: int):
+        offset = max(0, min(int(offset), self._max_offset()))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(float(amount) * self.length())
+        elif action == "scroll":
+            step = self.window_rows if unit == "pages" else 1
+            self._scroll_to(self.offset + int(amount) * step)
+
+    def _on_wheel_units(self, units: int):
+        if self.virtual:
+            self._scroll_to(self.offset + units)
+            return "break"
+        return None
+
+    def _on_mousewheel(self, event):
+        return self._on_wheel_units(-3 if event.delta > 0 else 3)
+
+    def _on_configure(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        rows = max(event.height // row_height - 1, 1)  # minus the heading row
+        if rows != self.window_rows:
+            self.window_rows = rows
+            if self.virtual:
+                self.offset = min(self.offset, self._max_offset())
+                self._render()
@@ -0,0 +1,81 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, Set
+
+from audio_formats import file_is_decodable
+from track import Track
+
+# Read size used to pull an upcoming file into the OS page cache
+WARM_CHUNK = 1024 * 1024
+
+
+class Prefetcher:
+    """Gets the next tracks in play order ready before they are needed
+
+    Tracks that are only known by URL are handed to ``fetch(track)`` (which
+    downloads them and calls done() afterwards); tracks already on disk are
+    read once on a background thread so the mixer's load doesn't hit a cold
+    disk, and files the mixer can't decode are reported through
+    ``on_undecodable(track)`` instead of failing at play time.
+    """
+
+    # Paths remembered as warm before the set is cleared
+    MAX_WARM = 1000
+
+    def __init__(self, fetch: Callable[[Track], None],
+                 on_undecodable: Optional[Callable[[Track], None]] = None):
+        self.fetch = fetch
+        self.on_undecodable = on_undecodable or (lambda track: None)
+        self.fetched = 0
+        self.warmed = 0
+        self._in_flight: Set[str] = set()
+        self._warm: Set[str] = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+    def prefetch(self, tracks: Iterable[Optional[Track]]):
+        for track in tracks:
+            if track is None:
+                continue
+            if track.path is not None and os.path.exists(track.path):
+                if not file_is_decodable(track.path):
+                    self.on_undecodable(track)
+                    continue
+                with self._lock:
+                    if track.path in self._warm:
+                        continue
+                    if len(self._warm) >= self.MAX_WARM:
+                        # Long ago warmed files may have left the page cache anyway
+                        self._warm.clear()
+                    self._warm.add(track.path)
+                self._pool.submit(self._warm_file, track.path)
+            elif track.url:
+                with self._lock:
+                    if track.url in self._in_flight:
+                        continue
+                    self._in_flight.add(track.url)
+                self.fetched += 1
+                self.fetch(track)
+
+    def is_fetching(self, track: Track) -> bool:
+        with self._lock:
+            return track.url in self._in_flight
+
+    def done(self, track: Track):
+        """A fetch finished, successfully or not; the track may be fetched again"""
+        with self._lock:
+            self._in_flight.discard(track.url)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+    def _warm_file(self, path: str):
+        try:
+            with open(path, "rb") as f:
+                while f.read(WARM_CHUNK):
+                    pass
+            self.warmed += 1
+        except OSError:
+            with self._lock:
+                self._warm.discard(path)
@@ -8,7 +8,9 @@ def install_requirements():
         'pygame',
         'pystray',
         'Pillow',
-        'urllib3'
+        'urllib3',
+        'mutagen',
+        'numpy'
     ]
     
     print("Installing requirements...")
@@ -0,0 +1,141 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+# yt-dlp search prefixes per source in the sidebar
+SEARCH_PREFIXES = {
+    "YouTube": "ytsearch",
+    "SoundCloud": "scsearch",
+}
+
+URL_PATTERN = re.compile(r"^(https?://|www\.)\S+$", re.IGNORECASE)
+
+
+def is_url(text: str) -> bool:
+    return bool(URL_PATTERN.match(text.strip()))
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, ttl: float = 600, max_entries: int = 128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SearchResult:
+    """One search candidate; nothing is downloaded until it is played or pinned"""
+
+    __slots__ = ('title', 'url', 'duration', 'uploader', 'source')
+
+    def __init__(self, title: str, url: str, duration: Optional[float] = None,
+                 uploader: Optional[str] = None, source: str = ""):
+        self.title = title
+        self.url = url
+        self.duration = duration
+        self.uploader = uploader
+        self.source = source
+
+    @classmethod
+    def from_entry(cls, entry: Dict, source: str) -> Optional["SearchResult"]:
+        """Build a result from a flat yt-dlp entry, None if it has no usable URL"""
+        url = entry.get('webpage_url') or entry.get('url')
+        if url and not is_url(url) and entry.get('ie_key') == 'Youtube':
+            url = f"https://www.youtube.com/watch?v={url}"
+        if not url:
+            return None
+        return cls(entry.get('title') or url, url, entry.get('duration'),
+                   entry.get('uploader') or entry.get('channel'), source)
+
+
+class SearchService:
+    """Runs metadata-only yt-dlp searches off the UI thread
+
+    A search is one flat extraction (``ytsearchN:`` / ``scsearchN:`` with
+    ``download=False``) and results are cached per query and source. Only
+    the newest search reports back, so typing ahead never shows stale
+    results. Callbacks are handed to ``dispatch`` like DownloadManager's.
+    """
+
+    def __init__(self, results: int = 10, ttl: float = 600,
+                 dispatch: Optional[Callable] = None):
+        self.results = results
+        self.cache = TTLCache(ttl)
+        self.dispatch = dispatch or (lambda fn, *args: fn(*args))
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def search(self, query: str, source: str, on_results: Callable, on_error: Optional[Callable] = None):
+        """Look up query; on_results(query, results) runs through dispatch"""
+        query = query.strip()
+        key = (source, query.lower())
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.dispatch(on_results, query, cached)
+            return
+
+        def run():
+            try:
+                results = self.extract(query, source)
+            except Exception as e:
+                if on_error and generation == self._generation:
+                    self.dispatch(on_error, query, e)
+                return
+            self.cache.put(key, results)
+            if generation == self._generation:
+                self.dispatch(on_results, query, results)
+
+        threading.Thread(target=run, name="search", daemon=True).start()
+
+    def extract(self, query: str, source: str) -> List[SearchResult]:
+        prefix = SEARCH_PREFIXES.get(source)
+        if prefix is None:
+            raise ValueError(f"Searching {source} is not supported")
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            # Only the search page: no per-result format extraction
+            'extract_flat': 'in_playlist',
+        }
+        import yt_dlp
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(f"{prefix}{self.results}:{query}", download=False)
+        results = []
+        for entry in info.get('entries') or []:
+            result = SearchResult.from_entry(entry or {}, source)
+            if result is not None:
+                results.append(result)
+        return results
@@ -0,0 +1,299 @@
+import io
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+from media_probe import file_state
+
+# Seconds of audio between two index entries; a seek reads the frame headers in between
+INDEX_INTERVAL = 0.5
+# Bytes read at a time while walking frame headers
+READ_SIZE = 1024 * 1024
+
+# MP3 frame header tables, by MPEG version bits (3: MPEG-1, 2: MPEG-2, 0: MPEG-2.5)
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+# kbit/s by bitrate index, for (MPEG-1, layer) and (MPEG-2/2.5, layer)
+MP3_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_BITRATES[(False, 3)] = MP3_BITRATES[(False, 2)]
+
+
+class SeekIndex:
+    """Byte offsets of an MP3 file's frames by playback time
+
+    ``times[i]`` seconds into the track, a frame starts at byte
+    ``offsets[i]``. The mixer handed the file from a frame boundary plays
+    from that frame's time on, so a seek costs one bisect and a walk over
+    the few frames up to the next entry, where SDL_mixer's own seek walks
+    every frame from the start of the file.
+    """
+
+    def __init__(self, duration: float, times: array, offsets: array):
+        self.duration = duration
+        self.times = times
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate(self, seconds: float) -> Tuple[float, int]:
+        """(time, offset) of the last entry at or before seconds"""
+        i = max(bisect_right(self.times, seconds) - 1, 0)
+        return self.times[i], self.offsets[i]
+
+    def open_at(self, path: str, seconds: float) -> Tuple[float, BinaryIO]:
+        """File object playing from the frame at seconds, and that frame's start time"""
+        i = max(bisect_right(self.times, seconds) - 1, 0)
+        start, offset = self.times[i], self.offsets[i]
+        end = self.offsets[i + 1] if i + 1 < len(self.offsets) else offset + READ_SIZE
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            frames = f.read(end - offset)
+        start, skipped = _frame_at(frames, start, seconds)
+        return start, OffsetFile(path, offset + skipped)
+
+    def to_row(self) -> Dict:
+        return {
+            'duration': self.duration,
+            'times': self.times.tobytes(),
+            'offsets': self.offsets.tobytes(),
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "SeekIndex":
+        times, offsets = array('d'), array('q')
+        times.frombytes(row['times'])
+        offsets.frombytes(row['offsets'])
+        return cls(row['duration'], times, offsets)
+
+
+class OffsetFile(io.RawIOBase):
+    """A file read from offset on, as if it started there"""
+
+    def __init__(self, path: str, offset: int):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._offset = offset
+        self._file.seek(offset)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self._file.readinto(buffer)
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = self._offset + max(pos, 0)
+        return self._file.seek(pos, whence) - self._offset
+
+    def tell(self) -> int:
+        return self._file.tell() - self._offset
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _id3_size(head: bytes) -> int:
+    """Bytes taken by an ID3v2 tag at the start of a file, 0 if there is none"""
+    if len(head) < 10 or head[:3] != b'ID3':
+        return 0
+    size = (head[6] & 0x7f) << 21 | (head[7] & 0x7f) << 14 | (head[8] & 0x7f) << 7 | (head[9] & 0x7f)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _mp3_frame(b1: int, b2: int) -> Optional[Tuple[float, int, int]]:
+    """(seconds, bytes without padding, padding bytes) of frames with header bytes 1 and 2"""
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None  # reserved values, or free format which has no fixed frame size
+    mpeg1 = version == 3
+    rate = MP3_SAMPLE_RATES[version][rate_index]
+    bitrate = MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    if layer == 1:
+        return 384 / rate, 12 * bitrate // rate * 4, 4
+    samples = 1152 if layer == 2 or mpeg1 else 576
+    return samples / rate, samples // 8 * bitrate // rate, 1
+
+
+def _frame_at(data: bytes, start: float, target: float) -> Tuple[float, int]:
+    """Start time and position in data of the frame playing at target, data starting with a frame at start"""
+    pos = 0
+    while pos + 4 <= len(data) and data[pos] == 0xff and data[pos + 1] & 0xe0 == 0xe0:
+        frame = _mp3_frame(data[pos + 1], data[pos + 2])
+        if frame is None or start + frame[0] > target:
+            break
+        seconds, size, padding = frame
+        start += seconds
+        pos += size + padding if data[pos + 2] & 2 else size
+    return start, pos
+
+
+def build_mp3(f: BinaryIO) -> Optional[SeekIndex]:
+    """Walk every MP3 frame header; None if the data isn't a stream of MPEG audio frames"""
+    head = f.read(10)
+    start = _id3_size(head)
+    f.seek(start)
+    buffer = f.read(READ_SIZE)
+    buffer_start = start
+    frames = {}  # header bytes 1 and 2 -> _mp3_frame(), the same few over and over
+    times, offsets = array('d'), array('q')
+    elapsed = 0.0
+    next_entry = 0.0
+    pos = start
+    first = True
+    while True:
+        i = pos - buffer_start
+        if i + 64 > len(buffer):
+            f.seek(pos)
+            buffer = f.read(READ_SIZE)
+            buffer_start = pos
+            i = 0
+            if len(buffer) < 4:
+                break
+        if buffer[i] != 0xff or buffer[i + 1] & 0xe0 != 0xe0:
+            break  # trailing tag or garbage ends the audio
+        key = buffer[i + 1] << 8 | buffer[i + 2]
+        frame = frames.get(key)
+        if frame is None:
+            frame = frames[key] = _mp3_frame(buffer[i + 1], buffer[i + 2])
+            if frame is None:
+                break
+        seconds, size, padding = frame
+        if buffer[i + 2] & 2:
+            size += padding
+        if first:
+            first = False
+            # A Xing/Info/VBRI frame up front carries the encoder's summary, no audio
+            if any(tag in buffer[i:i + 64] for tag in (b'Xing', b'Info', b'VBRI')):
+                pos += size
+                continue
+        if elapsed >= next_entry:
+            times.append(elapsed)
+            offsets.append(pos)
+            next_entry = elapsed + INDEX_INTERVAL
+        elapsed += seconds
+        pos += size
+    if not times:
+        return None
+    return SeekIndex(elapsed, times, offsets)
+
+
+def build_index(path: str) -> Optional[SeekIndex]:
+    """Index an MP3 file; None for other formats or on errors
+
+    Ogg (Opus, Vorbis) needs no index: its decoders bisect the file by
+    page granule position, which is as fast as a lookup here.
+    """
+    try:
+        with open(path, 'rb') as f:
+            magic = f.read(3)
+            f.seek(0)
+            if magic == b'ID3' or (len(magic) >= 2 and magic[0] == 0xff and magic[1] & 0xe0 == 0xe0):
+                return build_mp3(f)
+    except OSError:
+        pass
+    return None
+
+
+class SeekIndexes:
+    """Seek indexes of MP3 files, built once and kept in the library
+
+    Indexes are keyed by path and valid while the file's mtime and size
+    match. ``build()`` indexes a file on the calling thread, for download
+    workers that just wrote one; ``request()`` does it on a background
+    thread. ``get()`` never builds: it answers from memory or the library,
+    so a seek on a file that isn't indexed yet falls back to the mixer.
+    """
+
+    MEMORY_ENTRIES = 8
+
+    def __init__(self, library, workers: int = 1):
+        self.library = library
+        self.built = 0
+        self._memory: "OrderedDict[str, Tuple[Tuple, Optional[SeekIndex]]]" = OrderedDict()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="seek-index")
+
+    def get(self, path: Optional[str]) -> Optional[SeekIndex]:
+        """Index of a file if one was built for its current contents"""
+        state = file_state(path) if path else None
+        if state is None:
+            return None
+        return self._lookup(path, state)[1]
+
+    def build(self, path: str) -> Optional[SeekIndex]:
+        """Index path unless that was done for its current contents"""
+        state = file_state(path)
+        if state is None:
+            return None
+        known, index = self._lookup(path, state)
+        if known:
+            return index
+        index = build_index(path)
+        if state != file_state(path):
+            return None  # changed while it was read
+        if index is not None:
+            self.library.store_seek_index(dict(index.to_row(), path=path, mtime=state[0], size=state[1]))
+            self.built += 1
+        # Formats without an index are remembered too, so they aren't read again
+        self._remember(path, state, index)
+        return index
+
+    def request(self, paths: Iterable[Optional[str]]):
+        """Build missing indexes in the background"""
+        with self._lock:
+            paths = [path for path in set(paths) if path and path not in self._in_flight]
+            self._in_flight.update(paths)
+        for path in paths:
+            self._pool.submit(self._build, path)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _build(self, path: str):
+        try:
+            self.build(path)
+        except Exception as e:
+            print(f"Error indexing {path}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(path)
+
+    def _lookup(self, path: str, state: Tuple) -> Tuple[bool, Optional[SeekIndex]]:
+        """(whether path was indexed or found unindexable at state, the index)"""
+        with self._lock:
+            cached = self._memory.get(path)
+            if cached is not None and cached[0] == state:
+                self._memory.move_to_end(path)
+                return True, cached[1]
+        row = self.library.get_seek_index(path)
+        if row is None or (row['mtime'], row['size']) != state:
+            return False, None
+        index = SeekIndex.from_row(row)
+        self._remember(path, state, index)
+        return True, index
+
+    def _remember(self, path: str, state: Tuple, index: Optional[SeekIndex]):
+        with self._lock:
+            self._memory[path] = (state, index)
+            self._memory.move_to_end(path)
+            while len(self._memory) > self.MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
@@ -0,0 +1,279 @@
+import os
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import instrumentation
+from audio_output import mixer
+
+
+class RingBuffer:
+    """Fixed size byte ring shared by one writer and one reader thread"""
+
+    def __init__(self, capacity: int):
+        self._buffer = bytearray(capacity)
+        self._capacity = capacity
+        self._start = 0
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def write(self, data: bytes):
+        """Append data, blocking while the buffer is full"""
+        view = memoryview(data)
+        while view:
+            with self._cond:
+                while self._size == self._capacity and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                end = (self._start + self._size) % self._capacity
+                count = min(len(view), self._capacity - self._size, self._capacity - end)
+                self._buffer[end:end + count] = view[:count]
+                self._size += count
+                view = view[count:]
+                self._cond.notify_all()
+
+    def read(self, count: int) -> bytes:
+        """Take up to count bytes, blocking until that many are available or the writer is done"""
+        with self._cond:
+            while self._size < count and not self._closed:
+                self._cond.wait()
+            count = min(count, self._size)
+            first = min(count, self._capacity - self._start)
+            data = bytes(self._buffer[self._start:self._start + first])
+            data += bytes(self._buffer[:count - first])
+            self._start = (self._start + count) % self._capacity
+            self._size -= count
+            self._cond.notify_all()
+            return data
+
+    def wait_for(self, count: int, timeout: Optional[float] = None) -> bool:
+        """Block until count bytes are buffered or the writer is done"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._size >= count or self._closed, timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamPlayer:
+    """Plays a URL while it is still downloading
+
+    yt-dlp resolves the direct stream URL, FFmpeg decodes it to PCM into a
+    ring buffer, and once ``prebuffer_seconds`` are buffered the PCM is fed
+    to a reserved mixer channel in small Sound chunks.
+
+    When ``save_to(info)`` returns a path, the same FFmpeg process also
+    copies the audio stream as is into a temporary file next to it, so
+    the track is fetched only once. A stream read to the end is moved to
+    the path and reported through ``on_saved(info, path)`` from the reader
+    thread; a stopped or failed one is deleted.
+    """
+
+    def __init__(self, prebuffer_seconds: float = 1.0, chunk_seconds: float = 0.5,
+                 buffer_seconds: float = 30.0, save_to: Optional[Callable[[Dict], Optional[str]]] = None,
+                 on_saved: Optional[Callable[[Dict, str], None]] = None):
+        self.prebuffer_seconds = prebuffer_seconds
+        self.chunk_seconds = chunk_seconds
+        self.buffer_seconds = buffer_seconds
+        self.save_to = save_to
+        self.on_saved = on_saved
+        self.info: Optional[Dict] = None
+        self.requested_at = None
+        self.first_audio_at = None
+        self.played_bytes = 0
+        self.on_first_audio: Optional[Callable] = None
+        self.on_finished: Optional[Callable] = None
+        self._process = None
+        self._ring = None
+        self._channel = None
+        self._stop_event = threading.Event()
+        self._paused = False
+        self._volume = 1.0
+
+    @property
+    def time_to_first_audio(self) -> Optional[float]:
+        """Seconds from the request (see start()) to the first PCM chunk reaching the mixer"""
+        if self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.requested_at
+
+    @property
+    def position(self) -> float:
+        """Seconds of audio handed to the mixer so far"""
+        return self.played_bytes / self._bytes_per_second()
+
+    def is_active(self) -> bool:
+        return self._process is not None and not self._stop_event.is_set()
+
+    def resolve(self, url: str) -> Dict:
+        """Look up the direct stream URL with yt-dlp; safe to call from any thread
+
+        This is a network round trip that can take seconds, so callers run it
+        off the thread that owns the mixer and pass the result to start().
+        """
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'quiet': True,
+            'no_warnings': True
+        }
+        import yt_dlp
+
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with instrumentation.span('stream.extract_info', url=url):
+                return ydl.extract_info(url, download=False)
+
+    def start(self, info: Dict, on_first_audio: Optional[Callable] = None,
+              on_finished: Optional[Callable] = None, requested_at: Optional[float] = None) -> Dict:
+        """Start streaming an info dict from resolve(); returns it
+
+        requested_at is the perf_counter() time the track was asked for,
+        before resolve(), so time_to_first_audio covers the lookup too.
+        """
+        self.stop()
+        self._stop_event = threading.Event()
+        self.requested_at = requested_at if requested_at is not None else time.perf_counter()
+        self.first_audio_at = None
+        self.played_bytes = 0
+        self.on_first_audio = on_first_audio
+        self.on_finished = on_finished
+        self._paused = False
+        self.info = info
+
+        frequency, _, channels = mixer().get_init()
+        headers = "".join(f"{k}: {v}\r\n" for k, v in self.info.get('http_headers', {}).items())
+        command = ['ffmpeg', '-loglevel', 'error']
+        if headers:
+            command += ['-headers', headers]
+        command += [
+            '-reconnect', '1', '-reconnect_streamed', '1',
+            '-i', self.info['url'],
+            '-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+            '-ar', str(frequency), '-ac', str(channels),
+            'pipe:1'
+        ]
+        save_path = self.save_to(info) if self.save_to else None
+        if save_path:
+            # Second output: the source audio untouched, for the download cache
+            root, ext = os.path.splitext(save_path)
+            part_path = f"{root}.stream{ext}"
+            os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+            command += ['-map', '0:a:0', '-vn', '-c:a', 'copy', '-y', part_path]
+        with instrumentation.span('stream.ffmpeg_start'):
+            self._process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self._ring = RingBuffer(self._align(self.buffer_seconds * self._bytes_per_second()))
+
+        mixer().music.stop()
+        mixer().set_reserved(1)
+        self._channel = mixer().Channel(0)
+        self._channel.set_volume(self._volume)
+
+        stop_event = self._stop_event
+        saving = (info, part_path, save_path) if save_path else None
+        threading.Thread(target=self._read_loop, args=(self._process, self._ring, stop_event, saving),
+                         daemon=True).start()
+        threading.Thread(target=self._feed_loop, args=(self._ring, self._channel, stop_event), daemon=True).start()
+        return self.info
+
+    def pause(self):
+        if self._channel:
+            self._channel.pause()
+            self._paused = True
+
+    def resume(self):
+        if self._channel:
+            self._channel.unpause()
+            self._paused = False
+
+    def set_volume(self, volume: float):
+        self._volume = volume
+        if self._channel:
+            self._channel.set_volume(volume)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._ring:
+            self._ring.close()
+        if self._process:
+            self._process.kill()
+            # Reap it, or every stopped stream leaves a zombie behind
+            self._process.wait()
+            self._process = None
+        if self._channel:
+            self._channel.stop()
+
+    def _bytes_per_second(self) -> int:
+        frequency, size, channels = mixer().get_init()
+        return frequency * channels * abs(size) // 8
+
+    def _align(self, count: float) -> int:
+        """Round a byte count down to a whole number of sample frames"""
+        _, size, channels = mixer().get_init()
+        frame = channels * abs(size) // 8
+        return max(frame, int(count) // frame * frame)
+
+    def _read_loop(self, process, ring: RingBuffer, stop_event: threading.Event, saving: Optional[tuple]):
+        """Copy FFmpeg's PCM output into the ring buffer, then keep or drop the saved copy"""
+        try:
+            while not stop_event.is_set():
+                data = process.stdout.read(64 * 1024)
+                if not data:
+                    break
+                ring.write(data)
+        finally:
+            ring.close()
+            if saving:
+                self._finish_save(process, stop_event, *saving)
+
+    def _finish_save(self, process, stop_event: threading.Event, info: Dict, part_path: str, save_path: str):
+        complete = process.wait() == 0 and not stop_event.is_set()
+        try:
+            if complete:
+                os.replace(part_path, save_path)
+            else:
+                os.remove(part_path)
+        except OSError:
+            return
+        if complete and self.on_saved:
+            self.on_saved(info, save_path)
+
+    def _feed_loop(self, ring: RingBuffer, channel, stop_event: threading.Event):
+        """Hand buffered PCM to the mixer channel, one chunk ahead of playback"""
+        chunk_bytes = self._align(self.chunk_seconds * self._bytes_per_second())
+        ring.wait_for(self._align(self.prebuffer_seconds * self._bytes_per_second()))
+
+        while not stop_event.is_set():
+            if channel.get_queue() is not None or self._paused:
+                time.sleep(self.chunk_seconds / 4)
+                continue
+
+            data = ring.read(chunk_bytes)
+            if not data:
+                break
+            sound = mixer().Sound(buffer=data)
+            if channel.get_busy():
+                channel.queue(sound)
+            else:
+                channel.play(sound)
+            if self.first_audio_at is None:
+                self.first_audio_at = time.perf_counter()
+                if self.on_first_audio:
+                    self.on_first_audio(self.time_to_first_audio)
+            self.played_bytes += len(data)
+
+        # Let the last queued chunks drain before reporting the end
+        while not stop_event.is_set() and channel.get_busy():
+            time.sleep(self.chunk_seconds / 4)
+        if not stop_event.is_set() and self.on_finished:
+            self.on_finished()
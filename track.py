@@ -0,0 +1,140 @@
+import math
+import os
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+# Display names of the sources a track can come from
+SOURCE_LABELS = {
+    'youtube': "YouTube",
+    'soundcloud': "SoundCloud",
+    'file': "Local Files",
+    'url': "Web",
+}
+
+
+def source_from_url(url: str) -> str:
+    if "soundcloud" in url:
+        return 'soundcloud'
+    if "youtube" in url or "youtu.be" in url:
+        return 'youtube'
+    return 'url'
+
+
+class Track:
+    """One playlist entry
+
+    ``source`` is the interned extractor name ('youtube', 'soundcloud',
+    'file', 'url') and ``source_key`` the id within that source, so
+    thousands of tracks share a handful of source strings.
+    """
+
+    __slots__ = ('id', 'source', 'source_key', 'title', 'duration', 'path', 'url')
+
+    def __init__(self, title: str, path: Optional[str] = None, url: Optional[str] = None,
+                 duration: Optional[float] = None, source_id: Optional[str] = None,
+                 id: Optional[int] = None):
+        self.id = id
+        self.title = title
+        self.duration = duration
+        self.path = path
+        self.url = url
+        if source_id is None:
+            if url:
+                source_id = f"url:{url}"
+            else:
+                source_id = f"file:{os.path.abspath(path)}"
+        self.source_id = source_id
+
+    @property
+    def source_id(self) -> str:
+        """Stable identity: extractor and id, or the URL/file for unresolved tracks"""
+        return f"{self.source}:{self.source_key}"
+
+    @source_id.setter
+    def source_id(self, value: str):
+        source, _, key = value.partition(":")
+        self.source = sys.intern(source.lower())
+        self.source_key = key
+
+    @property
+    def source_label(self) -> str:
+        source = source_from_url(self.url) if self.source == 'url' else self.source
+        return SOURCE_LABELS.get(source, source)
+
+    @property
+    def pending(self) -> bool:
+        """Known by URL only, not downloaded yet"""
+        return self.path is None and self.url is not None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Track":
+        """Build a track from the old playlist.json dict format"""
+        return cls(data['title'], path=data.get('path'), url=data.get('url'), duration=data.get('duration'))
+
+    def __repr__(self):
+        return f"Track({self.source_id!r}, {self.title!r})"
+
+
+class TrackTable:
+    """Columnar storage for large numbers of tracks
+
+    Each field lives in its own array or list, sources are stored as one
+    byte codes, and unknown durations are NaN in a float array. Rows are
+    materialized as Track objects only when asked for.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.source_codes = array('B')
+        self.source_names: List[str] = []
+        self._source_index: Dict[str, int] = {}
+        self.source_keys: List[str] = []
+        self.titles: List[str] = []
+        self.durations = array('d')
+        self.paths: List[Optional[str]] = []
+        self.urls: List[Optional[str]] = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, track: Track) -> int:
+        """Store a track and return its row number"""
+        self.ids.append(track.id if track.id is not None else -1)
+        self.source_codes.append(self._source_code(track.source))
+        self.source_keys.append(track.source_key)
+        self.titles.append(track.title)
+        self.durations.append(math.nan if track.duration is None else track.duration)
+        self.paths.append(track.path)
+        self.urls.append(track.url)
+        return len(self.ids) - 1
+
+    def get(self, row: int) -> Track:
+        duration = self.durations[row]
+        track = Track.__new__(Track)
+        track.id = self.ids[row] if self.ids[row] >= 0 else None
+        track.source = self.source_names[self.source_codes[row]]
+        track.source_key = self.source_keys[row]
+        track.title = self.titles[row]
+        track.duration = None if math.isnan(duration) else duration
+        track.path = self.paths[row]
+        track.url = self.urls[row]
+        return track
+
+    def set(self, row: int, track: Track):
+        """Write a changed track back into its row"""
+        self.ids[row] = track.id if track.id is not None else -1
+        self.source_codes[row] = self._source_code(track.source)
+        self.source_keys[row] = track.source_key
+        self.titles[row] = track.title
+        self.durations[row] = math.nan if track.duration is None else track.duration
+        self.paths[row] = track.path
+        self.urls[row] = track.url
+
+    def _source_code(self, source: str) -> int:
+        code = self._source_index.get(source)
+        if code is None:
+            code = len(self.source_names)
+            self.source_names.append(sys.intern(source))
+            self._source_index[source] = code
+        return code
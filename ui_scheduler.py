@@ -0,0 +1,125 @@
+import time
+from typing import Callable, Dict, Optional
+
+
+class RefreshTask:
+    def __init__(self, name: str, callback: Callable[[], bool], interval_ms: int,
+                 hidden_interval_ms: Optional[int] = None, max_interval_ms: Optional[int] = None):
+        self.name = name
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self.hidden_interval_ms = hidden_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.current_interval_ms = interval_ms
+        self.after_id = None
+        self.dormant = False
+
+
+class RefreshScheduler:
+    """Runs periodic UI work on the Tk thread through window.after
+
+    A task callback returns True when it did something. A task that did
+    nothing backs off (doubling its interval up to ``max_interval_ms``) or,
+    without a maximum, goes dormant until ``wake()`` is called. Tasks
+    without a ``hidden_interval_ms`` are suspended while the window is
+    hidden; ``wake()`` still runs them once on demand. One-off widget updates go through ``request()`` and are
+    coalesced so only the last one per key runs.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.visible = True
+        self.tasks: Dict[str, RefreshTask] = {}
+        self.pending: Dict[str, Callable] = {}
+        self._flush_id = None
+        self.wakeups = 0
+        self._window_started = time.monotonic()
+        self._window_wakeups = 0
+
+    def add_task(self, name: str, callback: Callable[[], bool], interval_ms: int,
+                 hidden_interval_ms: Optional[int] = None, max_interval_ms: Optional[int] = None):
+        task = RefreshTask(name, callback, interval_ms, hidden_interval_ms, max_interval_ms)
+        self.tasks[name] = task
+        self._schedule(task, interval_ms)
+
+    def wake(self, name: str):
+        """Run a dormant, backed-off or hidden task now, then at its full rate again"""
+        task = self.tasks[name]
+        if task.dormant or task.current_interval_ms != task.interval_ms or task.after_id is None:
+            task.dormant = False
+            task.current_interval_ms = task.interval_ms
+            self._schedule(task, 0)
+
+    def request(self, key: str, callback: Callable):
+        """Queue a one-off UI update; repeated requests for a key collapse into one"""
+        self.pending[key] = callback
+        if self._flush_id is None:
+            self._flush_id = self.window.after_idle(self._flush)
+
+    def set_visible(self, visible: bool):
+        if visible == self.visible:
+            return
+        self.visible = visible
+        for task in self.tasks.values():
+            task.current_interval_ms = task.interval_ms
+            if not task.dormant:
+                self._schedule(task, 0 if visible else self._interval(task))
+
+    def wakeups_per_second(self) -> float:
+        """Wakeups per second since the last call"""
+        now = time.monotonic()
+        elapsed = max(now - self._window_started, 1e-9)
+        rate = (self.wakeups - self._window_wakeups) / elapsed
+        self._window_started = now
+        self._window_wakeups = self.wakeups
+        return rate
+
+    def stop(self):
+        for task in self.tasks.values():
+            self._cancel(task)
+        if self._flush_id is not None:
+            self.window.after_cancel(self._flush_id)
+            self._flush_id = None
+
+    def _interval(self, task: RefreshTask) -> Optional[int]:
+        if self.visible:
+            return task.current_interval_ms
+        return task.hidden_interval_ms
+
+    def _schedule(self, task: RefreshTask, delay_ms: Optional[int]):
+        self._cancel(task)
+        if delay_ms is not None:
+            task.after_id = self.window.after(delay_ms, lambda: self._run(task))
+
+    def _cancel(self, task: RefreshTask):
+        if task.after_id is not None:
+            self.window.after_cancel(task.after_id)
+            task.after_id = None
+
+    def _run(self, task: RefreshTask):
+        task.after_id = None
+        self.wakeups += 1
+        try:
+            did_work = task.callback()
+        except Exception as e:
+            print(f"Error in refresh task {task.name}: {e}")
+            did_work = False
+
+        if did_work:
+            task.current_interval_ms = task.interval_ms
+        elif task.max_interval_ms is None:
+            task.dormant = True
+            return
+        else:
+            task.current_interval_ms = min(task.current_interval_ms * 2, task.max_interval_ms)
+        self._schedule(task, self._interval(task))
+
+    def _flush(self):
+        self._flush_id = None
+        self.wakeups += 1
+        pending, self.pending = self.pending, {}
+        for callback in pending.values():
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in UI update: {e}")